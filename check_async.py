@@ -0,0 +1,102 @@
+from datetime import datetime
+import threading
+import tracemalloc
+import sys, getopt
+from src import api, crypto, crypto_async, exchange_pool
+
+_usage_str = """
+Options:
+    -e <exchange> -s <symbols> -b <start> -t <interval> -i <indicators> -n <n> -d <delay>
+    with -d, the exchange is replaced by an offline one answering after <delay> seconds (-s is then the number of symbols)
+"""
+
+def usage():
+    print(_usage_str)
+
+def measure(function, history_params):
+    '''
+    return the elapsed time, the peak of memory allocated by python and the number of threads during the request,
+    the memory is measured by a second request (tracemalloc slows the first one down)
+    '''
+    threads = [threading.active_count()]
+    stop = threading.Event()
+    def count_threads():
+        while not stop.wait(0.005):
+            threads.append(threading.active_count())
+    counter = threading.Thread(target=count_threads)
+    counter.start()
+    start = datetime.now()
+    response = function(history_params)
+    elapsed_time = datetime.now() - start
+    stop.set()
+    counter.join()
+
+    crypto.g_indicator_cache.clear()
+    tracemalloc.start()
+    function(history_params)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    failed = [symbol for symbol, result in response["result"].items() if result["status"] != "ok"]
+    return elapsed_time, peak, max(threads) - 1, failed
+
+def use_offline_exchanges(symbols, delay):
+    # imported here, the test helpers are only needed without network
+    from test import test_utils
+    crypto.g_exchange_pool = exchange_pool.ExchangePool(create_exchange=lambda exchange_name: test_utils.FakeExchange(symbols, delay=delay))
+    crypto_async.g_exchange_pool = crypto_async.AsyncExchangePool(create_exchange=lambda exchange_name: test_utils.AsyncFakeExchange(symbols, delay=delay))
+
+if __name__ == "__main__":
+    exchange = "binance"
+    str_symbols = "BTC/USDT,ETH/USDT,BNB/USDT,XRP/USDT,ADA/USDT,SOL/USDT,DOGE/USDT,DOT/USDT,LTC/USDT,TRX/USDT"
+    str_start = "2022-01-01"
+    interval = "1h"
+    str_indicators = ""
+    n = 3
+    delay = None
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:],"he:s:b:t:i:n:d:")
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            usage()
+            sys.exit()
+        elif opt in ("-e", "--exchange"):
+            exchange = arg
+        elif opt in ("-s", "--symbols"):
+            str_symbols = arg
+        elif opt in ("-b", "--begin"):
+            str_start = arg
+        elif opt in ("-t", "--interval"):
+            interval = arg
+        elif opt in ("-i", "--indicators"):
+            str_indicators = arg
+        elif opt in ("-n", "--n"):
+            n = int(arg)
+        elif opt in ("-d", "--delay"):
+            delay = float(arg)
+
+    if delay != None:
+        symbols = ["SYN{}/USDT".format(i) for i in range(int(str_symbols))]
+        use_offline_exchanges(symbols, delay)
+        exchange = "offline"
+    else:
+        symbols = str_symbols.split(',')
+    indicators = dict.fromkeys(str_indicators.split(',')) if str_indicators != "" else {}
+    print("exchange : {}".format(exchange))
+    print("symbols : {} ({})".format(len(symbols), interval))
+
+    # the markets are loaded and the modules imported before the measures
+    crypto.get_exchange_and_markets(exchange)
+    crypto.get_symbol_ohlcv(exchange, symbols[0], str_start, None, interval, 100, indicators)
+
+    for name, function in [("threads", api.api_history), ("asyncio", api.api_history_async)]:
+        for i in range(n):
+            crypto.g_indicator_cache.clear()
+            history_params = {"str_exchange": exchange, "str_symbol": ",".join(symbol.replace("/", "_") for symbol in symbols),
+                              "str_start": str_start, "str_end": None, "str_interval": interval, "length": 500, "indicators": indicators}
+            elapsed_time, peak, threads, failed = measure(function, history_params)
+            print("{} : {} - peak memory {:.1f} MB - threads {} - failed {}".format(name, elapsed_time, peak / 1e6, threads, len(failed)))
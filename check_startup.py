@@ -0,0 +1,72 @@
+import subprocess
+import sys, getopt
+
+_usage_str = """
+Options:
+    -n <n> -m <module> -t <top> -o <output>
+"""
+
+def get_import_times(module):
+    '''
+    module: statement imported by the worker (ex: "from main import app")
+    return the list of (self time us, cumulative time us, module, level) reported by python -X importtime and the raw report
+    '''
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", module], capture_output=True, text=True)
+    import_times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_time, cumulative_time, name = line[len("import time:"):].split("|")
+        # nested imports are indented by two spaces per level
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        import_times.append((int(self_time), int(cumulative_time), name.strip(), level))
+    return import_times, result.stderr
+
+def usage():
+    print(_usage_str)
+
+if __name__ == "__main__":
+    n = 3
+    module = "from main import app"
+    top = 15
+    output = ""
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:],"hn:m:t:o:")
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            usage()
+            sys.exit()
+        elif opt in ("-n", "--n"):
+            n = int(arg)
+        elif opt in ("-m", "--module"):
+            module = arg
+        elif opt in ("-t", "--top"):
+            top = int(arg)
+        elif opt in ("-o", "--output"):
+            output = arg
+    print("n : {}".format(n))
+    print("module : {}".format(module))
+
+    # the first run warms the bytecode cache, the best of the next runs is kept
+    get_import_times(module)
+    best_total = None
+    best_import_times = None
+    best_report = None
+    for i in range(n):
+        import_times, report = get_import_times(module)
+        total = sum(cumulative_time for _, cumulative_time, _, level in import_times if level == 0)
+        if best_total == None or total < best_total:
+            best_total, best_import_times, best_report = total, import_times, report
+
+    if output != "":
+        with open(output, "w") as f:
+            f.write(best_report)
+
+    print("startup time : {:.3f}s".format(best_total / 1e6))
+    print("slowest imports (cumulative) :")
+    for self_time, cumulative_time, name, level in sorted(best_import_times, key=lambda import_time: -import_time[1])[:top]:
+        print("{:>10.1f}ms {}".format(cumulative_time / 1e3, name))
@@ -0,0 +1,64 @@
+from datetime import datetime
+import sys, getopt
+from src import indicators, indicators_panel, indicators_flabeling
+from src import indicators_synthetic_data as synthetic
+
+_usage_str = """
+Options:
+    -s <symbols> -b <bars> -t <timeframe> -i <indicators> -w <directory>
+"""
+
+def usage():
+    print(_usage_str)
+
+def elapsed_time(function, *args, **kwargs):
+    start = datetime.now()
+    result = function(*args, **kwargs)
+    return result, datetime.now() - start
+
+if __name__ == "__main__":
+    n_symbols = 50
+    n_bars = 10000
+    timeframe = "1h"
+    str_indicators = "sma_12,ema_26,rsi_30,macd,atr,bbands,roc,mom,trend_1d,simple_rtn"
+    directory = ""
+
+    try:
+        opts, args = getopt.getopt(sys.argv[1:],"hs:b:t:i:w:")
+    except getopt.GetoptError:
+        usage()
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            usage()
+            sys.exit()
+        elif opt in ("-s", "--symbols"):
+            n_symbols = int(arg)
+        elif opt in ("-b", "--bars"):
+            n_bars = int(arg)
+        elif opt in ("-t", "--timeframe"):
+            timeframe = arg
+        elif opt in ("-i", "--indicators"):
+            str_indicators = arg
+        elif opt in ("-w", "--write"):
+            directory = arg
+    technical_indicators = str_indicators.split(',')
+    print("symbols x bars : {} x {} ({})".format(n_symbols, n_bars, timeframe))
+    print("indicators : {}".format(technical_indicators))
+
+    panel, duration = elapsed_time(synthetic.generate_ohlcv_panel, n_symbols, n_bars, timeframe, seed=0)
+    print("generation : {}".format(duration))
+    dfs = indicators_panel.panel_to_symbols(panel)
+
+    if directory != "":
+        filenames, duration = elapsed_time(synthetic.write_ohlcv, dfs, directory)
+        print("csv files : {} ({})".format(len(filenames), duration))
+
+    _, duration = elapsed_time(lambda: [indicators.compute_indicators(df.copy(), technical_indicators) for df in dfs.values()])
+    print("compute_indicators per symbol : {}".format(duration))
+
+    _, duration = elapsed_time(indicators_panel.compute_panel_indicators, panel, technical_indicators)
+    print("compute_panel_indicators : {}".format(duration))
+
+    _, duration = elapsed_time(lambda: [indicators_flabeling.data_labeling(df.copy(), {"labeling_t_final": 10}) for df in dfs.values()])
+    print("data_labeling per symbol : {}".format(duration))
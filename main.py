@@ -48,6 +48,8 @@ def get_history():
             "result":history_params.get("reason"),
             "status":"ok"
             }
+    elif history_params.get("async"):
+        response = api.api_history_async(history_params)
     else:
         response = api.api_history(history_params)
     response = jsonify(response)
@@ -92,5 +94,14 @@ def get_portfolio():
     
     return response
 
+@app.route('/cache', methods=['OPTIONS', 'GET'])
+def get_cache():
+
+    response = api.api_cache()
+    response = jsonify(response)
+    response = add_headers(response)
+
+    return response
+
 if __name__ == "__main__":
     app.run(debug=False, host= '0.0.0.0', port=5000)
@@ -1,7 +1,6 @@
 import pandas as pd
 from datetime import datetime
-from . import wiki,yahoo,yf_wrapper,crypto,tradingview,portfolio,indicators
-import concurrent.futures
+from . import wiki,yahoo,yf_wrapper,crypto,crypto_async,tradingview,portfolio,indicators,executors
 import json
 
 map_market_function = {
@@ -108,6 +107,8 @@ def api_history_parse_parameters(request):
     str_interval = "1d"
     length = 100
     indicators = {}
+    compact = False
+    use_async = False
     if request.method == 'GET':
         str_exchange = request.args.get("exchange")
         str_symbol = request.args.get("symbol")
@@ -121,6 +122,8 @@ def api_history_parse_parameters(request):
         if isinstance(indicators, str):
             indicatorsArray = indicators.split(',')
             indicators = dict.fromkeys(indicatorsArray)
+        compact = request.args.get("compact", "false").lower() in ["true", "1", "yes"]
+        use_async = request.args.get("async", "false").lower() in ["true", "1", "yes"]
     elif request.method == 'POST':
         if request.is_json:
             params = request.get_json()
@@ -131,6 +134,8 @@ def api_history_parse_parameters(request):
             str_interval = params.get("interval", str_interval)
             length = params.get("length", length)
             indicators = params.get("indicators", indicators)
+            compact = params.get("compact", compact)
+            use_async = params.get("async", use_async)
         else:
             if "exchange" in request.form:
                 str_exchange = request.form['exchange']
@@ -149,6 +154,10 @@ def api_history_parse_parameters(request):
                 indicators = request.form["indicators"]
                 print(type(indicators))
                 indicators = json.loads(indicators)
+            if "compact" in request.form:
+                compact = request.form["compact"].lower() in ["true", "1", "yes"]
+            if "async" in request.form:
+                use_async = request.form["async"].lower() in ["true", "1", "yes"]
 
     if str_exchange == None or str_exchange == "":
         status = False
@@ -168,7 +177,7 @@ def api_history_parse_parameters(request):
         "status":status, "reason":reason,
         "str_exchange":str_exchange, "str_symbol":str_symbol,
         "str_start":str_start, "str_end":str_end, "str_interval":str_interval,
-        "length":length, "indicators":indicators}
+        "length":length, "indicators":indicators, "compact":compact, "async":use_async}
 
 def api_history(history_params):
     str_exchange = history_params.get("str_exchange")
@@ -178,6 +187,7 @@ def api_history(history_params):
     str_interval = history_params.get("str_interval", "1d")
     length = history_params.get("length", None)
     indicators = history_params.get("indicators", {})
+    compact = history_params.get("compact", False)
 
     start = datetime.now()
 
@@ -185,19 +195,48 @@ def api_history(history_params):
 
     symbols = str_symbol.split(',')
     real_symbols = [symbol.replace("_", "/") for symbol in symbols]
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        futures = {executor.submit(crypto.get_symbol_ohlcv, exchange_name=str_exchange, symbol=real_symbol, start=str_start, end=str_end, timeframe=str_interval, length=length, indicators=indicators): real_symbol for real_symbol in real_symbols}
-
-        for future in concurrent.futures.as_completed(futures):
-            real_symbol = futures[future]
-            symbol = real_symbol.replace('/', '_')
-            df = future.result()
-            if isinstance(df, pd.DataFrame):
-                df.reset_index(inplace=True)
-                result_for_response[symbol] = {"status": "ok", "info": df.to_json()}
-            else:
-                result_for_response[symbol] = {"status": "ko", "reason": "", "info": df}
-              
+    try:
+        futures = executors.get_io_executor().map(crypto.get_symbol_ohlcv, [(str_exchange, real_symbol, str_start, str_end, str_interval, length, indicators, True, compact) for real_symbol in real_symbols], executors.get_max_concurrency("history"))
+    except executors.ExecutorBusy as exception:
+        return {"result":{}, "status":"ko", "reason":"server busy ({})".format(exception), "elapsed_time":str(datetime.now() - start)}
+
+    for real_symbol, future in zip(real_symbols, futures):
+        result_for_response[real_symbol.replace('/', '_')] = _get_history_symbol_result(future.result())
+
+    end = datetime.now()
+    elapsed_time = str(end - start)
+
+    final_response = {
+        "result":result_for_response,
+        "status":"ok",
+        "elapsed_time":elapsed_time
+    }
+
+    return final_response
+
+def _get_history_symbol_result(df):
+    if not isinstance(df, pd.DataFrame):
+        return {"status": "ko", "reason": "", "info": df}
+    memory = df.attrs.get("memory")
+    df.reset_index(inplace=True)
+    result = {"status": "ok", "info": df.to_json()}
+    if memory != None:
+        result["memory"] = memory
+    return result
+
+def api_history_async(history_params):
+    '''
+    same as api_history, the symbols are requested by the event loop of crypto_async instead of threads
+    '''
+    start = datetime.now()
+
+    real_symbols = [symbol.replace("_", "/") for symbol in history_params.get("str_symbol").split(',')]
+    dfs = crypto_async.run(crypto_async.get_symbols_ohlcv(history_params.get("str_exchange"), real_symbols,
+                                                          history_params.get("str_start"), history_params.get("str_end"),
+                                                          history_params.get("str_interval", "1d"), history_params.get("length", None),
+                                                          history_params.get("indicators", {}), True, history_params.get("compact", False)))
+    result_for_response = {real_symbol.replace('/', '_'): _get_history_symbol_result(df) for real_symbol, df in zip(real_symbols, dfs)}
+
     end = datetime.now()
     elapsed_time = str(end - start)
 
@@ -249,7 +288,10 @@ def api_portfolio(exchange_name="ftx", recommendations=["BUY", "STRONG_BUY"], in
     start = datetime.now()
 
  
-    symbols = portfolio.get_portfolio(exchange_name, recommendations, intervals)
+    try:
+        symbols = portfolio.get_portfolio(exchange_name, recommendations, intervals)
+    except executors.ExecutorBusy as exception:
+        return {"result":{}, "status":"ko", "reason":"server busy ({})".format(exception), "elapsed_time":str(datetime.now() - start)}
     result_for_response = {"symbols":symbols.to_json(), "status":"ok"}
 
     end = datetime.now()
@@ -262,3 +304,19 @@ def api_portfolio(exchange_name="ftx", recommendations=["BUY", "STRONG_BUY"], in
     }
 
     return final_response
+
+def api_cache():
+    start = datetime.now()
+
+    result_for_response = {"indicators": crypto.get_indicator_cache_stats(), "exchanges": crypto.get_exchange_pool_stats(), "ohlcv_store": crypto.get_ohlcv_store_stats(), "executors": executors.get_stats()}
+
+    end = datetime.now()
+    elapsed_time = str(end - start)
+
+    final_response = {
+        "result":result_for_response,
+        "status":"ok",
+        "elapsed_time":elapsed_time
+    }
+
+    return final_response
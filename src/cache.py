@@ -0,0 +1,116 @@
+import json
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from . import utils
+
+ccxt = utils.lazy_import("ccxt")
+
+def get_timeframe_duration(timeframe):
+    # duration of a bar in seconds
+    return ccxt.Exchange.parse_timeframe(timeframe)
+
+def get_timeframe_freq(timeframe):
+    # pandas frequency of the bars: the weeks start on monday and the months on the first day as on the exchanges
+    units = {"s": "S", "m": "min", "h": "H", "d": "D", "w": "W-MON", "M": "MS", "y": "AS"}
+    return timeframe[:-1] + units[timeframe[-1]]
+
+# 1970-01-01 was a thursday, the weeks start 4 days later
+g_monday = 4 * 24 * 3600
+
+def get_last_bar_timestamp(timeframe, now=None):
+    '''
+    timeframe: ccxt timeframe (1m, 1h, 1d, 1w, 1M...)
+    now: timestamp in seconds, current time by default
+    return the opening timestamp in ms of the bar in progress: it changes when a bar closes
+    the bars are aligned as in get_timeframe_freq: the weeks start on monday, the months and the years on the first day
+    '''
+    if now == None:
+        now = time.time()
+    n, unit = int(timeframe[:-1]), timeframe[-1]
+    if unit == "w":
+        duration = n * 7 * 24 * 3600
+        return int((now - g_monday) // duration * duration + g_monday) * 1000
+    if unit in ["M", "y"]:
+        numpy_unit = "M" if unit == "M" else "Y"
+        period = np.datetime64(int(now), "s").astype("datetime64[{}]".format(numpy_unit)).astype(np.int64) // n * n
+        return int(np.datetime64(int(period), numpy_unit).astype("datetime64[ms]").astype(np.int64))
+    duration = get_timeframe_duration(timeframe)
+    return int(now // duration * duration) * 1000
+
+def get_indicators_key(indicators):
+    # indicators: list of names or dictionary name -> params, the order is kept as it is the columns order
+    if isinstance(indicators, dict):
+        return tuple((indicator, json.dumps(params, sort_keys=True, default=str)) for indicator, params in indicators.items())
+    return tuple((indicator, "null") for indicator in indicators)
+
+class IndicatorCache():
+    '''
+    In-process LRU cache for the dataframes returned by get_symbol_ohlcv.
+    An entry is identified by a request key and the timestamp of the last bar,
+    it is invalidated as soon as a new bar opens for the same request.
+    max_entries: maximum number of dataframes
+    max_bytes: maximum memory used by the dataframes
+    '''
+    def __init__(self, max_entries=128, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() # request key -> (last bar timestamp, dataframe, size)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+    def _remove(self, key):
+        _, _, size = self.entries.pop(key)
+        self.size -= size
+
+    def get(self, key, last_bar):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry != None and entry[0] != last_bar:
+                self._remove(key)
+                self.invalidations += 1
+                entry = None
+            if entry == None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        # the callers are free to modify the dataframe they get
+        return entry[1].copy()
+
+    def put(self, key, last_bar, df):
+        df = df.copy()
+        size = utils.get_dataframe_memory(df)
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            if size > self.max_bytes or self.max_entries <= 0:
+                return
+            self.entries[key] = (last_bar, df, size)
+            self.size += size
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
@@ -1,111 +1,191 @@
 import pandas as pd
 import numpy as np
-import ccxt
+import os
 import time
 from datetime import datetime
 from datetime import date
 from . import utils
 from . import indicators as inc_indicators
-import concurrent.futures
+from . import cache
+from . import exchange_pool
+from . import ohlcv_store
+from . import ohlcv_resampler
+from . import screener
+from . import indicators_panel
+from . import executors
 
-'''
-format for since : yyyy-mm-dd
-'''
-def _get_ohlcv(exchange, symbol, start, end=None, timeframe="1d", limit=None):
-    if exchange == None or symbol == None or start == None:
-        return None
-    #print("start : ", start)
-    #print("end : ", end)
+ccxt = utils.lazy_import("ccxt")
 
+def _get_since_and_limit(start, end, timeframe, limit):
     since = int(datetime.strptime(start, "%Y-%m-%d").timestamp())*1000
     if end != None:
         start = datetime.strptime(start, '%Y-%m-%d')
         end = datetime.strptime(end, '%Y-%m-%d')
         delta = end - start
-        limit  = delta.days # days
-        if timeframe == "1m":
-            limit = limit * 24 * 60
-        elif timeframe == "1h":
-            limit = limit * 24
-
-    #print("limit : ", limit)
-    
-    intervals = []
-    if timeframe == "1d" or timeframe == "1h" or timeframe == "1m" : # split into requests with limit = 5000
-        if timeframe == "1d":
-            offset = 5000 * 24 * 60 * 60 * 1000
-        if timeframe == "1h":
-            offset = 5000 * 60 * 60 * 1000
-        if timeframe == "1m":
-            offset = 5000 * 60 * 1000
-        while limit > 5000:
-            since_next = since + offset
-            intervals.append({'since': since, 'limit': 5000})
-            since = since_next
-            limit = limit - 5000
-        intervals.append({'since': since, 'limit': limit})
-    #print(intervals)
+        # number of bars between start and end
+        duration = cache.get_timeframe_duration(timeframe)
+        limit = -(-int(delta.total_seconds()) // duration)
+    return since, limit
 
+###
+### pagination
+###
+g_default_page_limit = 1000
+# maximum number of bars of one call to fetch_ohlcv for the exchanges without ccxt features (ccxt < 4.4)
+g_page_limits = {
+    "binance": 1000,
+    "bitfinex": 10000,
+    "bitmex": 1000,
+    "coinbasepro": 300,
+    "ftx": 1500,
+    "hitbtc": 1000,
+    "kraken": 720,
+    "kucoin": 1500
+}
+
+def get_ohlcv_page_limit(exchange):
     '''
-    df_result = pd.DataFrame()
-    for interval in intervals:
-        df = pd.DataFrame(exchange.fetch_ohlcv(symbol=symbol, timeframe=timeframe, since=interval["since"], limit=interval["limit"]))
-        df = df.rename(columns={0: 'timestamp', 1: 'open', 2: 'high', 3: 'low', 4: 'close', 5: 'volume'})
-        df = df.set_index(df['timestamp'])
-        df.index = pd.to_datetime(df.index, unit='ms')
-        del df['timestamp']
-        df_result = pd.concat([df_result, df])
+    maximum number of bars returned by one call to fetch_ohlcv: from the ccxt features of the exchange,
+    else from g_page_limits (the pinned ccxt has no features), else g_default_page_limit
     '''
+    features = getattr(exchange, "features", None) or {}
+    candidates = [features.get("spot")]
+    for market_type in ["swap", "future"]:
+        candidates.extend((features.get(market_type) or {}).values())
+    for candidate in candidates:
+        if isinstance(candidate, dict) and isinstance(candidate.get("fetchOHLCV"), dict):
+            limit = candidate["fetchOHLCV"].get("limit")
+            if limit:
+                return limit
+    return g_page_limits.get(getattr(exchange, "id", None), g_default_page_limit)
+
+def plan_ohlcv_pages(exchange, timeframe, since, limit):
+    '''
+    split the request of limit bars from since (ms) into the fewest calls to fetch_ohlcv
+    return the list of pages {"since", "limit"}, None if the exchange does not provide the timeframe
+    '''
+    timeframes = getattr(exchange, "timeframes", None)
+    if timeframes and timeframe not in timeframes:
+        return None
+    if limit == None:
+        # the exchange decides
+        return [{"since": since, "limit": None}]
+    duration = cache.get_timeframe_duration(timeframe) * 1000
+    page_limit = get_ohlcv_page_limit(exchange)
+    return [{"since": since + offset * duration, "limit": min(page_limit, limit - offset)} for offset in range(0, limit, page_limit)]
 
-    everything_ok = True
-    df_results = {}
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        futures = {executor.submit(exchange.fetch_ohlcv, symbol, timeframe, interval["since"], interval["limit"]): interval["since"] for interval in intervals}
-        for future in concurrent.futures.as_completed(futures):
-            current_since = futures[future]
-            res = future.result()
-            df = pd.DataFrame(res)
-            #if df.empty:
-            #    everything_ok = False
-            df_results[current_since] = df
-
-    if not everything_ok:
+'''
+format for since : yyyy-mm-dd
+'''
+def _get_ohlcv(exchange, symbol, start, end=None, timeframe="1d", limit=None, exchange_name=None):
+    if exchange == None or symbol == None or start == None:
         return None
 
-    ordered_df_results = [df_results[interval['since']] for interval in intervals]
-    df_result = pd.concat(ordered_df_results)
-    df_result = df_result.rename(columns={0: 'timestamp', 1: 'open', 2: 'high', 3: 'low', 4: 'close', 5: 'volume'})
-    if df_result.empty:
-        return "no data"
-    df_result = df_result.set_index(df_result['timestamp'])
-    df_result.index = pd.to_datetime(df_result.index, unit='ms')
-    del df_result['timestamp']
+    since, limit = _get_since_and_limit(start, end, timeframe, limit)
+
+    source = get_resampling_source(exchange, exchange_name, symbol, timeframe, since, limit)
+    if source != None:
+        # built from finer bars
+        source_timeframe, source_since, source_limit = source
+        df_result = _get_ohlcv_range(exchange, symbol, source_since, source_timeframe, source_limit, exchange_name)
+        if isinstance(df_result, pd.DataFrame):
+            df_result = ohlcv_resampler.resample_ohlcv(df_result, timeframe)
+    else:
+        df_result = _get_ohlcv_range(exchange, symbol, since, timeframe, limit, exchange_name)
 
+    if isinstance(df_result, pd.DataFrame) and df_result.empty:
+        return "no data"
     return df_result
 
+def _get_ohlcv_range(exchange, symbol, since, timeframe, limit, exchange_name):
+    if g_ohlcv_store != None and exchange_name != None and limit != None:
+        # only the ranges missing in the local store are fetched
+        until = since + limit * cache.get_timeframe_duration(timeframe) * 1000
+        fetch = lambda fetch_since, fetch_limit: _fetch_ohlcv(exchange, symbol, fetch_since, timeframe, fetch_limit)
+        return g_ohlcv_store.get_ohlcv(exchange_name, symbol, timeframe, since, until, fetch)
+    return _fetch_ohlcv(exchange, symbol, since, timeframe, limit)
+
+# maximum number of finer bars requested to build the bars of a coarser timeframe
+g_max_resampled_bars = 100000
+
+def get_resampling_source(exchange, exchange_name, symbol, timeframe, since, limit):
+    '''
+    the bars of timeframe are built from finer bars (see ohlcv_resampler) when these bars are already
+    in the local store, or when the exchange does not provide timeframe
+    return (source timeframe, since, limit) of the finer bars, None if the bars are requested as they are
+    '''
+    timeframes = getattr(exchange, "timeframes", None) or {}
+    if limit == None or (g_ohlcv_store == None and (not timeframes or timeframe in timeframes)):
+        return None
+    source_timeframes = [source_timeframe for source_timeframe in ohlcv_resampler.g_source_timeframes
+                         if ohlcv_resampler.can_resample(source_timeframe, timeframe) and (not timeframes or source_timeframe in timeframes)]
+    if len(source_timeframes) == 0:
+        return None
+
+    # the exchanges return the limit bars opened from since
+    since = ohlcv_resampler.get_next_bucket_start(since, timeframe)
+    until = ohlcv_resampler.get_later_bucket_start(since, timeframe, limit)
+    candidates = []
+    for source_timeframe in source_timeframes:
+        source_limit = -(-(until - since) // (cache.get_timeframe_duration(source_timeframe) * 1000))
+        if source_limit <= g_max_resampled_bars:
+            candidates.append((source_timeframe, since, source_limit))
+
+    if g_ohlcv_store != None and exchange_name != None:
+        for source_timeframe, source_since, source_limit in candidates:
+            if g_ohlcv_store.is_held(exchange_name, symbol, source_timeframe, source_since, until):
+                return source_timeframe, source_since, source_limit
+    if timeframes and timeframe not in timeframes and len(candidates) != 0:
+        return candidates[0]
+    return None
+
+def _fetch_ohlcv(exchange, symbol, since, timeframe, limit):
+    pages = plan_ohlcv_pages(exchange, timeframe, since, limit)
+    if pages == None:
+        return "timeframe not supported"
+
+    try:
+        futures = executors.get_io_executor().map(exchange.fetch_ohlcv, [(symbol, timeframe, page["since"], page["limit"]) for page in pages], executors.get_max_concurrency("ohlcv_pages"))
+        pages = [future.result() for future in futures]
+    except executors.ExecutorBusy:
+        # reported for the symbol, as the other errors
+        return "server busy"
+    return _make_ohlcv_from_pages(pages)
+
+def _make_ohlcv_from_pages(pages):
+    # the pages are merged in order: [timestamp, open, high, low, close, volume]
+    rows = [row for page in pages for row in page]
+    if len(rows) == 0:
+        df_result = ohlcv_store.make_ohlcv_dataframe(np.empty(0, dtype=np.int64), np.empty((0, len(ohlcv_store.g_columns))))
+    else:
+        rows = np.array(rows, dtype=float)
+        df_result = ohlcv_store.make_ohlcv_dataframe(rows[:, 0].astype(np.int64), rows[:, 1:6])
+    df_result.attrs["pages"] = len(pages)
+    return df_result
 
 def _custom_filter(symbol):
     return (symbol[-4:] in ["/EUR", "/USD"] or symbol[-5:] in ["/EURS"]) and ("BTC" in symbol or "ETH" in symbol or "BNB" in symbol)
 
+# ccxt clients and markets shared by all the requests,
+# the markets are saved in FDP_MARKETS_SNAPSHOT_DIRECTORY if it is set
+g_exchange_pool = exchange_pool.ExchangePool(snapshot_directory=os.environ.get("FDP_MARKETS_SNAPSHOT_DIRECTORY"))
+
 def _get_exchange(exchange_market):
-    exchange = None
-    if exchange_market == "hitbtc":
-        exchange = ccxt.hitbtc()
-    elif exchange_market == "bitmex":
-        exchange = ccxt.bitmex()
-    elif exchange_market == "binance":
-        exchange = ccxt.binance()
-    elif exchange_market == "ftx":
-        exchange = ccxt.ftx()
-    return exchange
+    return g_exchange_pool.get_exchange(exchange_market)
 
 def get_exchange_and_markets(exchange_name):
-    exchange = _get_exchange(exchange_name)
-    if exchange == None:
-        return None, {}
+    return g_exchange_pool.get_exchange_and_markets(exchange_name)
+
+def get_exchange_pool_stats():
+    return g_exchange_pool.get_stats()
 
-    markets = exchange.load_markets()
-    return exchange, markets
+# closed bars already fetched, kept in FDP_OHLCV_STORE_DIRECTORY if it is set
+g_ohlcv_store = None
+if os.environ.get("FDP_OHLCV_STORE_DIRECTORY"):
+    g_ohlcv_store = ohlcv_store.OhlcvStore(os.environ.get("FDP_OHLCV_STORE_DIRECTORY"))
+
+def get_ohlcv_store_stats():
+    return g_ohlcv_store.get_stats() if g_ohlcv_store != None else {}
 
 def get_list_symbols(exchange_name):
     exchange, markets = get_exchange_and_markets(exchange_name)
@@ -141,28 +221,66 @@ def get_symbol_ticker(exchange_market, symbol):
     if exchange == None:
         return []
 
-    exchange.load_markets()
     if symbol not in exchange.symbols:
         return {}
 
     ticker = exchange.fetch_ticker(symbol)
     return ticker
 
-def get_symbol_ohlcv(exchange_name, symbol, start=None, end=None, timeframe="1d", length=None, indicators={}):
-    # manage some errors
-    if exchange_name == "hitbtc" and length and length > 1000:
-        return "for hitbtc, length must be in [1, 1000]"
+# results of get_symbol_ohlcv, until the next bar closes
+g_indicator_cache = cache.IndicatorCache()
+
+def get_symbol_ohlcv(exchange_name, symbol, start=None, end=None, timeframe="1d", length=None, indicators={}, use_cache=True, compact=False):
+    '''
+    compact: the indicators are computed in float64 then the dataframe is downcast (see utils.compact_dataframe),
+    the memory saved is in ohlcv.attrs["memory"]
+    '''
+    cache_key, last_bar, ohlcv = _get_cached_symbol_ohlcv(exchange_name, symbol, start, end, timeframe, length, indicators, use_cache, compact)
+    if ohlcv is not None:
+        return ohlcv
+
+    ohlcv = _get_symbol_ohlcv(exchange_name, symbol, start, end, timeframe, length, indicators)
+    return _put_cached_symbol_ohlcv(ohlcv, cache_key, last_bar, compact)
+
+def _get_cached_symbol_ohlcv(exchange_name, symbol, start, end, timeframe, length, indicators, use_cache, compact):
+    # return the cache key (None without cache), the timestamp of the last closed bar and the cached ohlcv (None if not found)
+    if not use_cache:
+        return None, None, None
+    cache_key = (exchange_name, symbol, timeframe, start, end, length, cache.get_indicators_key(indicators), compact)
+    last_bar = cache.get_last_bar_timestamp(timeframe)
+    return cache_key, last_bar, g_indicator_cache.get(cache_key, last_bar)
+
+def _put_cached_symbol_ohlcv(ohlcv, cache_key, last_bar, compact):
+    if compact and isinstance(ohlcv, pd.DataFrame):
+        ohlcv, ohlcv.attrs["memory"] = utils.compact_dataframe(ohlcv)
+    if cache_key != None and isinstance(ohlcv, pd.DataFrame):
+        g_indicator_cache.put(cache_key, last_bar, ohlcv)
+    return ohlcv
+
+def get_indicator_cache_stats():
+    return g_indicator_cache.get_stats()
+
+def _get_symbol_ohlcv(exchange_name, symbol, start, end, timeframe, length, indicators):
 
     exchange = _get_exchange(exchange_name)
+    reason = _check_symbol(exchange, symbol)
+    if reason != None:
+        return reason
+
+    ohlcv = _get_ohlcv(exchange, symbol, start, end, timeframe, length, exchange_name)
+    return _complete_symbol_ohlcv(ohlcv, exchange_name, symbol, start, end, timeframe, length, indicators)
+
+def _check_symbol(exchange, symbol):
     if exchange == None:
         return "exchange not found"
 
-    exchange.load_markets()
     if symbol not in exchange.symbols or exchange.has['fetchOHLCV'] == False:
         print("symbol not found")
         return "symbol not found"
+    return None
 
-    ohlcv = _get_ohlcv(exchange, symbol, start, end, timeframe, length)
+def _complete_symbol_ohlcv(ohlcv, exchange_name, symbol, start, end, timeframe, length, indicators):
+    # bars reindexed on the expected dates and indicators
     if not isinstance(ohlcv, pd.DataFrame):
         return ohlcv
 
@@ -170,13 +288,15 @@ def get_symbol_ohlcv(exchange_name, symbol, start=None, end=None, timeframe="1d"
     ohlcv = ohlcv[~ohlcv.index.duplicated()]
 
     # add potential missing dates
-    map_timeframe_freq = {"1h": "H", "1d": "D", "1m": "min"}
-    freq = map_timeframe_freq[timeframe]
+    freq = cache.get_timeframe_freq(timeframe)
     if end == None and length == None:
         end = date.today()
         end = end.strftime("%Y-%m-%d")
 
-    expected_range = pd.date_range(start=start, end=end, freq=freq, closed="left")
+    if end == None:
+        expected_range = pd.date_range(start=start, periods=length, freq=freq)
+    else:
+        expected_range = pd.date_range(start=start, end=end, freq=freq, closed="left")
     ohlcv.index = pd.DatetimeIndex(ohlcv.index)
     ohlcv = ohlcv.reindex(expected_range, fill_value=np.nan)
 
@@ -186,44 +306,45 @@ def get_symbol_ohlcv(exchange_name, symbol, start=None, end=None, timeframe="1d"
 
     return ohlcv
 
-def apply_filter_on_symbol_with_volume_gt_threshold(symbols, markets, threshold):
-    return [symbol for symbol in symbols if float(markets[symbol]['info']['quoteVolume24h']) > threshold]
-
-def apply_filter_on_symbol_with_name_ending_with(symbols, end):
-    return [symbol for symbol in symbols if (symbol[-len(end):] == end and "BULL" not in symbol and "HALF" not in symbol and "EDGE" not in symbol and "BEAR" not in symbol)]
-
+def get_symbols_ohlcv_panel(exchange_name, symbols, start=None, end=None, timeframe="1d", length=None, indicators=[]):
+    '''
+    ohlcv of several symbols with the indicators computed for all of them at once (see indicators_panel)
+    return the panel (dictionary field -> dataframe bars x symbols) and the symbols which failed with their reason
+    '''
+    dfs = {}
+    failed = {}
+    try:
+        futures = executors.get_io_executor().map(get_symbol_ohlcv, [(exchange_name, symbol, start, end, timeframe, length) for symbol in symbols], executors.get_max_concurrency("panel"))
+    except executors.ExecutorBusy:
+        return {}, {symbol: "server busy" for symbol in symbols}
+    for symbol, future in zip(symbols, futures):
+        df = future.result()
+        if isinstance(df, pd.DataFrame):
+            dfs[symbol] = df
+        else:
+            failed[symbol] = df
+
+    panel = indicators_panel.make_panel(dfs)
+    if len(indicators) != 0 and "close" in panel:
+        panel_indicators, _ = indicators_panel.compute_panel_indicators(panel, indicators)
+        panel.update(panel_indicators)
+    return panel, failed
 
 ###
 ### gainers
 ###
-def _get_top_gainers_for_change(symbols, markets, change, n):
-    df = pd.DataFrame(symbols, columns=['symbol'])
-    df['symbol'] = df['symbol'].astype("string")
-    df = df.set_index('symbol', drop=False)
-    symbols = df['symbol'].to_list()
-
-    for symbol in symbols:
-        df.loc[symbol, change] = float(markets[symbol]['info'][change]) * 100
-
-    df.sort_values(by=[change], ascending=False, inplace=True)
-    df.reset_index(inplace=True, drop=True)
-    df['rank_'+change] = df.index
-    df = df.head(n)
-    return df
-
-def get_top_gainers(exchange_name, n):
-    exchange, markets = get_exchange_and_markets(exchange_name)
-    symbols = exchange.symbols
-
-    # filters on symbols
-    symbols = apply_filter_on_symbol_with_name_ending_with(symbols, '/USD')
-    symbols = apply_filter_on_symbol_with_volume_gt_threshold(symbols, markets, 10000)
-
-    # get the gainers
-    gainers1h = _get_top_gainers_for_change(symbols, markets, "change1h", n)
-    gainers24h = _get_top_gainers_for_change(symbols, markets, "change24h", n)
-
-    # merge
-    df = pd.merge(gainers1h, gainers24h)
-
+def get_top_gainers(exchange_names, n, metrics=screener.g_default_metrics, quote_suffix='/USD', min_volume=10000):
+    '''
+    exchange_names: exchange name or list of exchange names, their symbols are ranked together (see screener.get_top_gainers)
+    return the symbols in the top n of every metric (1h and 24h changes by default), with the column exchange if there are several exchanges
+    '''
+    several_exchanges = not isinstance(exchange_names, str)
+    if not several_exchanges:
+        exchange_names = [exchange_names]
+    futures = executors.get_io_executor().map(get_exchange_and_markets, [(exchange_name,) for exchange_name in exchange_names])
+    markets_by_exchange = {exchange_name: future.result()[1] for exchange_name, future in zip(exchange_names, futures)}
+
+    df = screener.get_top_gainers(markets_by_exchange, n, metrics, quote_suffix, 'quoteVolume24h', min_volume)
+    if not several_exchanges:
+        df = df.drop(columns=['exchange'])
     return df
@@ -0,0 +1,176 @@
+import asyncio
+import atexit
+import threading
+import pandas as pd
+from . import utils
+from . import cache
+from . import crypto
+from . import executors
+from . import ohlcv_resampler
+
+'''
+Asynchronous variant of crypto.get_symbol_ohlcv built on ccxt.async_support: the requests of all
+the symbols are awaited by one event loop instead of one thread per symbol. The loop runs in a
+daemon thread so that the synchronous code (flask views) submits coroutines to it with run().
+The clients are shared by all the requests, their aiohttp sessions keep the connections alive.
+'''
+
+ccxt_async = utils.lazy_import("ccxt.async_support")
+
+async def _run_in_io_executor(function, *args):
+    # blocking work is done by the shared io executor (same limits as the threads path), not by the event loop
+    return await asyncio.wrap_future(executors.get_io_executor().submit(function, *args))
+
+def _create_ccxt_async_exchange(exchange_name):
+    if not hasattr(ccxt_async, exchange_name):
+        return None
+    return getattr(ccxt_async, exchange_name)()
+
+class AsyncExchangePool():
+    '''
+    asynchronous ccxt clients, one per exchange, with the markets of the synchronous pool (crypto.g_exchange_pool):
+    the markets are neither downloaded twice nor kept twice
+    create_exchange: function exchange name -> asynchronous client (None if the exchange is unknown)
+    '''
+    def __init__(self, create_exchange=_create_ccxt_async_exchange):
+        self.create_exchange = create_exchange
+        self.exchanges = {}
+        self.markets = {}
+        self.locks = {}
+
+    async def get_exchange(self, exchange_name):
+        '''
+        return the shared asynchronous client with up to date markets, None if the exchange is unknown
+        '''
+        # one client per exchange even if several coroutines ask for it at the same time
+        async with self.locks.setdefault(exchange_name, asyncio.Lock()):
+            # the markets may be downloaded or reloaded, it is done out of the event loop
+            exchange, markets = await _run_in_io_executor(crypto.get_exchange_and_markets, exchange_name)
+            if exchange == None:
+                return None
+            async_exchange = self.exchanges.get(exchange_name)
+            if async_exchange == None:
+                async_exchange = self.create_exchange(exchange_name)
+                if async_exchange == None:
+                    return None
+                self.exchanges[exchange_name] = async_exchange
+            if self.markets.get(exchange_name) is not markets:
+                async_exchange.set_markets(markets, exchange.currencies)
+                self.markets[exchange_name] = markets
+            return async_exchange
+
+    async def close(self):
+        for exchange in self.exchanges.values():
+            await exchange.close()
+        self.exchanges.clear()
+        self.markets.clear()
+        self.locks.clear()
+
+class EventLoopThread():
+    '''
+    event loop running in a daemon thread, started at the first call to run()
+    '''
+    def __init__(self):
+        self.loop = None
+        self.lock = threading.Lock()
+
+    def get_loop(self):
+        with self.lock:
+            if self.loop == None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, name="crypto_async", daemon=True).start()
+            return self.loop
+
+    def run(self, coroutine, timeout=None):
+        '''
+        run the coroutine in the event loop and return its result, from any thread but the loop's one
+        '''
+        return asyncio.run_coroutine_threadsafe(coroutine, self.get_loop()).result(timeout)
+
+    def stop(self):
+        with self.lock:
+            loop, self.loop = self.loop, None
+        if loop != None:
+            asyncio.run_coroutine_threadsafe(g_exchange_pool.close(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+
+g_exchange_pool = AsyncExchangePool()
+g_event_loop = EventLoopThread()
+
+# the aiohttp sessions are closed before the interpreter exits
+atexit.register(g_event_loop.stop)
+
+def run(coroutine, timeout=None):
+    return g_event_loop.run(coroutine, timeout)
+
+async def _fetch_ohlcv(exchange, symbol, since, timeframe, limit):
+    pages = crypto.plan_ohlcv_pages(exchange, timeframe, since, limit)
+    if pages == None:
+        return "timeframe not supported"
+
+    semaphore = asyncio.Semaphore(executors.get_max_concurrency("ohlcv_pages") or len(pages))
+    async def fetch_page(page):
+        async with semaphore:
+            return await exchange.fetch_ohlcv(symbol, timeframe, page["since"], page["limit"])
+    return crypto._make_ohlcv_from_pages(await asyncio.gather(*[fetch_page(page) for page in pages]))
+
+async def _get_ohlcv(exchange, symbol, start, end, timeframe, limit, exchange_name):
+    # same as crypto._get_ohlcv
+    since, limit = crypto._get_since_and_limit(start, end, timeframe, limit)
+
+    source = crypto.get_resampling_source(exchange, exchange_name, symbol, timeframe, since, limit)
+    if source != None:
+        # built from finer bars
+        source_timeframe, source_since, source_limit = source
+        df_result = await _get_ohlcv_range(exchange, symbol, source_since, source_timeframe, source_limit, exchange_name)
+        if isinstance(df_result, pd.DataFrame):
+            df_result = ohlcv_resampler.resample_ohlcv(df_result, timeframe)
+    else:
+        df_result = await _get_ohlcv_range(exchange, symbol, since, timeframe, limit, exchange_name)
+
+    if isinstance(df_result, pd.DataFrame) and df_result.empty:
+        return "no data"
+    return df_result
+
+async def _get_ohlcv_range(exchange, symbol, since, timeframe, limit, exchange_name):
+    if crypto.g_ohlcv_store != None and limit != None:
+        # the store is synchronous (file locks): it runs in the io executor and its fetches come back to the event loop
+        loop = asyncio.get_running_loop()
+        until = since + limit * cache.get_timeframe_duration(timeframe) * 1000
+        fetch = lambda fetch_since, fetch_limit: asyncio.run_coroutine_threadsafe(_fetch_ohlcv(exchange, symbol, fetch_since, timeframe, fetch_limit), loop).result()
+        return await _run_in_io_executor(crypto.g_ohlcv_store.get_ohlcv, exchange_name, symbol, timeframe, since, until, fetch)
+    return await _fetch_ohlcv(exchange, symbol, since, timeframe, limit)
+
+async def get_symbol_ohlcv(exchange_name, symbol, start=None, end=None, timeframe="1d", length=None, indicators={}, use_cache=True, compact=False):
+    '''
+    same as crypto.get_symbol_ohlcv, with the same cache
+    '''
+    cache_key, last_bar, ohlcv = crypto._get_cached_symbol_ohlcv(exchange_name, symbol, start, end, timeframe, length, indicators, use_cache, compact)
+    if ohlcv is not None:
+        return ohlcv
+
+    try:
+        exchange = await g_exchange_pool.get_exchange(exchange_name)
+        reason = crypto._check_symbol(exchange, symbol)
+        if reason != None:
+            return reason
+
+        ohlcv = await _get_ohlcv(exchange, symbol, start, end, timeframe, length, exchange_name)
+        # the indicators would block all the other symbols in the event loop
+        ohlcv = await _run_in_io_executor(crypto._complete_symbol_ohlcv, ohlcv, exchange_name, symbol, start, end, timeframe, length, indicators)
+    except executors.ExecutorBusy:
+        return "server busy"
+    except Exception as exception:
+        utils.print_exception_info(exception)
+        return "{}: {}".format(type(exception).__name__, exception)
+    return crypto._put_cached_symbol_ohlcv(ohlcv, cache_key, last_bar, compact)
+
+async def get_symbols_ohlcv(exchange_name, symbols, start=None, end=None, timeframe="1d", length=None, indicators={}, use_cache=True, compact=False):
+    '''
+    return the list of the results of get_symbol_ohlcv in the order of the symbols, at most g_max_concurrency["history_async"] symbols at a time
+    '''
+    semaphore = asyncio.Semaphore(executors.get_max_concurrency("history_async") or len(symbols))
+    async def get_one(symbol):
+        async with semaphore:
+            return await get_symbol_ohlcv(exchange_name, symbol, start, end, timeframe, length, indicators, use_cache, compact)
+    return await asyncio.gather(*[get_one(symbol) for symbol in symbols])
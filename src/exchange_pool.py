@@ -0,0 +1,169 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from . import utils
+
+ccxt = utils.lazy_import("ccxt")
+
+# exchanges managed by fdp
+g_exchange_names = ["hitbtc", "bitmex", "binance", "ftx"]
+
+def _create_ccxt_exchange(exchange_name):
+    if exchange_name not in g_exchange_names or not hasattr(ccxt, exchange_name):
+        return None
+    return getattr(ccxt, exchange_name)()
+
+class ExchangePool():
+    '''
+    Process-wide ccxt clients, one per exchange, with their markets.
+    The markets are downloaded once and kept for ttl seconds. After refresh_ratio * ttl,
+    they are refreshed in the background while the current ones are still served.
+    ttl: lifetime of the markets in seconds
+    refresh_ratio: part of the lifetime after which a background refresh starts
+    snapshot_directory: optional directory where the markets are saved, a restarted process reads them instead of downloading them
+    create_exchange: function exchange name -> client (None if the exchange is unknown)
+    '''
+    def __init__(self, ttl=3600, refresh_ratio=0.8, snapshot_directory=None, create_exchange=_create_ccxt_exchange):
+        self.ttl = ttl
+        self.refresh_ratio = refresh_ratio
+        self.snapshot_directory = snapshot_directory
+        self.create_exchange = create_exchange
+        self.entries = {} # exchange name -> {"exchange", "timestamp", "refreshing"}
+        self.locks = {}
+        self.lock = threading.Lock()
+        self.loads = 0
+        self.hits = 0
+        self.refreshes = 0
+        self.snapshot_loads = 0
+
+    def _get_exchange_lock(self, exchange_name):
+        with self.lock:
+            return self.locks.setdefault(exchange_name, threading.Lock())
+
+    def _get_valid_entry(self, exchange_name):
+        entry = self.entries.get(exchange_name)
+        if entry == None or time.time() - entry["timestamp"] >= self.ttl:
+            return None
+        with self.lock:
+            self.hits += 1
+        return entry
+
+    def _get_snapshot_filename(self, exchange_name):
+        return os.path.join(self.snapshot_directory, exchange_name + "_markets.json")
+
+    def _write_snapshot(self, exchange_name, exchange, timestamp):
+        if self.snapshot_directory == None:
+            return
+        snapshot = {"timestamp": timestamp, "markets": exchange.markets, "currencies": exchange.currencies}
+        filename = self._get_snapshot_filename(exchange_name)
+        # written aside then renamed, a reader never gets a partial file
+        # (a temporary file per writer: the processes of a server may share the directory)
+        f = tempfile.NamedTemporaryFile("w", dir=self.snapshot_directory, prefix=exchange_name + "_markets.", suffix=".tmp", delete=False)
+        try:
+            with f:
+                json.dump(snapshot, f, default=str)
+            os.replace(f.name, filename)
+        except (OSError, ValueError, TypeError) as exception:
+            # the snapshot is only a shortcut for the next start, the markets are served anyway
+            utils.print_exception_info(exception)
+            os.remove(f.name)
+
+    def _read_snapshot(self, exchange_name, exchange):
+        if self.snapshot_directory == None:
+            return None
+        filename = self._get_snapshot_filename(exchange_name)
+        if not os.path.exists(filename):
+            return None
+        # a snapshot which can't be read or decoded is ignored, the markets are downloaded again
+        try:
+            with open(filename) as f:
+                snapshot = json.load(f)
+            if time.time() - snapshot["timestamp"] >= self.ttl:
+                return None
+            exchange.set_markets(snapshot["markets"], snapshot["currencies"])
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as exception:
+            utils.print_exception_info(exception)
+            return None
+        return snapshot["timestamp"]
+
+    def _load(self, exchange_name):
+        # return the entry with a client and its markets, from the snapshot if it is recent enough
+        exchange = self.create_exchange(exchange_name)
+        if exchange == None:
+            return None
+        timestamp = self._read_snapshot(exchange_name, exchange)
+        if timestamp != None:
+            with self.lock:
+                self.snapshot_loads += 1
+        else:
+            exchange.load_markets()
+            timestamp = time.time()
+            self._write_snapshot(exchange_name, exchange, timestamp)
+            with self.lock:
+                self.loads += 1
+        return {"exchange": exchange, "timestamp": timestamp, "refreshing": False}
+
+    def _refresh(self, exchange_name):
+        entry = None
+        try:
+            exchange = self.create_exchange(exchange_name)
+            exchange.load_markets()
+            timestamp = time.time()
+            self._write_snapshot(exchange_name, exchange, timestamp)
+            entry = {"exchange": exchange, "timestamp": timestamp, "refreshing": False}
+        except Exception as exception:
+            utils.print_exception_info(exception)
+        with self.lock:
+            if entry != None:
+                self.entries[exchange_name] = entry
+                self.refreshes += 1
+            elif exchange_name in self.entries:
+                self.entries[exchange_name]["refreshing"] = False
+
+    def _start_refresh(self, exchange_name):
+        with self.lock:
+            entry = self.entries.get(exchange_name)
+            if entry == None or entry["refreshing"]:
+                return
+            entry["refreshing"] = True
+        threading.Thread(target=self._refresh, args=(exchange_name,), daemon=True).start()
+
+    def get_exchange_and_markets(self, exchange_name):
+        '''
+        return the shared client and its markets, (None, {}) if the exchange is unknown
+        '''
+        entry = self._get_valid_entry(exchange_name)
+        if entry == None:
+            # only one thread downloads the markets, the others wait for them
+            with self._get_exchange_lock(exchange_name):
+                entry = self._get_valid_entry(exchange_name)
+                if entry == None:
+                    entry = self._load(exchange_name)
+                    if entry == None:
+                        return None, {}
+                    with self.lock:
+                        self.entries[exchange_name] = entry
+        if time.time() - entry["timestamp"] >= self.ttl * self.refresh_ratio:
+            self._start_refresh(exchange_name)
+        return entry["exchange"], entry["exchange"].markets
+
+    def get_exchange(self, exchange_name):
+        exchange, _ = self.get_exchange_and_markets(exchange_name)
+        return exchange
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "exchanges": {exchange_name: {"age": time.time() - entry["timestamp"], "refreshing": entry["refreshing"]} for exchange_name, entry in self.entries.items()},
+                "ttl": self.ttl,
+                "loads": self.loads,
+                "hits": self.hits,
+                "refreshes": self.refreshes,
+                "snapshot_loads": self.snapshot_loads
+            }
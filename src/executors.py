@@ -0,0 +1,185 @@
+import atexit
+import os
+import threading
+import concurrent.futures
+
+'''
+Executors shared by all the requests of the service instead of a pool per request:
+- io: threads waiting for the exchanges and the web sites
+- cpu: processes for the pure python computations (labeling)
+Their sizes are read from FDP_IO_WORKERS, FDP_IO_QUEUE, FDP_IO_NESTED_WORKERS, FDP_CPU_WORKERS and FDP_CPU_QUEUE.
+'''
+
+class ExecutorBusy(Exception):
+    pass
+
+# maximum number of tasks run at the same time for one request
+g_max_concurrency = {
+    "history": 8,
+    "history_async": 32, # coroutines instead of threads
+    "ohlcv_pages": 4,
+    "panel": 8,
+    "tradingview": 4,
+    "labeling": None # as many as the cpu executor has workers
+}
+
+def get_max_concurrency(name):
+    return g_max_concurrency.get(name)
+
+# set in the processes of the process pools
+g_in_process_worker = False
+
+def _init_process_worker():
+    global g_in_process_worker
+    g_in_process_worker = True
+
+class BoundedExecutor():
+    '''
+    name: used in the thread names and the stats
+    max_workers: number of threads or processes
+    max_queue: number of tasks waiting for a worker, beyond it the submissions are rejected at once (ExecutorBusy)
+    processes: processes instead of threads
+    nested_workers: threads of a second pool running the maps called from the tasks (see map), 0 to run them inline
+    '''
+    def __init__(self, name, max_workers, max_queue, processes=False, nested_workers=0):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.processes = processes
+        self.executor = None
+        # process owning the pool, a forked child inherits the object but not the pool
+        self.pid = os.getpid()
+        self.slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.rejected = 0
+        self.nested = None
+        if nested_workers > 0 and not processes:
+            self.nested = BoundedExecutor(name + "_nested", nested_workers, max_queue)
+            # the tasks of both pools are seen from the same threads
+            self.nested.local = self.local
+
+    def _get_executor(self):
+        with self.lock:
+            if self.executor == None:
+                if self.processes:
+                    self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_process_worker)
+                else:
+                    self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.name)
+            return self.executor
+
+    def _run_in_worker(self, function, *args, **kwargs):
+        self.local.worker = self
+        return function(*args, **kwargs)
+
+    def is_in_worker(self):
+        if self.processes:
+            return g_in_process_worker or os.getpid() != self.pid
+        worker = getattr(self.local, "worker", None)
+        return worker != None and worker in (self, self.nested)
+
+    def _release(self, future):
+        self.slots.release()
+        if not future.cancelled() and isinstance(future.exception(), concurrent.futures.BrokenExecutor):
+            # a new pool is created for the next tasks
+            with self.lock:
+                self.executor = None
+
+    def submit(self, function, *args, **kwargs):
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            raise ExecutorBusy("{} executor is busy".format(self.name))
+        try:
+            if self.processes:
+                future = self._get_executor().submit(function, *args, **kwargs)
+            else:
+                future = self._get_executor().submit(self._run_in_worker, function, *args, **kwargs)
+        except BaseException:
+            self.slots.release()
+            raise
+        with self.lock:
+            self.submitted += 1
+        future.add_done_callback(self._release)
+        return future
+
+    def map(self, function, arguments, max_concurrency=None):
+        '''
+        function(*args) for each tuple args of arguments, with at most max_concurrency tasks at a time
+        (max_workers by default). Called from a task of the same executor, the calls are made by the
+        nested pool: a task waiting for tasks queued behind it would never end. Called from a task of the
+        nested pool (or without nested pool), they are made in the current thread. The same goes for
+        a process pool used from one of its workers or from any other process than its owner.
+        return the futures in the order of the arguments, they are all done
+        '''
+        arguments = list(arguments)
+        if max_concurrency == None:
+            max_concurrency = self.max_workers
+        executor = self
+        if self.is_in_worker():
+            executor = self.nested if getattr(self.local, "worker", None) is self else None
+        if executor == None or max_concurrency <= 1 or len(arguments) <= 1:
+            return [_run_now(function, args) for args in arguments]
+
+        futures = []
+        pending = set()
+        for args in arguments:
+            if len(pending) >= max_concurrency:
+                _, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            future = executor.submit(function, *args)
+            futures.append(future)
+            pending.add(future)
+        concurrent.futures.wait(pending)
+        return futures
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor != None:
+            executor.shutdown(wait=True)
+        if self.nested != None:
+            self.nested.shutdown()
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "pending": self.max_workers + self.max_queue - self.slots._value,
+                "submitted": self.submitted,
+                "rejected": self.rejected
+            }
+
+def _run_now(function, args):
+    future = concurrent.futures.Future()
+    try:
+        future.set_result(function(*args))
+    except Exception as exception:
+        future.set_exception(exception)
+    return future
+
+def failed_future(exception):
+    # done future raising exception, for the tasks which could not be submitted
+    future = concurrent.futures.Future()
+    future.set_exception(exception)
+    return future
+
+def _get_size(variable, default):
+    return int(os.environ.get(variable, default))
+
+g_io_executor = BoundedExecutor("io", _get_size("FDP_IO_WORKERS", 32), _get_size("FDP_IO_QUEUE", 256), nested_workers=_get_size("FDP_IO_NESTED_WORKERS", 32))
+g_cpu_executor = BoundedExecutor("cpu", _get_size("FDP_CPU_WORKERS", os.cpu_count() or 1), _get_size("FDP_CPU_QUEUE", 64), processes=True)
+
+# the processes are stopped before the interpreter tears the modules down
+atexit.register(g_io_executor.shutdown)
+atexit.register(g_cpu_executor.shutdown)
+
+def get_io_executor():
+    return g_io_executor
+
+def get_cpu_executor():
+    return g_cpu_executor
+
+def get_stats():
+    return {"io": g_io_executor.get_stats(), "io_nested": g_io_executor.nested.get_stats() if g_io_executor.nested != None else {}, "cpu": g_cpu_executor.get_stats()}
@@ -1,143 +1,53 @@
+import functools
+import types
 import pandas as pd
-from parse import parse
-from stockstats import StockDataFrame as Sdf
-from finta import TA
 import numpy as np
-from . import indicators_vsa as vsa
-from . import indicators_flabeling as flabeling
-from . import indicators_supertrend as supertrend
-from . import indicators_tradingview as tv
-from . import indicators_synthetic_data as synthetic
+from . import indicators_planner as planner
+from . import utils
 
-def compute_indicators(df, indicators, keep_only_requested_indicators = False, params = None):
+def compute_indicators(df, indicators, keep_only_requested_indicators = False, params = None, compact = False):
+    '''
+    compact: the indicators are computed in float64 and the result is downcast (see utils.compact_dataframe)
+    '''
     if not isinstance(df, pd.DataFrame):
         return df
 
+    if compact:
+        df = utils.float32_to_float64(df)
+
     # manage indicators as an array but it is converted into a dictionary
     if isinstance(indicators, list):
         indicators = dict.fromkeys(indicators)
 
-    # call stockstats
-    stock = Sdf.retype(df.copy())
-
-    # compute the indicators
-    columns = list(df.columns)
-    for indicator, parameters in indicators.items():
-        if indicator in columns:
-            continue
-
-        trend_parsed = parse('trend_{}d', indicator)
-        sma_parsed = parse('sma_{}', indicator)
-        ema_parsed = parse('ema_{}', indicator)
-        wma_parsed = parse('wma_{}', indicator)
-
-        if trend_parsed != None and trend_parsed[0].isdigit():
-            seq = int(trend_parsed[0])
-            diff = df["close"] - df["close"].shift(seq)
-            df["trend_"+str(seq)+"d"] = diff.gt(0).map({False: 0, True: 1})
-
-        elif sma_parsed != None and sma_parsed[0].isdigit():
-            seq = int(sma_parsed[0])
-            df["sma_"+str(seq)] = TA.SMA(stock, seq).copy()
-
-        elif ema_parsed != None and ema_parsed[0].isdigit():
-            period = int(ema_parsed[0])
-            df["ema_"+str(period)] = TA.EMA(stock, period = period).copy()
-
-        elif wma_parsed != None and wma_parsed[0].isdigit():
-            period = int(wma_parsed[0])
-            df["wma_"+str(period)] = TA.WMA(stock, period = period).copy()
-
-        elif indicator == 'macd':
-            df['macd'] = stock.get('macd').copy() # from stockstats
-            #df['macd'] = TA.MACD(stock)['MACD'].copy() # from finta
-
-        elif indicator == 'macds':
-            df['macds'] = stock.get('macds').copy() # from stockstats
-
-        elif indicator == 'macdh':
-            df['macdh'] = stock.get('macdh').copy() # from stockstats
-
-        elif indicator == 'bbands':
-            bbands = TA.BBANDS(stock).copy()
-            df = pd.concat([df, bbands], axis = 1)
-            df.rename(columns={'BB_UPPER': 'bb_upper'}, inplace=True)
-            df.rename(columns={'BB_MIDDLE': 'bb_middle'}, inplace=True)
-            df.rename(columns={'BB_LOWER': 'bb_lower'}, inplace=True)
-
-        elif indicator == 'rsi_30':
-            df['rsi_30'] = stock.get('rsi_30').copy()
-        
-        elif indicator == 'cci_30':
-            df['cci_30'] = stock.get('cci_30').copy()
-        
-        elif indicator == 'dx_30':
-            df['dx_30'] = stock.get('dx_30').copy()
-        
-        elif indicator == 'williams_%r':
-            df['williams_%r'] = TA.WILLIAMS(stock).copy()
-
-        elif indicator == 'stoch_%k':
-            df['stoch_%k'] = TA.STOCH(stock).copy()
-
-        elif indicator == 'stoch_%d':
-            df['stoch_%d'] = TA.STOCHD(stock).copy()
-           
-        elif indicator == 'er':
-            df['er'] = TA.ER(stock).copy()
-           
-        elif indicator == 'stc':
-            df['stc'] = TA.STC(stock).copy()
-           
-        elif indicator == 'atr':
-            df['atr'] = TA.ATR(stock).copy()
-           
-        elif indicator == 'adx':
-            df['adx'] = TA.ADX(stock).copy()
-           
-        elif indicator == 'roc':
-            df['roc'] = TA.ROC(stock).copy()
-
-        elif indicator == 'mom':
-            df['mom'] = TA.MOM(stock).copy()
-
-        elif indicator == 'simple_rtn':
-            df['simple_rtn'] = df['close'].pct_change()
-
-        elif indicator == 'labeling':
-            df = flabeling.data_labeling(df, params)
-
-        elif indicator.startswith('tv_'):
-            df[indicator] = tv.get_recommendation(df, indicator, params)
-
-        elif indicator.startswith('close_synthetic_'):
-            df[indicator] = synthetic.get_synthetic_data(df, indicator, params)
-
-        elif indicator == 'vsa':
-            days = [1, 2, 3, 5, 20, 40, 60]
-            df = vsa.create_bunch_of_vsa_features(df, days)
-            df['outcomes_vsa'] = df.close.pct_change(-1)
-
-        elif indicator == "super_trend_direction":
-            st = supertrend.SuperTrend(
-                    df['high'], 
-                    df['low'], 
-                    df['close'], 
-                    15, # self.st_short_atr_window
-                    5 # self.st_short_atr_multiplier
-                )
-                
-            df['super_trend_direction'] = st.super_trend_direction()
-            #df['super_trend_direction'] = df['super_trend_direction'].shift(1)
-
+    # the shared intermediates (EMAs, rolling means, true range...) are computed once for all the indicators
+    plan = planner.plan_indicators(list(df.columns), list(indicators))
+    df = planner.run_plan(df, plan, params)
 
     # keep only the requested indicators
     if keep_only_requested_indicators:
-        for column in list(df.columns):
-            if column not in indicators:
-                df.drop(columns=[column], inplace=True)
+        df = df.drop(columns=[column for column in df.columns if column not in indicators])
+
+    if compact:
+        df, df.attrs["memory"] = utils.compact_dataframe(df)
 
     return df
+
+def explain_indicators(df, indicators):
+    '''
+    df: dataframe or list of its columns
+    indicators: requested indicators
+    dry run of compute_indicators: return the steps and the shared intermediates without computing anything
+    '''
+    columns = list(df.columns) if isinstance(df, pd.DataFrame) else list(df)
+    return planner.explain_plan(planner.plan_indicators(columns, list(indicators)))
+
+def register_indicator(name, builder, prefix=False):
+    '''
+    add an indicator to compute_indicators (see indicators_planner.make_step)
+    name: indicator name, or prefix of the indicator names (ending with '_') if prefix is True
+    builder: function(indicator, suffix, request) returning the step or None if the indicator is not valid
+    '''
+    planner.register_indicator(name, builder, prefix)
     
 def make_date(df, date_field):
     "Make sure `df[date_field]` is of the right date type."
@@ -147,6 +57,34 @@ def make_date(df, date_field):
     if not np.issubdtype(field_dtype, np.datetime64):
         df[date_field] = pd.to_datetime(df[date_field], infer_datetime_format=True)
 
+g_day_ns = 24 * 3600 * 10 ** 9
+
+@functools.lru_cache(maxsize=32)
+def get_calendar_table(start, end):
+    '''
+    start, end: first and last days (number of days since epoch)
+    return the date features of add_temporal_indicators for each day of the range (read only mapping name -> array)
+    the table is shared by all the callers through the cache, it can't be modified
+    '''
+    dates = pd.to_datetime(np.arange(start, end + 1), unit='D')
+    table = {
+        'Year': dates.year.to_numpy(np.int64),
+        'Month': dates.month.to_numpy(np.int64),
+        'Week': dates.isocalendar().week.to_numpy(np.int64),
+        'Day': dates.day.to_numpy(np.int64),
+        'Dayofweek': dates.dayofweek.to_numpy(np.int64),
+        'Dayofyear': dates.dayofyear.to_numpy(np.int64),
+        'Is_month_end': dates.is_month_end,
+        'Is_month_start': dates.is_month_start,
+        'Is_quarter_end': dates.is_quarter_end,
+        'Is_quarter_start': dates.is_quarter_start,
+        'Is_year_end': dates.is_year_end,
+        'Is_year_start': dates.is_year_start
+    }
+    for values in table.values():
+        values.setflags(write=False)
+    return types.MappingProxyType(table)
+
 def add_temporal_indicators(df, field_name, time=False):
     "Helper function that adds columns relevant to a date in the column `field_name` of `df`."
 
@@ -168,13 +106,32 @@ def add_temporal_indicators(df, field_name, time=False):
 
     field = df[field_name]
     prefix = "" #ifnone(prefix, re.sub('[Dd]ate$', '', field_name))
-    attr = ['Year', 'Month', 'Week', 'Day', 'Dayofweek', 'Dayofyear', 'Is_month_end', 'Is_month_start',
-            'Is_quarter_end', 'Is_quarter_start', 'Is_year_end', 'Is_year_start']
-    if time: attr = attr + ['Hour', 'Minute', 'Second']
-    # Pandas removed `dt.week` in v1.1.10
-    week = field.dt.isocalendar().week.astype(field.dt.day.dtype) if hasattr(field.dt, 'isocalendar') else field.dt.week
-    for n in attr: df[prefix + n] = getattr(field.dt, n.lower()) if n != 'Week' else week
-    mask = ~field.isna()
+
+    # the date features are computed once per day in the calendar table and broadcast to the rows
+    # wall time for the features, utc for Elapsed
+    local_field = field
+    if isinstance(field.dtype, pd.core.dtypes.dtypes.DatetimeTZDtype):
+        local_field = field.dt.tz_localize(None)
+    values = local_field.values.astype(np.int64)
+    mask = ~field.isna().values
+    days = values // g_day_ns
+    start = days[mask].min() if mask.any() else 0
+    end = days[mask].max() if mask.any() else 0
+    days = np.where(mask, days, start)
+    calendar = get_calendar_table(int(start), int(end))
+    indexer = days - start
+    for n, column in calendar.items():
+        column = column[indexer]
+        if not mask.all():
+            if column.dtype == bool:
+                column = column & mask
+            else:
+                column = np.where(mask, column, np.nan)
+        df[prefix + n] = column
+    if time:
+        seconds = np.where(mask, values - days * g_day_ns, 0) // 10 ** 9
+        for n, column in [('Hour', seconds // 3600), ('Minute', seconds // 60 % 60), ('Second', seconds % 60)]:
+            df[prefix + n] = column if mask.all() else np.where(mask, column, np.nan)
     df[prefix + 'Elapsed'] = np.where(mask, field.values.astype(np.int64) // 10 ** 9, np.nan)
     if field_to_drop: df.drop(field_name, axis=1, inplace=True)
 
@@ -255,20 +212,59 @@ def shift(df, indicator, shift):
     df[indicator] = df[indicator].shift(shift)
     return df
 
-def remove_missing_values(df):
-    df['inf'] = 0
-    for col in df.columns:
-        df['inf'] = np.where((df[col] == np.inf) | (df[col] == -np.inf), 1, df['inf'])
-
-    df = df.drop(df[df.inf == 1].index)
-    df = df.drop(['inf'], axis=1)
-
-    df.replace([np.inf, -np.inf], np.nan)
-    # Drop the NaNs
-    df.dropna(axis=0, how='any', inplace=True)
-
-    return df
+def _get_missing_values_masks(df):
+    '''
+    return two boolean arrays: rows with an infinite value, rows with a missing value
+    '''
+    infinite = np.zeros(len(df.index), dtype=bool)
+    missing = np.zeros(len(df.index), dtype=bool)
+    floats = df.select_dtypes(include=[np.floating])
+    if len(floats.columns) != 0:
+        values = floats.to_numpy()
+        infinite |= np.isinf(values).any(axis=1)
+        missing |= np.isnan(values).any(axis=1)
+    # integers and booleans are never missing, objects may hold anything
+    objects = df.select_dtypes(exclude=[np.floating, np.integer, np.bool_])
+    if len(objects.columns) != 0:
+        infinite |= objects.isin([np.inf, -np.inf]).any(axis=1).to_numpy()
+        missing |= objects.isna().any(axis=1).to_numpy()
+    return infinite, missing
 
+def remove_missing_values(df):
+    # drop the rows with an infinite or a missing value
+    infinite, missing = _get_missing_values_masks(df)
+    return df.take(np.flatnonzero(~(infinite | missing)))
+
+def clean_dataset(df, features=None, shifts=None, duplicates=True):
+    '''
+    cleaning in one pass: remove_features, shift, remove_missing_values and remove_duplicates
+    features: columns to remove
+    shifts: dictionary column -> shift (ex: {"target": -1})
+    duplicates: remove the duplicated rows
+    df is left unchanged: return the cleaned copy and the number of rows dropped for each reason
+    '''
+    if features:
+        df = df.drop(columns=[feature for feature in features if feature in df.columns])
+    if shifts:
+        df = df.assign(**{column: df[column].shift(int(periods)) for column, periods in shifts.items()})
+
+    infinite, missing = _get_missing_values_masks(df)
+    keep = ~(infinite | missing)
+    report = {
+        "rows": len(df.index),
+        "infinite_values": int(infinite.sum()),
+        "missing_values": int((missing & ~infinite).sum()),
+        "duplicates": 0
+    }
+    if duplicates:
+        duplicated = np.zeros(len(df.index), dtype=bool)
+        duplicated[keep] = df[keep].duplicated().to_numpy()
+        report["duplicates"] = int(duplicated.sum())
+        keep &= ~duplicated
+
+    df = df.take(np.flatnonzero(keep))
+    report["remaining_rows"] = len(df.index)
+    return df, report
 
 def remove_duplicates(df):
     df.drop_duplicates(inplace=True)
@@ -4,9 +4,12 @@ Reference:    https://towardsdatascience.com/the-triple-barrier-method-251268419
 """
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
+from . import executors
+from datetime import datetime
 
 def plot_barriers_out(barriers, filename):
+    # matplotlib is only needed with labeling_debug
+    import matplotlib.pyplot as plt
     plt.style.use('seaborn')
     plt.rcParams['figure.figsize'] = [16, 9]
     plt.rcParams['figure.dpi'] = 300
@@ -23,6 +26,7 @@ def plot_barriers_out(barriers, filename):
     plt.clf()
 
 def plot_barriers_dynamic(barriers, t_final, filename):
+    import matplotlib.pyplot as plt
     fig, ax = plt.subplots()
     ax.set(title='stock price', xlabel='date', ylabel='price')
     ax.plot(barriers.price[100: 200])
@@ -60,12 +64,13 @@ def plot_barriers_dynamic(barriers, t_final, filename):
 # for intraday data
 def get_daily_volatility_for_intraday_data(close,span0=100):
     # daily vol, reindexed to close
+    # position of the last bar before (t - 1 day), the first bars have none
     df0=close.index.searchsorted(close.index-pd.Timedelta(days=1))
-    df0=df0[df0>0]
-    a = df0 -1 #using a variable to avoid the error message.
-    df0=pd.Series(close.index[a], index=close.index[close.shape[0]-df0.shape[0]:])
-    df0=close.loc[df0.index]/close.loc[df0.values].values-1
+    df0=df0[df0>0] - 1
+    values=close.to_numpy(dtype=float)
+    first=values.shape[0]-df0.shape[0]
     # daily returns
+    df0=pd.Series(values[first:]/values[df0]-1, index=close.index[first:])
     df0=df0.ewm(span=span0).std()
     return df0
 
@@ -79,171 +84,310 @@ def get_daily_volatility_for_daily_data(close,span0=20):
     return df0
 
 def get_3_barriers(prices, high, low, daily_volatility, t_final, upper_lower_multipliers):
-    #create a container
-    barriers = pd.DataFrame(columns=['days_passed', 'price', 'high', 'low', 'vert_barrier', 'top_barrier', 'bottom_barrier'],
-                            index = daily_volatility.index)
-    for day, vol in daily_volatility.iteritems():
-        days_passed = len(daily_volatility.loc[daily_volatility.index[0] : day])
-        #set the vertical barrier
-        if (days_passed + t_final < len(daily_volatility.index) and t_final != 0):
-            vert_barrier = daily_volatility.index[days_passed + t_final]
-        else:
-            # Labeling with nan ending
-            vert_barrier = np.nan
-            decreasing = False
-            if decreasing:
-                # Labeling with decreasing ending
-                vert_barrier = daily_volatility.index[len(daily_volatility.index) - 1]
-        #set the top barrier
-        if upper_lower_multipliers[0] > 0:
-            top_barrier = prices.loc[day] + prices.loc[day] * upper_lower_multipliers[0] * vol
-        else:
-            #set it to NaNs
-            top_barrier = pd.Series(index=prices.index)
-        #set the bottom barrier
-        if upper_lower_multipliers[1] > 0:
-            bottom_barrier = prices.loc[day] - prices.loc[day] * upper_lower_multipliers[1] * vol
-        else:
-            #set it to NaNs
-            bottom_barrier = pd.Series(index=prices.index)
+    n = len(daily_volatility.index)
+    vol = daily_volatility.to_numpy(dtype=float)
+    price = prices.loc[daily_volatility.index].to_numpy(dtype=float)
 
-        barriers.loc[day, ['days_passed', 'price', 'high', 'low', 'vert_barrier','top_barrier', 'bottom_barrier']] = days_passed, prices.loc[day], high.loc[day], low.loc[day], vert_barrier, top_barrier, bottom_barrier
+    #set the vertical barrier t_final+1 bars after the event (nan ending when out of range)
+    days_passed = np.arange(1, n + 1)
+    vert_pos = days_passed + t_final
+    has_vert_barrier = (vert_pos < n) & (t_final != 0)
+    vert_barrier = pd.Series(daily_volatility.index[np.minimum(vert_pos, n - 1)], index=daily_volatility.index)
+    vert_barrier = vert_barrier.where(has_vert_barrier)
 
-    barriers['out'] = None
+    #set the top and bottom barriers, NaNs when the multiplier is not positive
+    if upper_lower_multipliers[0] > 0:
+        top_barrier = price + price * upper_lower_multipliers[0] * vol
+    else:
+        top_barrier = np.full(n, np.nan)
+    if upper_lower_multipliers[1] > 0:
+        bottom_barrier = price - price * upper_lower_multipliers[1] * vol
+    else:
+        bottom_barrier = np.full(n, np.nan)
+
+    barriers = pd.DataFrame({'days_passed': days_passed,
+                             'price': price,
+                             'high': high.loc[daily_volatility.index].to_numpy(dtype=float),
+                             'low': low.loc[daily_volatility.index].to_numpy(dtype=float),
+                             'vert_barrier': vert_barrier,
+                             'top_barrier': top_barrier,
+                             'bottom_barrier': bottom_barrier},
+                            index = daily_volatility.index)
+    barriers['out'] = np.nan
     return barriers
 
+def get_vert_barrier_positions(barriers):
+    # position of the vertical barrier of each event, -1 when there is none
+    ends = barriers.index.get_indexer(barriers['vert_barrier'])
+    ends[barriers['vert_barrier'].isna().to_numpy()] = -1
+    return ends
+
+def get_windows(values, window):
+    # row i holds the values [i, i + window[, padded with NaNs after the last value
+    padding = np.full(window - 1, np.nan)
+    return np.lib.stride_tricks.sliding_window_view(np.concatenate([values, padding]), window)
+
+def get_window_blocks(n, window, max_block_size):
+    # split the events by blocks to keep the (block x window) temporaries bounded
+    block_size = max(1, max_block_size // window)
+    for block_start in range(0, n, block_size):
+        yield slice(block_start, block_start + block_size)
+
+def get_spans(ends):
+    # number of bars between each event and its vertical barrier, -1 when there is none
+    spans = np.where(ends >= 0, ends - np.arange(len(ends)), -1)
+    window = spans.max() + 1 if len(spans) > 0 else 0
+    return spans, max(window, 0)
+
+def get_first_touches(high, low, top_barrier, bottom_barrier, ends, max_block_size=1 << 22):
+    '''
+    high: prices checked against the top barrier
+    low: prices checked against the bottom barrier
+    top_barrier, bottom_barrier: barriers of each event
+    ends: position of the vertical barrier of each event (-1 if there is none)
+    return the offsets of the first bar touching the top and the bottom barriers inside [start, end].
+    An offset equal to the window size means that the barrier is never touched.
+    '''
+    n = len(high)
+    spans, window = get_spans(ends)
+    first_top = np.full(n, window, dtype=np.int64)
+    first_bottom = first_top.copy()
+    if window == 0:
+        return first_top, first_bottom, window
+
+    high_windows = get_windows(high, window)
+    low_windows = get_windows(low, window)
+    offsets = np.arange(window)
+    for block in get_window_blocks(n, window, max_block_size):
+        inside = offsets <= spans[block, None]
+        with np.errstate(invalid='ignore'):
+            hit_top = (high_windows[block] >= top_barrier[block, None]) & inside
+            hit_bottom = (low_windows[block] <= bottom_barrier[block, None]) & inside
+        first_top[block] = np.where(hit_top.any(axis=1), hit_top.argmax(axis=1), window)
+        first_bottom[block] = np.where(hit_bottom.any(axis=1), hit_bottom.argmax(axis=1), window)
+
+    return first_top, first_bottom, window
+
+def get_highest_before(high, ends, stops, max_block_size=1 << 22):
+    '''
+    high: prices checked against the top barrier
+    ends: position of the vertical barrier of each event (-1 if there is none)
+    stops: offset of the first bar excluded from the search for each event
+    return the highest price from the event up to its vertical barrier, stopping before stops (-inf if empty)
+    '''
+    n = len(high)
+    spans, window = get_spans(ends)
+    highest = np.full(n, -np.inf)
+    if window == 0:
+        return highest
+
+    high_windows = get_windows(high, window)
+    offsets = np.arange(window)
+    for block in get_window_blocks(n, window, max_block_size):
+        inside = (offsets <= spans[block, None]) & (offsets < stops[block, None])
+        highest[block] = np.where(inside, high_windows[block], -np.inf).max(axis=1)
+
+    return highest
+
+def get_prices_for_labels(barriers, use_high_low):
+    if use_high_low == True:
+        return barriers.high.to_numpy(dtype=float), barriers.low.to_numpy(dtype=float)
+    price = barriers.price.to_numpy(dtype=float)
+    return price, price
 
 def get_labels(barriers, label_below=0, label_middle=1, label_above=2, use_high_low=False):
     '''
     start: first day of the window
     end:last day of the window
-    price_initial: first day stock price
-    price_final:last day stock price
     top_barrier: profit taking limit
     bottom_barrier:stop loss limt
-    condition_pt:top_barrier touching conditon
-    condition_sl:bottom_barrier touching conditon
+    first_top: first touch of the top_barrier
+    first_bottom: first touch of the bottom_barrier
+    the first barrier to be reached sets the label, the stop loss wins when both are reached on the same day
     '''
-    floating = False
-    for i in range(len(barriers.index)):
-        start = barriers.index[i]
-        end = barriers.vert_barrier[i]
-        if pd.notna(end):
-            # assign the top and bottom barriers
-            top_barrier = barriers.top_barrier[i]
-            bottom_barrier = barriers.bottom_barrier[i]
-            #set the profit taking and stop loss conditons
-            if use_high_low == True:
-                high_price = barriers.high[start: end].copy()
-                low_price = barriers.low[start: end].copy()
-            else:
-                high_price = barriers.price[start: end].copy()
-                low_price = barriers.price[start: end].copy()
-
-            condition_pt = (high_price >= top_barrier).any()
-            condition_sl = (low_price <= bottom_barrier).any()
-            #set the first to reach the barrier
-            if condition_pt and condition_sl:
-                cpt_date = barriers.index[i]
-                condition_pt_loc = False
-                j=1
-                while (cpt_date <= end) and (condition_pt_loc == False):
-                    if(high_price[cpt_date] >= top_barrier):
-                        condition_pt_loc = cpt_date
-                    else:
-                        cpt_date = barriers.index[i+j]
-                        j=j+1
-                cpt_date = barriers.index[i]
-                condition_sl_loc = False
-                j=1
-                while (cpt_date <= end) and (condition_sl_loc == False):
-                    if(low_price[cpt_date] <= bottom_barrier):
-                        condition_sl_loc = cpt_date
-                    else:
-                        cpt_date = barriers.index[i+j]
-                        j=j+1
-                if condition_pt_loc < condition_sl_loc:
-                    condition_sl = False
-                else:
-                    condition_pt = False
-            #assign the labels
-            if condition_pt:
-                barriers['out'][i] = label_above
-            elif condition_sl:
-                barriers['out'][i] = label_below
-            else:
-                if not floating:
-                    barriers['out'][i] = label_middle
-                else:
-                    price_initial = barriers.price[start]
-                    price_final = barriers.price[end]
-                    barriers['out'][i] = max([(price_final - price_initial) / (top_barrier - price_initial),
-                                            (price_final - price_initial) / (price_initial - bottom_barrier)],
-                                            key=abs)
+    high_price, low_price = get_prices_for_labels(barriers, use_high_low)
+    ends = get_vert_barrier_positions(barriers)
+    first_top, first_bottom, window = get_first_touches(high_price, low_price,
+                                                        barriers.top_barrier.to_numpy(dtype=float),
+                                                        barriers.bottom_barrier.to_numpy(dtype=float),
+                                                        ends)
+
+    #assign the labels
+    out = np.where(first_top < first_bottom, label_above,
+                   np.where(first_bottom < window, label_below, label_middle)).astype(float)
+    out[ends < 0] = np.nan
+    barriers['out'] = out
     return barriers
 
-def is_in_half_brackets(df, limit_high, limit_low):
-    if ((df.out.sum() <= limit_high) and (df.out.sum() >= limit_low)):
+def get_upper_multiplier_thresholds(barriers, daily_volatility, use_high_low=False):
+    '''
+    return, for each event:
+    - the highest upper multiplier for which the top barrier is touched before the stop loss and the vertical barrier
+    - whether the stop loss is touched
+    - whether the event has a vertical barrier
+    the top barrier of an event is touched for any upper multiplier lower or equal to its threshold
+    '''
+    high_price, low_price = get_prices_for_labels(barriers, use_high_low)
+    ends = get_vert_barrier_positions(barriers)
+    bottom_barrier = barriers.bottom_barrier.to_numpy(dtype=float)
+    _, first_bottom, window = get_first_touches(high_price, low_price, np.full(len(ends), np.nan), bottom_barrier, ends)
+    highest = get_highest_before(high_price, ends, first_bottom)
+
+    price = barriers.price.to_numpy(dtype=float)
+    vol = daily_volatility.loc[barriers.index].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        thresholds = (highest - price) / (price * vol)
+    # without volatility the top barrier is the price itself
+    thresholds = np.where(vol == 0, np.where(highest >= price, np.inf, -np.inf), thresholds)
+
+    return thresholds, first_bottom < window, ends >= 0
+
+def get_chunks(n, t_final, chunk_size):
+    # each chunk labels the events [start, stop[ and needs the bars up to their vertical barriers
+    overlap = t_final + 1
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        yield start, stop, min(stop + overlap, n)
+
+def map_chunks(func, barriers, daily_volatility, t_final, chunk_size, max_workers, *args):
+    '''
+    func(barriers_chunk, volatility_chunk, n_events, *args) returns a tuple of arrays for the n_events first events
+    the chunks are processed by the shared cpu executor (at most max_workers at a time) and the arrays are stitched back in order
+    '''
+    chunks = [(barriers.iloc[start:end], daily_volatility.iloc[start:end], stop - start, *args)
+              for start, stop, end in get_chunks(len(barriers.index), t_final, chunk_size)]
+    try:
+        futures = executors.get_cpu_executor().map(func, chunks, max_workers)
+        results = [future.result() for future in futures]
+    except executors.ExecutorBusy:
+        # the chunks are processed by the caller rather than failing the labeling
+        results = [func(*chunk) for chunk in chunks]
+    return tuple(np.concatenate(arrays) for arrays in zip(*results))
+
+def _get_labels_chunk(barriers, daily_volatility, n_events, label_below, label_middle, label_above, use_high_low):
+    out = get_labels(barriers.copy(), label_below, label_middle, label_above, use_high_low)['out'].to_numpy()
+    return (out[:n_events],)
+
+def _get_upper_multiplier_thresholds_chunk(barriers, daily_volatility, n_events, use_high_low):
+    return tuple(array[:n_events] for array in get_upper_multiplier_thresholds(barriers, daily_volatility, use_high_low))
+
+def get_labels_chunked(barriers, daily_volatility, t_final, label_below=0, label_middle=1, label_above=2, use_high_low=False,
+                       chunk_size=None, max_workers=None):
+    # same labels as get_labels, computed by time chunks overlapping by t_final + 1 bars
+    if not chunk_size:
+        return get_labels(barriers, label_below, label_middle, label_above, use_high_low)
+    barriers['out'], = map_chunks(_get_labels_chunk, barriers, daily_volatility, t_final, chunk_size, max_workers,
+                                  label_below, label_middle, label_above, use_high_low)
+    return barriers
+
+def get_upper_multiplier_thresholds_chunked(barriers, daily_volatility, t_final, use_high_low=False,
+                                            chunk_size=None, max_workers=None):
+    if not chunk_size:
+        return get_upper_multiplier_thresholds(barriers, daily_volatility, use_high_low)
+    return map_chunks(_get_upper_multiplier_thresholds_chunk, barriers, daily_volatility, t_final, chunk_size, max_workers,
+                      use_high_low)
+
+def is_in_half_brackets(labels_sum, limit_high, limit_low):
+    if ((labels_sum <= limit_high) and (labels_sum >= limit_low)):
         return True
     else:
         return False
 
-def is_over_brackets(df, limit_high):
-    if (df.out.sum() >= limit_high):
+def is_over_brackets(labels_sum, limit_high):
+    if (labels_sum >= limit_high):
         return True
     else:
         return False
 
-def is_under_brackets(df, limit_low):
-    if (df.out.sum() <= limit_low):
+def is_under_brackets(labels_sum, limit_low):
+    if (labels_sum <= limit_low):
         return True
     else:
         return False
 
-def get_balanced_upper_multiplier(prices, highs, lows,
-                                  daily_volatility, t_final,
-                                  upper_multiplier, lower_multiplier,
-                                  label_below, label_middle, label_above, use_high_low):
+def search_balanced_upper_multiplier(get_labels_sum, upper_multiplier, n, max_steps=100, debug=False):
+    '''
+    get_labels_sum: function returning the sum of the labels for a given upper multiplier
+    bisection of the upper multiplier until the sum of the labels is balanced around n / 2
+    debug: print the upper multiplier found
+    '''
     min_max_range = 0.5          # Range between the max upper_multiplier and min upper_multiplier
     coef_threshold = 0.001       # Balance +/- coef precision
-    
+
     upper_multiplier_max = upper_multiplier + upper_multiplier * min_max_range
     upper_multiplier_min = upper_multiplier - upper_multiplier * min_max_range
-    high_threshold = int(len(prices) * 0.5 + len(prices) * coef_threshold)
-    low_threshold = int(len(prices) * 0.5 - len(prices) * coef_threshold)
-
-    barriers = get_3_barriers(prices, highs, lows, daily_volatility, t_final, [upper_multiplier_max, lower_multiplier])
-    barriers = get_labels(barriers, label_below, label_middle, label_above, use_high_low)
+    high_threshold = int(n * 0.5 + n * coef_threshold)
+    low_threshold = int(n * 0.5 - n * coef_threshold)
 
-    if is_in_half_brackets(barriers, high_threshold, low_threshold):
-        return barriers
-    else:
-        if is_over_brackets(barriers, high_threshold):
-            # upper_multiplier over boundaries
-            return barriers
+    labels_sum = get_labels_sum(upper_multiplier_max)
+    if is_in_half_brackets(labels_sum, high_threshold, low_threshold) or is_over_brackets(labels_sum, high_threshold):
+        # upper_multiplier over boundaries
+        return upper_multiplier_max
 
-    barriers = get_3_barriers(prices, highs, lows, daily_volatility, t_final, [upper_multiplier_min, lower_multiplier])
-    barriers = get_labels(barriers, label_below, label_middle, label_above, use_high_low)
+    labels_sum = get_labels_sum(upper_multiplier_min)
+    if is_in_half_brackets(labels_sum, high_threshold, low_threshold) or is_under_brackets(labels_sum, low_threshold):
+        # upper_multiplier under boundaries
+        return upper_multiplier_min
 
-    if is_in_half_brackets(barriers, high_threshold, low_threshold):
-        return barriers
-    else:
-        if is_under_brackets(barriers, low_threshold):
-            # upper_multiplier under boundaries
-            return barriers
-    while True:
+    upper_multiplier_step = upper_multiplier_min
+    for _ in range(max_steps):
         upper_multiplier_step = upper_multiplier_min + (upper_multiplier_max - upper_multiplier_min) * 0.5
-        barriers = get_3_barriers(prices, highs, lows, daily_volatility, t_final, [upper_multiplier_step, lower_multiplier])
-        barriers = get_labels(barriers, label_below, label_middle, label_above, use_high_low)
+        labels_sum = get_labels_sum(upper_multiplier_step)
 
-        if is_in_half_brackets(barriers, high_threshold, low_threshold):
-            print("Upper multiplier coef: ",upper_multiplier_step)
-            return barriers
+        if is_in_half_brackets(labels_sum, high_threshold, low_threshold):
+            break
+        if is_under_brackets(labels_sum, low_threshold):
+            upper_multiplier_max = upper_multiplier_step
         else:
-            if is_under_brackets(barriers, low_threshold):
-                upper_multiplier_max = upper_multiplier_step
-            else:
-                upper_multiplier_min = upper_multiplier_step
+            upper_multiplier_min = upper_multiplier_step
+
+    if debug:
+        print("Upper multiplier coef: ",upper_multiplier_step)
+    return upper_multiplier_step
+
+def get_balanced_upper_multiplier(prices, highs, lows,
+                                  daily_volatility, t_final,
+                                  upper_multiplier, lower_multiplier,
+                                  label_below, label_middle, label_above, use_high_low,
+                                  chunk_size=None, max_workers=None, debug=False):
+    # relabel every event at each step of the search
+    all_barriers = {}
+    def get_labels_sum(multiplier):
+        barriers = get_3_barriers(prices, highs, lows, daily_volatility, t_final, [multiplier, lower_multiplier])
+        all_barriers[multiplier] = get_labels_chunked(barriers, daily_volatility, t_final,
+                                                      label_below, label_middle, label_above, use_high_low,
+                                                      chunk_size, max_workers)
+        return all_barriers[multiplier].out.sum()
+
+    multiplier = search_balanced_upper_multiplier(get_labels_sum, upper_multiplier, len(prices), debug=debug)
+    return all_barriers[multiplier]
+
+def get_balanced_upper_multiplier_sweep(prices, highs, lows,
+                                        daily_volatility, t_final,
+                                        upper_multiplier, lower_multiplier,
+                                        label_below, label_middle, label_above, use_high_low,
+                                        chunk_size=None, max_workers=None, debug=False):
+    # one pass over the events: the label of an event only depends on its upper multiplier threshold
+    barriers = get_3_barriers(prices, highs, lows, daily_volatility, t_final, [upper_multiplier, lower_multiplier])
+    thresholds, stop_loss, valid = get_upper_multiplier_thresholds_chunked(barriers, daily_volatility, t_final, use_high_low,
+                                                                           chunk_size, max_workers)
+    thresholds = thresholds[valid]
+    stop_loss = stop_loss[valid]
+    n_events = len(thresholds)
+    sorted_thresholds = np.sort(thresholds)
+    sorted_stop_loss_thresholds = np.sort(thresholds[stop_loss])
+
+    def get_labels_sum(multiplier):
+        n_under = np.searchsorted(sorted_thresholds, multiplier, side='left')
+        n_above = n_events - n_under
+        n_below = np.searchsorted(sorted_stop_loss_thresholds, multiplier, side='left')
+        n_middle = n_under - n_below
+        return label_above * n_above + label_below * n_below + label_middle * n_middle
+
+    multiplier = search_balanced_upper_multiplier(get_labels_sum, upper_multiplier, len(prices), debug=debug)
+    barriers = get_3_barriers(prices, highs, lows, daily_volatility, t_final, [multiplier, lower_multiplier])
+    return get_labels_chunked(barriers, daily_volatility, t_final, label_below, label_middle, label_above, use_high_low,
+                              chunk_size, max_workers)
 
 def data_labeling(df, params = None):
     debug = False
@@ -254,7 +398,11 @@ def data_labeling(df, params = None):
     label_middle = 1
     label_above = 2
     use_balanced_upper_multiplier = False
+    balanced_mode = "sweep"
     use_high_low = False
+    volatility = "daily"
+    chunk_size = None
+    max_workers = None
     if params:
         debug = params.get('labeling_debug', debug)
         t_final = params.get('labeling_t_final', t_final)
@@ -278,16 +426,28 @@ def data_labeling(df, params = None):
         use_balanced_upper_multiplier = params.get('use_balanced_upper_multiplier', use_balanced_upper_multiplier)
         if isinstance(use_balanced_upper_multiplier, str):
             use_balanced_upper_multiplier = bool(use_balanced_upper_multiplier)
+        balanced_mode = params.get('labeling_balanced_mode', balanced_mode)
         use_high_low = params.get('use_high_low', use_high_low)
         if isinstance(use_high_low, str):
             use_high_low = bool(use_high_low)
+        volatility = params.get('labeling_volatility', volatility)
+        chunk_size = params.get('labeling_chunk_size', chunk_size)
+        if isinstance(chunk_size, str):
+            chunk_size = int(chunk_size)
+        max_workers = params.get('labeling_max_workers', max_workers)
+        if isinstance(max_workers, str):
+            max_workers = int(max_workers)
 
     price = df["close"].copy()
     high = df["high"].copy()
     low = df["low"].copy()
 
-    #set the boundary of barriers, based on 20 days EWM
-    daily_volatility = get_daily_volatility_for_daily_data(price)
+    #set the boundary of barriers, based on 20 days EWM (or 100 bars EWM of the daily returns for intraday data)
+    #the volatility is computed over the whole series: its EWM has no finite warmup to split it by chunks
+    if volatility == "intraday":
+        daily_volatility = get_daily_volatility_for_intraday_data(price).dropna()
+    else:
+        daily_volatility = get_daily_volatility_for_daily_data(price)
 
     #align the index
     prices = price[daily_volatility.index]
@@ -296,13 +456,19 @@ def data_labeling(df, params = None):
 
     if use_balanced_upper_multiplier:
         # Find optimized upper_multiplier coef in order to get balanced labeling feature
-        barriers = get_balanced_upper_multiplier(prices, highs, lows,
-                                                daily_volatility, t_final,
-                                                upper_multiplier, lower_multiplier,
-                                                label_below, label_middle, label_above, use_high_low)
+        if balanced_mode == "relabel":
+            get_balanced_barriers = get_balanced_upper_multiplier
+        else:
+            get_balanced_barriers = get_balanced_upper_multiplier_sweep
+        barriers = get_balanced_barriers(prices, highs, lows,
+                                         daily_volatility, t_final,
+                                         upper_multiplier, lower_multiplier,
+                                         label_below, label_middle, label_above, use_high_low,
+                                         chunk_size, max_workers, debug)
     else:
         barriers = get_3_barriers(prices, highs, lows, daily_volatility, t_final, [upper_multiplier, lower_multiplier])
-        barriers = get_labels(barriers, label_below, label_middle, label_above)
+        barriers = get_labels_chunked(barriers, daily_volatility, t_final, label_below, label_middle, label_above,
+                                      chunk_size=chunk_size, max_workers=max_workers)
 
     if debug:
         plot_barriers_out(barriers, filename="./test/generated/labeling_barriers_out")
@@ -312,3 +478,47 @@ def data_labeling(df, params = None):
     df["labeling"] = barriers['out'].copy()
     
     return df
+
+def _data_labeling_symbol(df, params):
+    start = datetime.now()
+    try:
+        labeling = data_labeling(df, params)["labeling"]
+        result = {"status": "ok", "labeling": labeling}
+    except Exception as exception:
+        result = {"status": "ko", "reason": "{}: {}".format(type(exception).__name__, exception)}
+    result["elapsed_time"] = str(datetime.now() - start)
+    return result
+
+def data_labeling_batch(dfs, params = None, max_workers = None):
+    '''
+    dfs: dictionary symbol -> ohlcv dataframe
+    params: labeling parameters shared by all the symbols (see data_labeling)
+    max_workers: maximum number of symbols labeled at the same time by the shared cpu executor, the symbols are labeled in the current process if set to 1
+    return a dictionary symbol -> {"status", "labeling" or "reason", "elapsed_time"}
+    '''
+    # the debug outputs would be overwritten by every symbol
+    params = dict(params or {}, labeling_debug=False)
+
+    # only the prices used by the labeling are sent to the workers
+    results = {}
+    tasks = {}
+    for symbol, df in dfs.items():
+        if not isinstance(df, pd.DataFrame) or not {"close", "high", "low"}.issubset(df.columns):
+            results[symbol] = {"status": "ko", "reason": "close, high and low are required", "elapsed_time": "0"}
+        else:
+            tasks[symbol] = df[["close", "high", "low"]]
+
+    if max_workers == None:
+        max_workers = executors.get_max_concurrency("labeling")
+    try:
+        futures = executors.get_cpu_executor().map(_data_labeling_symbol, [(df, params) for df in tasks.values()], max_workers)
+    except executors.ExecutorBusy as exception:
+        futures = [executors.failed_future(exception)] * len(tasks)
+    for symbol, future in zip(tasks, futures):
+        try:
+            results[symbol] = future.result()
+        except Exception as exception:
+            # the worker itself failed (pickling, broken pool...)
+            results[symbol] = {"status": "ko", "reason": "{}: {}".format(type(exception).__name__, exception), "elapsed_time": "0"}
+
+    return {symbol: results[symbol] for symbol in dfs}
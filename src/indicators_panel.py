@@ -0,0 +1,173 @@
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from . import indicators_planner as planner
+
+'''
+Indicators for a panel of symbols: every field (open, high, low, close, volume) is a dataframe
+with one row per bar and one column per symbol, the indicators are computed for all the symbols at once.
+The values are the same as compute_indicators for each symbol.
+'''
+g_fields = ['open', 'high', 'low', 'close', 'volume']
+
+def make_panel(dfs, fields=g_fields):
+    '''
+    dfs: dictionary symbol -> ohlcv dataframe
+    return a dictionary field -> dataframe (bars x symbols) aligned on the union of the indexes
+    '''
+    symbols = list(dfs.keys())
+    index = None
+    for df in dfs.values():
+        index = df.index if index is None else index.union(df.index)
+    panel = {}
+    for field in fields:
+        columns = {symbol: df[field].reindex(index) for symbol, df in dfs.items() if field in df.columns}
+        if len(columns) == len(symbols):
+            panel[field] = pd.DataFrame(columns, index=index, columns=symbols)
+    return panel
+
+def make_panel_from_arrays(index, symbols, **fields):
+    '''
+    index: bars, symbols: columns
+    fields: 2-D arrays (bars x symbols) given by name (close=..., high=...)
+    '''
+    return {field: pd.DataFrame(values, index=index, columns=symbols) for field, values in fields.items()}
+
+###
+### kernels: (panel, args) -> dictionary column -> dataframe (bars x symbols)
+###
+def _ema(values, span):
+    return values.ewm(span=span, adjust=True).mean()
+
+def _get_true_range(panel):
+    # same as finta TR: max of the three ranges, the missing ones are skipped
+    prev_close = panel['close'].shift()
+    ranges = np.stack([(panel['high'] - panel['low']).abs().to_numpy(),
+                       (panel['high'] - prev_close).abs().to_numpy(),
+                       (prev_close - panel['low']).abs().to_numpy()])
+    with np.errstate(invalid='ignore'):
+        true_range = np.fmax(np.fmax(ranges[0], ranges[1]), ranges[2])
+    return pd.DataFrame(true_range, index=panel['close'].index, columns=panel['close'].columns)
+
+def _kernel_sma(panel, indicator, window):
+    return {indicator: panel['close'].rolling(window=window).mean()}
+
+def _kernel_ema(panel, indicator, span):
+    return {indicator: _ema(panel['close'], span)}
+
+def _kernel_wma(panel, indicator, window):
+    # weights 1..window from the oldest bar, as finta WMA
+    close = panel['close'].to_numpy(dtype=float)
+    wma = np.full(close.shape, np.nan)
+    if len(close) >= window:
+        weights = np.arange(1, window + 1) / (window * (window + 1) / 2)
+        wma[window - 1:] = sliding_window_view(close, window, axis=0) @ weights
+    return {indicator: pd.DataFrame(wma, index=panel['close'].index, columns=panel['close'].columns)}
+
+def _kernel_macd(panel, indicator):
+    # same as stockstats
+    macd = _ema(panel['close'], 12) - _ema(panel['close'], 26)
+    macds = _ema(macd, 9)
+    return {'macd': macd, 'macds': macds, 'macdh': macd - macds}
+
+def _kernel_rsi(panel, indicator, window):
+    # same as stockstats rsi_N
+    change = panel['close'].diff().fillna(0.)
+    gains = ((change + change.abs()) / 2).ewm(alpha=1. / window, adjust=True).mean()
+    losses = ((-change + change.abs()) / 2).ewm(alpha=1. / window, adjust=True).mean()
+    return {indicator: 100 - 100 / (1. + gains / losses)}
+
+def _kernel_atr(panel, indicator, window):
+    return {indicator: _get_true_range(panel).rolling(window=window).mean()}
+
+def _kernel_bbands(panel, indicator, window, std_multiplier):
+    middle_band = panel['close'].rolling(window=window).mean()
+    std = panel['close'].rolling(window=window).std()
+    return {'bb_upper': middle_band + (std_multiplier * std),
+            'bb_middle': middle_band,
+            'bb_lower': middle_band - (std_multiplier * std)}
+
+def _kernel_mom(panel, indicator, periods):
+    return {indicator: panel['close'].diff(periods)}
+
+def _kernel_roc(panel, indicator, periods):
+    return {indicator: (panel['close'].diff(periods) / panel['close'].shift(periods)) * 100}
+
+def _kernel_trend(panel, indicator, periods):
+    return {indicator: panel['close'].diff(periods).gt(0).astype(np.int64)}
+
+def _kernel_simple_rtn(panel, indicator):
+    return {indicator: panel['close'].pct_change()}
+
+# kernels by name of the indicators_planner registry, their args are the parameters of the indicator
+g_panel_indicators = {
+    'macd': _kernel_macd,
+    'macds': _kernel_macd,
+    'macdh': _kernel_macd,
+    'atr': _kernel_atr,
+    'bbands': _kernel_bbands,
+    'mom': _kernel_mom,
+    'roc': _kernel_roc,
+    'simple_rtn': _kernel_simple_rtn,
+    'sma_': _kernel_sma,
+    'ema_': _kernel_ema,
+    'wma_': _kernel_wma,
+    'rsi_': _kernel_rsi,
+    'trend_': _kernel_trend
+}
+
+def _get_kernel(indicator):
+    # the name is read by the registry of compute_indicators, None if the indicator is unknown or has no panel kernel
+    spec = planner.get_indicator_spec(indicator)
+    if spec == None or spec[0] not in g_panel_indicators:
+        return None
+    name, parameters = spec
+    return g_panel_indicators[name], parameters
+
+def get_panel_indicators():
+    return [name + ('Nd' if name == 'trend_' else 'N') if name.endswith('_') else name for name in g_panel_indicators]
+
+def compute_panel_indicators(panel, indicators):
+    '''
+    panel: dictionary field -> dataframe (bars x symbols), see make_panel
+    indicators: list of indicators
+    return a dictionary indicator column -> dataframe (bars x symbols) and the list of unknown indicators
+    '''
+    result = {}
+    unknown = []
+    done = set()
+    for indicator in dict.fromkeys(indicators):
+        kernel = _get_kernel(indicator)
+        if kernel == None:
+            unknown.append(indicator)
+            continue
+        function, args = kernel
+        # macd, macds and macdh are computed together
+        if (function, args) in done:
+            continue
+        done.add((function, args))
+        columns = function(panel, indicator, *args)
+        if function == _kernel_macd:
+            columns = {column: values for column, values in columns.items() if column in indicators}
+        result.update(columns)
+    return result, unknown
+
+def panel_to_long(panel, fields=None):
+    '''
+    panel: dictionary column -> dataframe (bars x symbols)
+    return a long format dataframe: one row per (bar, symbol), one column per field
+    '''
+    if fields == None:
+        fields = list(panel.keys())
+    first = panel[fields[0]]
+    index = pd.MultiIndex.from_product([first.index, first.columns], names=[first.index.name or 'time', 'symbol'])
+    return pd.DataFrame({field: panel[field].to_numpy().reshape(-1) for field in fields}, index=index)
+
+def panel_to_symbols(panel, fields=None):
+    '''
+    return a dictionary symbol -> dataframe with one column per field
+    '''
+    if fields == None:
+        fields = list(panel.keys())
+    symbols = panel[fields[0]].columns
+    return {symbol: pd.DataFrame({field: panel[field][symbol] for field in fields}) for symbol in symbols}
@@ -0,0 +1,450 @@
+import functools
+import pandas as pd
+import numpy as np
+from parse import parse
+from . import indicators_vsa as vsa
+from . import indicators_flabeling as flabeling
+from . import indicators_supertrend as supertrend
+from . import indicators_tradingview as tv
+from . import indicators_synthetic_data as synthetic
+from . import utils
+
+Sdf = utils.lazy_import("stockstats", "StockDataFrame")
+TA = utils.lazy_import("finta", "TA")
+
+'''
+An intermediate is identified by a tuple (kind, arg1, arg2...), the arguments may be intermediates themselves.
+ex: ("ema", ("column", "close"), 12) is the 12 periods EMA of the close
+'''
+CLOSE = ("column", "close")
+
+def _ema(intermediates, source, span):
+    # same as finta EMA and stockstats _ema
+    return intermediates.get(source).ewm(span=span, adjust=True).mean()
+
+def _sma(intermediates, source, window):
+    return intermediates.get(source).rolling(window=window).mean()
+
+def _mstd(intermediates, source, window):
+    return intermediates.get(source).rolling(window=window).std()
+
+def _diff(intermediates, source, periods):
+    return intermediates.get(source).diff(periods)
+
+def _shift(intermediates, source, periods):
+    return intermediates.get(source).shift(periods)
+
+def _pct_change(intermediates, source):
+    return intermediates.get(source).pct_change()
+
+def _sub(intermediates, left, right):
+    return intermediates.get(left) - intermediates.get(right)
+
+def _true_range(intermediates):
+    # from the input columns: a frame kernel (vsa) may have replaced the dataframe by its features
+    return TA.TR(intermediates.get(("stockstats",)))
+
+def _stockstats(intermediates):
+    # stockstats and finta work on a copy of the input columns only
+    return Sdf.retype(intermediates.input_df[intermediates.input_columns].copy())
+
+g_intermediates = {
+    "column": lambda intermediates, column: intermediates.df[column],
+    "ema": _ema,
+    "sma": _sma,
+    "mstd": _mstd,
+    "diff": _diff,
+    "shift": _shift,
+    "pct_change": _pct_change,
+    "sub": _sub,
+    "true_range": _true_range,
+    "stockstats": _stockstats
+}
+
+def get_intermediate_name(key):
+    args = [get_intermediate_name(arg) if isinstance(arg, tuple) else str(arg) for arg in key[1:]]
+    if key[0] == "column":
+        return args[0]
+    return "{}({})".format(key[0], ", ".join(args))
+
+def get_intermediate_dependencies(key):
+    # the intermediates needed by key, key included, in computation order
+    dependencies = []
+    for arg in key[1:]:
+        if isinstance(arg, tuple):
+            dependencies.extend(get_intermediate_dependencies(arg))
+    dependencies.append(key)
+    return dependencies
+
+class SharedIntermediates():
+    '''
+    Lazy cache of the intermediates shared by the indicators of one compute_indicators call.
+    '''
+    def __init__(self, df):
+        self.df = df
+        self.input_df = df
+        self.input_columns = list(df.columns)
+        self.values = {}
+
+    def reset(self, df):
+        # the dataframe has been replaced: only the stockstats frame, built on the input columns, is still valid
+        self.df = df
+        self.values = {key: value for key, value in self.values.items() if key == ("stockstats",)}
+
+    def get(self, key):
+        if key not in self.values:
+            self.values[key] = g_intermediates[key[0]](self, *key[1:])
+        return self.values[key]
+
+###
+### kernels: (intermediates, indicator, params, *args) -> dictionary column -> values
+###
+def _kernel_intermediate(intermediates, indicator, params, key):
+    return {indicator: intermediates.get(key)}
+
+def _kernel_trend(intermediates, indicator, params, seq):
+    diff = intermediates.get(("diff", CLOSE, seq))
+    return {indicator: diff.gt(0).map({False: 0, True: 1})}
+
+def _kernel_roc(intermediates, indicator, params, period):
+    return {indicator: (intermediates.get(("diff", CLOSE, period)) / intermediates.get(("shift", CLOSE, period))) * 100}
+
+def _kernel_bbands(intermediates, indicator, params, period, std_multiplier):
+    middle_band = intermediates.get(("sma", CLOSE, period))
+    std = intermediates.get(("mstd", CLOSE, period))
+    return {'bb_upper': middle_band + (std_multiplier * std),
+            'bb_middle': middle_band,
+            'bb_lower': middle_band - (std_multiplier * std)}
+
+def _kernel_atr(intermediates, indicator, params, period):
+    return {indicator: intermediates.get(("true_range",)).rolling(center=False, window=period).mean()}
+
+def _kernel_stc(intermediates, indicator, params, period_fast, period_slow, k_period, d_period):
+    # same as finta STC with the EMAs shared with the other indicators
+    macd = intermediates.get(("sub", ("ema", CLOSE, period_fast), ("ema", CLOSE, period_slow)))
+    stok = ((macd - macd.rolling(window=k_period).min())
+            / (macd.rolling(window=k_period).max() - macd.rolling(window=k_period).min())) * 100
+    stod = stok.rolling(window=d_period).mean()
+    return {indicator: stod.rolling(window=d_period).mean()}
+
+def _kernel_stockstats(intermediates, indicator, params):
+    return {indicator: intermediates.get(("stockstats",)).get(indicator)}
+
+def _kernel_finta(intermediates, indicator, params, function, kwargs):
+    # kwargs: tuple of (name, value), the plans are shared
+    return {indicator: getattr(TA, function)(intermediates.get(("stockstats",)), **dict(kwargs))}
+
+def _kernel_super_trend(intermediates, indicator, params, atr_window, atr_multi):
+    df = intermediates.df
+    st = supertrend.SuperTrend(df['high'], df['low'], df['close'], atr_window, atr_multi)
+    return {indicator: st.super_trend_direction()}
+
+def _kernel_super_trend_grid(intermediates, indicator, params, atr_params, atr_param):
+    df = intermediates.df
+    key = ("super_trend_grid", atr_params)
+    if key not in intermediates.values:
+        intermediates.values[key] = supertrend.super_trend_direction_grid(df['high'], df['low'], df['close'], list(atr_params))
+    return {indicator: intermediates.values[key][atr_param]}
+
+def _kernel_tv(intermediates, indicator, params):
+    return {indicator: tv.get_recommendation(intermediates.df, indicator, params)}
+
+def _kernel_synthetic(intermediates, indicator, params):
+    return {indicator: synthetic.get_synthetic_data(intermediates.df, indicator, params)}
+
+###
+### frame kernels: (df, indicator, params) -> df
+###
+def _frame_kernel_labeling(df, indicator, params):
+    return flabeling.data_labeling(df, params)
+
+def _frame_kernel_vsa(df, indicator, params):
+    days = [1, 2, 3, 5, 20, 40, 60]
+    df = vsa.create_bunch_of_vsa_features(df, days)
+    df['outcomes_vsa'] = df.close.pct_change(-1)
+    return df
+
+def make_step(indicator, kernel, args=(), intermediates=(), frame=False, parameters=None):
+    '''
+    indicator: name of the requested indicator
+    kernel: function(intermediates, indicator, params, *args) returning a dictionary column -> values
+            or function(df, indicator, params, *args) returning the new dataframe if frame is True
+    args: parameters bound to the kernel, immutable as the plans are shared by the calls
+    intermediates: shared intermediates used by the kernel, computed once for all the indicators
+    parameters: parameters of the indicator (window, span...), args by default, used by the other
+                implementations of the indicator (see get_indicator_spec)
+    '''
+    return {"indicator": indicator, "kernel": kernel, "args": tuple(args), "intermediates": tuple(intermediates), "frame": frame,
+            "parameters": tuple(args) if parameters == None else tuple(parameters)}
+
+def _kernel_function(intermediates, indicator, params, function):
+    return {indicator: function(intermediates.df, params)}
+
+def make_function_step(indicator, function):
+    # function(df, params) returns the values of the indicator
+    return make_step(indicator, _kernel_function, (function,))
+
+###
+### registry: builder(indicator, suffix, request) returns the step or None if the indicator is not valid
+### suffix is the part of the name after the prefix (None for the exact names), request is shared by the builders of one plan
+###
+g_indicators = {}
+g_indicator_prefixes = {}
+
+def register_indicator(name, builder, prefix=False):
+    '''
+    name: indicator name, or prefix of the indicator names (ending with '_') if prefix is True
+    builder: function(indicator, suffix, request) returning a step made with make_step
+    '''
+    if prefix:
+        g_indicator_prefixes[name] = builder
+    else:
+        g_indicators[name] = builder
+    _compile_indicators.cache_clear()
+
+def register_function_indicator(name, function):
+    # function(df, params) returns the values of the indicator
+    register_indicator(name, lambda indicator, suffix, request: make_function_step(indicator, function))
+
+def get_registered_indicators():
+    return {"names": list(g_indicators.keys()), "prefixes": list(g_indicator_prefixes.keys())}
+
+def _build_step(indicator, request):
+    # the step gets the registered name (or prefix) of the indicator
+    builder = g_indicators.get(indicator)
+    if builder != None:
+        step = builder(indicator, None, request)
+        if step != None:
+            step["name"] = indicator
+        return step
+
+    # the longest registered prefix first
+    position = indicator.rfind('_')
+    while position > 0:
+        builder = g_indicator_prefixes.get(indicator[:position + 1])
+        if builder != None:
+            step = builder(indicator, indicator[position + 1:], request)
+            if step != None:
+                step["name"] = indicator[:position + 1]
+                return step
+        position = indicator.rfind('_', 0, position)
+    return None
+
+def get_indicator_spec(indicator):
+    '''
+    the names and their parameters are read once for all the implementations (batch, streaming, panel)
+    return the registered name (or prefix) of the indicator and its parameters, None if the indicator is unknown
+    ex: "sma_12" -> ("sma_", (12,)), "atr" -> ("atr", (14,))
+    '''
+    step = _build_step(indicator, {"indicators": (indicator,)})
+    if step == None:
+        return None
+    return step["name"], step["parameters"]
+
+def _build_close_intermediate(kind):
+    def build(indicator, suffix, request):
+        if not suffix.isdigit():
+            return None
+        key = (kind, CLOSE, int(suffix))
+        return make_step(indicator, _kernel_intermediate, (key,), [key], parameters=(int(suffix),))
+    return build
+
+def _build_trend(indicator, suffix, request):
+    if not (suffix.endswith('d') and suffix[:-1].isdigit()):
+        return None
+    seq = int(suffix[:-1])
+    return make_step(indicator, _kernel_trend, (seq,), [("diff", CLOSE, seq)])
+
+def _build_wma(indicator, suffix, request):
+    if not suffix.isdigit():
+        return None
+    return make_step(indicator, _kernel_finta, ("WMA", (("period", int(suffix)),)), [("stockstats",)], parameters=(int(suffix),))
+
+def _build_macd(indicator, suffix, request):
+    # same as stockstats: macd = ema_12 - ema_26, macds = 9 periods ema of macd, macdh = macd - macds
+    macd = ("sub", ("ema", CLOSE, 12), ("ema", CLOSE, 26))
+    macds = ("ema", macd, 9)
+    key = {'macd': macd, 'macds': macds, 'macdh': ("sub", macd, macds)}[indicator]
+    return make_step(indicator, _kernel_intermediate, (key,), [key], parameters=())
+
+def _build_intermediate(key, parameters):
+    return lambda indicator, suffix, request: make_step(indicator, _kernel_intermediate, (key,), [key], parameters=parameters)
+
+def _build_stockstats(indicator, suffix, request):
+    # stockstats reads the window from the name (rsi_14)
+    if suffix != None and not suffix.isdigit():
+        return None
+    return make_step(indicator, _kernel_stockstats, (), [("stockstats",)], parameters=(int(suffix),) if suffix != None else ())
+
+def _build_finta(function, kwargs=None):
+    kwargs = tuple(sorted((kwargs or {}).items()))
+    return lambda indicator, suffix, request: make_step(indicator, _kernel_finta, (function, kwargs), [("stockstats",)])
+
+def _build_super_trend_grid(indicator, suffix, request):
+    # all the super_trend_direction_{atr_window}_{atr_multi} of the request share one true range
+    if "super_trend_params" not in request:
+        request["super_trend_params"] = _parse_super_trend_params(request["indicators"])
+    super_trend_params = request["super_trend_params"]
+    if indicator not in super_trend_params:
+        return None
+    atr_params = tuple(super_trend_params.values())
+    return make_step(indicator, _kernel_super_trend_grid, (atr_params, super_trend_params[indicator]))
+
+def _parse_super_trend_params(indicators):
+    super_trend_params = {}
+    for indicator in indicators:
+        super_trend_parsed = parse('super_trend_direction_{}_{}', indicator)
+        if super_trend_parsed != None and super_trend_parsed[0].isdigit():
+            try:
+                super_trend_params[indicator] = (int(super_trend_parsed[0]), float(super_trend_parsed[1]))
+            except ValueError:
+                pass
+    return super_trend_params
+
+@functools.lru_cache(maxsize=256)
+def _compile_indicators(columns, indicators):
+    request = {"indicators": indicators}
+    plan = {"steps": [], "intermediates": [], "skipped": [], "unknown": []}
+    intermediates = {}
+    for indicator in indicators:
+        if indicator in columns:
+            plan["skipped"].append(indicator)
+            continue
+
+        step = _build_step(indicator, request)
+        if step is None:
+            plan["unknown"].append(indicator)
+            continue
+        plan["steps"].append(step)
+
+        for key in step["intermediates"]:
+            for dependency in get_intermediate_dependencies(key):
+                if dependency[0] != "column":
+                    intermediates[dependency] = None
+    plan["intermediates"] = list(intermediates)
+    return plan
+
+def plan_indicators(columns, indicators):
+    '''
+    columns: columns already present in the dataframe
+    indicators: requested indicators
+    return the plan: the steps to run in order and the intermediates they share
+    the plan is compiled once for a set of columns and indicators, it must not be modified
+    '''
+    return _compile_indicators(frozenset(columns), tuple(indicators))
+
+###
+### indicators of compute_indicators
+###
+register_indicator('trend_', _build_trend, prefix=True)
+register_indicator('sma_', _build_close_intermediate("sma"), prefix=True)
+register_indicator('ema_', _build_close_intermediate("ema"), prefix=True)
+register_indicator('wma_', _build_wma, prefix=True)
+for name in ['macd', 'macds', 'macdh']:
+    register_indicator(name, _build_macd)
+register_indicator('bbands', lambda indicator, suffix, request: make_step(indicator, _kernel_bbands, (20, 2), [("sma", CLOSE, 20), ("mstd", CLOSE, 20)]))
+register_indicator('rsi_', _build_stockstats, prefix=True)
+for name in ['cci_30', 'dx_30']:
+    register_indicator(name, _build_stockstats)
+register_indicator('williams_%r', _build_finta("WILLIAMS"))
+register_indicator('stoch_%k', _build_finta("STOCH"))
+register_indicator('stoch_%d', _build_finta("STOCHD"))
+register_indicator('er', _build_finta("ER"))
+register_indicator('adx', _build_finta("ADX"))
+register_indicator('stc', lambda indicator, suffix, request: make_step(indicator, _kernel_stc, (23, 50, 10, 3), [("sub", ("ema", CLOSE, 23), ("ema", CLOSE, 50))]))
+register_indicator('atr', lambda indicator, suffix, request: make_step(indicator, _kernel_atr, (14,), [("true_range",)]))
+register_indicator('roc', lambda indicator, suffix, request: make_step(indicator, _kernel_roc, (12,), [("diff", CLOSE, 12), ("shift", CLOSE, 12)]))
+register_indicator('mom', _build_intermediate(("diff", CLOSE, 10), (10,)))
+register_indicator('simple_rtn', _build_intermediate(("pct_change", CLOSE), ()))
+register_indicator('labeling', lambda indicator, suffix, request: make_step(indicator, _frame_kernel_labeling, frame=True))
+register_indicator('tv_', lambda indicator, suffix, request: make_step(indicator, _kernel_tv), prefix=True)
+register_indicator('close_synthetic_', lambda indicator, suffix, request: make_step(indicator, _kernel_synthetic), prefix=True)
+register_indicator('vsa', lambda indicator, suffix, request: make_step(indicator, _frame_kernel_vsa, frame=True))
+register_indicator('super_trend_direction', lambda indicator, suffix, request: make_step(indicator, _kernel_super_trend, (15, 5)))
+register_indicator('super_trend_direction_', _build_super_trend_grid, prefix=True)
+
+def explain_plan(plan):
+    intermediates = plan["intermediates"]
+    return {
+        "steps": [{"indicator": step["indicator"],
+                   "kernel": step["kernel"].__name__.lstrip('_'),
+                   "intermediates": [get_intermediate_name(key) for key in step["intermediates"]]}
+                  for step in plan["steps"]],
+        "intermediates": [get_intermediate_name(key) for key in intermediates],
+        "skipped": list(plan["skipped"]),
+        "unknown": list(plan["unknown"])
+    }
+
+def _get_column_values(values, index):
+    # values aligned on the index, without copy when they already are
+    if isinstance(values, pd.Series):
+        if not values.index.equals(index):
+            values = values.reindex(index)
+        return values.to_numpy()
+    return values
+
+def _make_features(columns, index):
+    '''
+    dataframe of the computed columns, the float columns are copied one after the other into a single block
+    so that each computed column can be released as soon as it is copied
+    '''
+    names = list(columns)
+    is_float = {}
+    for column in names:
+        values = _get_column_values(columns[column], index)
+        columns[column] = values
+        is_float[column] = isinstance(values, np.ndarray) and values.dtype == np.float64 and values.ndim == 1
+
+    float_names = [column for column in names if is_float[column]]
+    block = np.empty((len(float_names), len(index)))
+    for position, column in enumerate(float_names):
+        block[position] = columns.pop(column)
+    features = pd.DataFrame(block.T, index=index, columns=float_names, copy=False)
+
+    other_names = [column for column in names if not is_float[column]]
+    if len(other_names) > 0:
+        others = pd.DataFrame({column: columns.pop(column) for column in other_names}, index=index)
+        features = pd.concat([features, others], axis=1, copy=False)
+    if float_names != names:
+        features = features[names]
+    return features
+
+def _attach_columns(df, columns, keep=None):
+    '''
+    attach the computed columns to df in a single block
+    keep: columns to keep, all of them if None
+    '''
+    if keep != None:
+        dropped = [column for column in df.columns if column not in keep]
+        if len(dropped) > 0:
+            df = df.drop(columns=dropped)
+        columns = {column: values for column, values in columns.items() if column in keep}
+    if len(columns) == 0:
+        return df
+
+    # the columns already present are replaced in place
+    for column in [column for column in columns if column in df.columns]:
+        df[column] = columns.pop(column)
+    return pd.concat([df, _make_features(columns, df.index)], axis=1)
+
+def run_plan(df, plan, params = None, keep = None):
+    '''
+    df: input dataframe
+    plan: plan returned by plan_indicators, shared by the calls: read only
+    keep: columns to keep in the result, all of them if None
+    '''
+    intermediates = SharedIntermediates(df)
+    columns = {}
+    for step in plan["steps"]:
+        if step["frame"]:
+            # the frame kernels work on the columns computed so far
+            df = _attach_columns(df, columns)
+            columns = {}
+            df = step["kernel"](df, step["indicator"], params, *step["args"])
+            intermediates.reset(df)
+        else:
+            columns.update(step["kernel"](intermediates, step["indicator"], params, *step["args"]))
+    # the intermediates which are not requested can be released before the assembly
+    intermediates.reset(df)
+    intermediates.values = {}
+    return _attach_columns(df, columns, keep)
@@ -0,0 +1,389 @@
+import copy
+import threading
+from collections import deque
+import numpy as np
+from . import indicators_planner as planner
+
+'''
+Streaming versions of the indicators of compute_indicators: each new bar is processed in O(1)
+and the values are the same as the batch ones, up to floating-point rounding.
+'''
+
+class EwmState():
+    '''
+    pandas ewm(adjust=True, ignore_na=False) one value at a time
+    '''
+    def __init__(self, alpha, min_periods=0):
+        self.alpha = alpha
+        self.min_periods = max(min_periods, 1)
+        self.weighted = np.nan
+        self.old_weight = 1.
+        self.n_obs = 0
+        self.n_values = 0
+        self.value = np.nan
+
+    @classmethod
+    def from_span(cls, span, min_periods=0):
+        # same smoothing factor as pandas ewm(span=span)
+        center_of_mass = (span - 1) / 2.
+        return cls(1. / (1. + center_of_mass), min_periods)
+
+    @classmethod
+    def from_alpha(cls, alpha, min_periods=0):
+        center_of_mass = (1 - alpha) / alpha
+        return cls(1. / (1. + center_of_mass), min_periods)
+
+    def update(self, value):
+        is_observation = value == value
+        if self.n_values == 0:
+            self.weighted = value
+        elif self.weighted == self.weighted:
+            self.old_weight *= 1. - self.alpha
+            if is_observation:
+                if self.weighted != value:
+                    self.weighted = self.old_weight * self.weighted + value
+                    self.weighted /= (self.old_weight + 1.)
+                self.old_weight += 1.
+        elif is_observation:
+            self.weighted = value
+        self.n_obs += int(is_observation)
+        self.n_values += 1
+        self.value = self.weighted if self.n_obs >= self.min_periods else np.nan
+        return self.value
+
+class RollingWindowState():
+    '''
+    Last `window` values with their sum, weighted sum (weights 1..window from the oldest value)
+    and sum of squared deviations, updated in O(1).
+    They are recomputed from the window every `window` values to avoid the accumulation of rounding errors.
+    '''
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.n_nan = 0
+        self.sum = 0.
+        self.weighted_sum = 0.
+        self.n_valid = 0
+        self.mean = 0.
+        self.squared_deviations = 0.
+        self.n_values = 0
+
+    def _add(self, value):
+        self.n_valid += 1
+        delta = value - self.mean
+        self.mean += delta / self.n_valid
+        self.squared_deviations += delta * (value - self.mean)
+
+    def _remove(self, value):
+        self.n_valid -= 1
+        if self.n_valid == 0:
+            self.mean = 0.
+            self.squared_deviations = 0.
+            return
+        delta = value - self.mean
+        self.mean -= delta / self.n_valid
+        self.squared_deviations -= delta * (value - self.mean)
+
+    def _refresh(self):
+        valid = [value for value in self.values if value == value]
+        self.sum = sum(valid)
+        self.weighted_sum = sum((position + 1) * value for position, value in enumerate(self.values) if value == value)
+        self.n_valid = len(valid)
+        self.mean = self.sum / self.n_valid if self.n_valid > 0 else 0.
+        self.squared_deviations = sum((value - self.mean) ** 2 for value in valid)
+
+    def update(self, value):
+        is_observation = value == value
+        if len(self.values) == self.window:
+            value_out = self.values[0]
+            if value_out == value_out:
+                self.weighted_sum -= self.sum
+                self.sum -= value_out
+                self._remove(value_out)
+            else:
+                self.weighted_sum -= self.sum
+                self.n_nan -= 1
+        if is_observation:
+            self.weighted_sum += min(len(self.values) + 1, self.window) * value
+            self.sum += value
+            self._add(value)
+        else:
+            self.n_nan += 1
+        self.values.append(value)
+
+        self.n_values += 1
+        if self.n_values % self.window == 0:
+            self._refresh()
+
+    def is_complete(self):
+        # same as rolling(window) with min_periods=window
+        return len(self.values) == self.window and self.n_nan == 0
+
+    def get_mean(self):
+        return self.sum / self.window if self.is_complete() else np.nan
+
+    def get_weighted_mean(self):
+        return self.weighted_sum / (self.window * (self.window + 1) / 2) if self.is_complete() else np.nan
+
+    def get_std(self):
+        if not self.is_complete() or self.window < 2:
+            return np.nan
+        return np.sqrt(max(self.squared_deviations, 0.) / (self.window - 1))
+
+class LagState():
+    '''
+    Last `periods` + 1 values to get diff(periods) and shift(periods)
+    '''
+    def __init__(self, periods):
+        self.periods = periods
+        self.values = deque(maxlen=periods + 1)
+
+    def update(self, value):
+        self.values.append(value)
+
+    def get_shift(self):
+        return self.values[0] if len(self.values) == self.periods + 1 else np.nan
+
+    def get_diff(self):
+        return self.values[-1] - self.get_shift()
+
+class TrueRangeState():
+    '''
+    same as finta TR: the previous close is missing for the first bar
+    '''
+    def __init__(self):
+        self.prev_close = np.nan
+        self.value = np.nan
+
+    def update(self, high, low, close):
+        price_diffs = [abs(diff) for diff in [high - low, high - self.prev_close, self.prev_close - low] if diff == diff]
+        self.value = max(price_diffs) if price_diffs else np.nan
+        self.prev_close = close
+        return self.value
+
+class ReturnState():
+    '''
+    same as pct_change: the missing closes are forward filled
+    '''
+    def __init__(self):
+        self.prev_close = np.nan
+        self.value = np.nan
+
+    def update(self, close):
+        if close != close:
+            close = self.prev_close
+        self.value = close / self.prev_close - 1
+        self.prev_close = close
+        return self.value
+
+class RsiState():
+    '''
+    same as stockstats rsi_N: smoothed moving averages of the gains and the losses
+    '''
+    def __init__(self, window):
+        self.gains = EwmState.from_alpha(1. / window)
+        self.losses = EwmState.from_alpha(1. / window)
+        self.prev_close = np.nan
+        self.value = np.nan
+
+    def update(self, close):
+        change = close - self.prev_close
+        if change != change:
+            change = 0.
+        gain = self.gains.update((change + abs(change)) / 2)
+        loss = self.losses.update((-change + abs(change)) / 2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rs = np.float64(gain) / np.float64(loss)
+            self.value = float(100 - 100 / (1. + rs))
+        self.prev_close = close
+        return self.value
+
+###
+### kernels: values of the indicator read from the states of the last bar
+###
+def _kernel_sma(stream, indicator, window):
+    return {indicator: stream.states[("rolling", window)].get_mean()}
+
+def _kernel_ema(stream, indicator, span):
+    return {indicator: stream.states[("ema", span)].value}
+
+def _kernel_wma(stream, indicator, window):
+    return {indicator: stream.states[("rolling", window)].get_weighted_mean()}
+
+def _kernel_macd(stream, indicator):
+    macd = stream.states[("ema", 12)].value - stream.states[("ema", 26)].value
+    macds = stream.states[("macds",)].value
+    return {indicator: {"macd": macd, "macds": macds, "macdh": macd - macds}[indicator]}
+
+def _kernel_rsi(stream, indicator, window):
+    return {indicator: stream.states[("rsi", window)].value}
+
+def _kernel_atr(stream, indicator, window):
+    return {indicator: stream.states[("atr", window)].get_mean()}
+
+def _kernel_bbands(stream, indicator, window, std_multiplier):
+    rolling = stream.states[("rolling", window)]
+    middle_band = rolling.get_mean()
+    std = rolling.get_std()
+    return {'bb_upper': middle_band + (std_multiplier * std),
+            'bb_middle': middle_band,
+            'bb_lower': middle_band - (std_multiplier * std)}
+
+def _kernel_mom(stream, indicator, periods):
+    return {indicator: stream.states[("lag", periods)].get_diff()}
+
+def _kernel_roc(stream, indicator, periods):
+    lag = stream.states[("lag", periods)]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {indicator: float((np.float64(lag.get_diff()) / np.float64(lag.get_shift())) * 100)}
+
+def _kernel_trend(stream, indicator, periods):
+    return {indicator: 1 if stream.states[("lag", periods)].get_diff() > 0 else 0}
+
+def _kernel_simple_rtn(stream, indicator):
+    return {indicator: stream.states[("return",)].value}
+
+###
+### states: function(*parameters) returning the kernel, its args and the states it uses as
+### (key, factory, args, source) in update order, by name of the indicators_planner registry
+###
+g_streaming_indicators = {
+    'trend_': lambda periods: (_kernel_trend, (periods,), [(("lag", periods), LagState, (periods,), "close")]),
+    'sma_': lambda window: (_kernel_sma, (window,), [(("rolling", window), RollingWindowState, (window,), "close")]),
+    'ema_': lambda span: (_kernel_ema, (span,), [(("ema", span), EwmState.from_span, (span,), "close")]),
+    'wma_': lambda window: (_kernel_wma, (window,), [(("rolling", window), RollingWindowState, (window,), "close")]),
+    'rsi_': lambda window: (_kernel_rsi, (window,), [(("rsi", window), RsiState, (window,), "close")]),
+    'atr': lambda window: (_kernel_atr, (window,), [(("true_range",), TrueRangeState, (), "hlc"),
+                                                     (("atr", window), RollingWindowState, (window,), "true_range")]),
+    'bbands': lambda window, std_multiplier: (_kernel_bbands, (window, std_multiplier), [(("rolling", window), RollingWindowState, (window,), "close")]),
+    'mom': lambda periods: (_kernel_mom, (periods,), [(("lag", periods), LagState, (periods,), "close")]),
+    'roc': lambda periods: (_kernel_roc, (periods,), [(("lag", periods), LagState, (periods,), "close")]),
+    'simple_rtn': lambda: (_kernel_simple_rtn, (), [(("return",), ReturnState, (), "close")])
+}
+_macd_states = lambda: (_kernel_macd, (), [(("ema", 12), EwmState.from_span, (12,), "close"),
+                                           (("ema", 26), EwmState.from_span, (26,), "close"),
+                                           (("macds",), EwmState.from_span, (9,), "macd")])
+for name in ['macd', 'macds', 'macdh']:
+    g_streaming_indicators[name] = _macd_states
+
+def _get_states(indicator):
+    # the name is read by the registry of compute_indicators, None if the indicator is unknown or can't be streamed
+    spec = planner.get_indicator_spec(indicator)
+    if spec == None or spec[0] not in g_streaming_indicators:
+        return None
+    name, parameters = spec
+    return g_streaming_indicators[name](*parameters)
+
+def get_streaming_indicators():
+    return [name + ('Nd' if name == 'trend_' else 'N') if name.endswith('_') else name for name in g_streaming_indicators]
+
+class IndicatorStream():
+    '''
+    Indicators of one (symbol, timeframe) updated bar after bar.
+    indicators: list of indicators, the ones which can't be streamed are listed in self.unknown
+    '''
+    def __init__(self, indicators):
+        self.indicators = list(dict.fromkeys(indicators))
+        self.kernels = []
+        self.unknown = []
+        self.states = {}
+        self.updates = [] # (key, source) in update order, a state shared by several indicators is updated once
+        for indicator in self.indicators:
+            states = _get_states(indicator)
+            if states == None:
+                self.unknown.append(indicator)
+                continue
+            kernel, args, kernel_states = states
+            self.kernels.append((indicator, kernel, args))
+            for key, factory, factory_args, source in kernel_states:
+                if key not in self.states:
+                    self.states[key] = factory(*factory_args)
+                    self.updates.append((key, source))
+        self.n_bars = 0
+        self.values = {}
+
+    @classmethod
+    def from_history(cls, df, indicators):
+        stream = cls(indicators)
+        stream.update_many(df)
+        return stream
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        stream = cls(snapshot["indicators"])
+        stream.states = copy.deepcopy(snapshot["states"])
+        stream.n_bars = snapshot["n_bars"]
+        stream.values = dict(snapshot["values"])
+        return stream
+
+    def snapshot(self):
+        # plain python objects which can be pickled and restored with from_snapshot
+        return {
+            "indicators": list(self.indicators),
+            "states": copy.deepcopy(self.states),
+            "n_bars": self.n_bars,
+            "values": dict(self.values)
+        }
+
+    def update(self, high, low, close):
+        '''
+        add a closed bar, return the values of the indicators for this bar
+        '''
+        for key, source in self.updates:
+            state = self.states[key]
+            if source == "close":
+                state.update(close)
+            elif source == "hlc":
+                state.update(high, low, close)
+            elif source == "true_range":
+                state.update(self.states[("true_range",)].value)
+            elif source == "macd":
+                state.update(self.states[("ema", 12)].value - self.states[("ema", 26)].value)
+
+        values = {}
+        for indicator, kernel, args in self.kernels:
+            values.update(kernel(self, indicator, *args))
+        self.n_bars += 1
+        self.values = values
+        return values
+
+    def update_many(self, df):
+        # df: dataframe with close, and high and low for atr
+        high = df["high"].tolist() if "high" in df.columns else [np.nan] * len(df.index)
+        low = df["low"].tolist() if "low" in df.columns else [np.nan] * len(df.index)
+        return [self.update(*bar) for bar in zip(high, low, df["close"].tolist())]
+
+###
+### streams per (symbol, timeframe)
+###
+g_streams = {}
+g_streams_lock = threading.Lock()
+
+def get_indicator_stream(symbol, timeframe, indicators=None):
+    '''
+    return the stream of (symbol, timeframe), it is created with indicators if it doesn't exist
+    '''
+    with g_streams_lock:
+        key = (symbol, timeframe)
+        if key not in g_streams and indicators != None:
+            g_streams[key] = IndicatorStream(indicators)
+        return g_streams.get(key)
+
+def update_indicator_stream(symbol, timeframe, high, low, close):
+    stream = get_indicator_stream(symbol, timeframe)
+    if stream == None:
+        return None
+    return stream.update(high, low, close)
+
+def remove_indicator_stream(symbol, timeframe):
+    with g_streams_lock:
+        return g_streams.pop((symbol, timeframe), None)
+
+def snapshot_indicator_streams():
+    with g_streams_lock:
+        return {key: stream.snapshot() for key, stream in g_streams.items()}
+
+def restore_indicator_streams(snapshots):
+    with g_streams_lock:
+        for key, snapshot in snapshots.items():
+            g_streams[key] = IndicatorStream.from_snapshot(snapshot)
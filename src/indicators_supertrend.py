@@ -1,6 +1,84 @@
 import pandas as pd
 import numpy as np
 
+def _next_direction_and_bands(close, final_upperband, final_lowerband, prev_upperband, prev_lowerband, prev_direction):
+    # if current close price crosses above upperband
+    if close > prev_upperband:
+        direction = True
+    # if current close price crosses below lowerband
+    elif close < prev_lowerband:
+        direction = False
+    # else, the trend continues
+    else:
+        direction = prev_direction
+
+        # adjustment to the final bands
+        if direction == True and final_lowerband < prev_lowerband:
+            final_lowerband = prev_lowerband
+        if direction == False and final_upperband > prev_upperband:
+            final_upperband = prev_upperband
+
+    # to remove bands according to the trend direction
+    if direction == True:
+        final_upperband = np.nan
+    else:
+        final_lowerband = np.nan
+
+    return direction, final_upperband, final_lowerband
+
+def _next_directions_and_bands(close, final_upperband, final_lowerband, prev_upperband, prev_lowerband, prev_direction):
+    # same rule as _next_direction_and_bands for arrays of (atr_window, atr_multi) grid points
+    with np.errstate(invalid='ignore'):
+        cross_above = close > prev_upperband
+        cross_below = ~cross_above & (close < prev_lowerband)
+        direction = np.where(cross_above, True, np.where(cross_below, False, prev_direction))
+        trend_continues = ~cross_above & ~cross_below
+        final_lowerband = np.where(trend_continues & direction & (final_lowerband < prev_lowerband), prev_lowerband, final_lowerband)
+        final_upperband = np.where(trend_continues & ~direction & (final_upperband > prev_upperband), prev_upperband, final_upperband)
+
+    final_upperband = np.where(direction, np.nan, final_upperband)
+    final_lowerband = np.where(direction, final_lowerband, np.nan)
+    return direction, final_upperband, final_lowerband
+
+def get_true_range(high, low, close):
+    price_diffs = [high - low,
+                   high - close.shift(),
+                   close.shift() - low]
+    true_range = pd.concat(price_diffs, axis=1)
+    return true_range.abs().max(axis=1)
+
+def get_atr(true_range, atr_window):
+    # default ATR calculation in supertrend indicator
+    return true_range.ewm(alpha=1/atr_window,min_periods=atr_window).mean()
+
+def super_trend_direction_grid(high, low, close, atr_params):
+    '''
+    atr_params: list of (atr_window, atr_multi)
+    return a dataframe of directions with one column per (atr_window, atr_multi)
+    the true range and HL2 are computed once, the ATR once per atr_window
+    '''
+    atr_params = list(dict.fromkeys(atr_params))
+    true_range = get_true_range(high, low, close)
+    hl2 = ((high + low) / 2).to_numpy(dtype=float)
+    atrs = {atr_window: get_atr(true_range, atr_window).to_numpy(dtype=float)
+            for atr_window in dict.fromkeys(atr_window for atr_window, _ in atr_params)}
+
+    # bands for all the grid points: one row per bar, one column per (atr_window, atr_multi)
+    atr = np.column_stack([atrs[atr_window] for atr_window, _ in atr_params]) if atr_params else np.empty((len(hl2), 0))
+    atr_multi = np.array([atr_multi for _, atr_multi in atr_params], dtype=float)
+    final_upperband = hl2[:, None] + (atr_multi * atr)
+    final_lowerband = hl2[:, None] - (atr_multi * atr)
+    close = close.to_numpy(dtype=float)
+
+    supertrend = np.ones(final_upperband.shape, dtype=bool)
+    for curr in range(1, len(close)):
+        supertrend[curr], final_upperband[curr], final_lowerband[curr] = _next_directions_and_bands(
+            close[curr], final_upperband[curr], final_lowerband[curr],
+            final_upperband[curr - 1], final_lowerband[curr - 1], supertrend[curr - 1])
+
+    columns = pd.MultiIndex.from_tuples(atr_params, names=['atr_window', 'atr_multi'])
+    return pd.DataFrame(supertrend, index=high.index, columns=columns)
+
 class SuperTrend():
     def __init__(
         self,
@@ -16,65 +94,123 @@ class SuperTrend():
         self.atr_window = atr_window
         self.atr_multi = atr_multi
         self._run()
-        
+
     def _run(self):
         # calculate ATR
-        price_diffs = [self.high - self.low, 
-                    self.high - self.close.shift(), 
-                    self.close.shift() - self.low]
-        true_range = pd.concat(price_diffs, axis=1)
-        true_range = true_range.abs().max(axis=1)
-        # default ATR calculation in supertrend indicator
-        atr = true_range.ewm(alpha=1/self.atr_window,min_periods=self.atr_window).mean() 
+        true_range = get_true_range(self.high, self.low, self.close)
+        atr = get_atr(true_range, self.atr_window)
         # atr = ta.volatility.average_true_range(high, low, close, atr_period)
         # df['atr'] = df['tr'].rolling(atr_period).mean()
-        
+
         # HL2 is simply the average of high and low prices
         hl2 = (self.high + self.low) / 2
         # upperband and lowerband calculation
         # notice that final bands are set to be equal to the respective bands
-        final_upperband = hl2 + (self.atr_multi * atr)
-        final_lowerband = hl2 - (self.atr_multi * atr)
-        
+        final_upperband = (hl2 + (self.atr_multi * atr)).to_numpy(dtype=float)
+        final_lowerband = (hl2 - (self.atr_multi * atr)).to_numpy(dtype=float)
+        close = self.close.to_numpy(dtype=float)
+
         # initialize Supertrend column to True
-        supertrend = [True] * len(self.close)
-        
-        for i in range(1, len(self.close)):
-            curr, prev = i, i-1
-            
-            # if current close price crosses above upperband
-            if self.close[curr] > final_upperband[prev]:
-                supertrend[curr] = True
-            # if current close price crosses below lowerband
-            elif self.close[curr] < final_lowerband[prev]:
-                supertrend[curr] = False
-            # else, the trend continues
-            else:
-                supertrend[curr] = supertrend[prev]
-                
-                # adjustment to the final bands
-                if supertrend[curr] == True and final_lowerband[curr] < final_lowerband[prev]:
-                    final_lowerband[curr] = final_lowerband[prev]
-                if supertrend[curr] == False and final_upperband[curr] > final_upperband[prev]:
-                    final_upperband[curr] = final_upperband[prev]
-
-            # to remove bands according to the trend direction
-            if supertrend[curr] == True:
-                final_upperband[curr] = np.nan
-            else:
-                final_lowerband[curr] = np.nan
-                
+        supertrend = np.ones(len(close), dtype=bool)
+
+        # the bands depend on the previous direction: one pass over plain floats
+        direction = True
+        upperband = final_upperband.tolist()
+        lowerband = final_lowerband.tolist()
+        for curr, curr_close in enumerate(close.tolist()[1:], start=1):
+            direction, upperband[curr], lowerband[curr] = _next_direction_and_bands(
+                curr_close, upperband[curr], lowerband[curr], upperband[curr - 1], lowerband[curr - 1], direction)
+            supertrend[curr] = direction
+
         self.st = pd.DataFrame({
             'Supertrend': supertrend,
-            'Final Lowerband': final_lowerband,
-            'Final Upperband': final_upperband
-        })
-        
+            'Final Lowerband': lowerband,
+            'Final Upperband': upperband
+        }, index=self.close.index)
+
     def super_trend_upper(self):
         return self.st['Final Upperband']
-        
+
     def super_trend_lower(self):
         return self.st['Final Lowerband']
-        
+
     def super_trend_direction(self):
         return self.st['Supertrend']
+
+class SuperTrendState():
+    '''
+    Incremental SuperTrend: update() advances the ATR, the final bands and the direction in O(1) for each new bar.
+    The outputs are the same as SuperTrend computed over the whole history.
+    '''
+    def __init__(
+        self,
+        atr_window=10,
+        atr_multi=3
+    ):
+        self.atr_window = atr_window
+        self.atr_multi = atr_multi
+        # same smoothing factor as pandas ewm(alpha=1/atr_window)
+        center_of_mass = (1 - 1 / atr_window) / (1 / atr_window)
+        self.alpha = 1. / (1. + center_of_mass)
+
+        self.n_bars = 0
+        self.prev_close = np.nan
+        self.atr_weighted = np.nan
+        self.atr_old_weight = 1.
+        self.atr_n_obs = 0
+        self.atr = np.nan
+        self.direction = True
+        self.final_upperband = np.nan
+        self.final_lowerband = np.nan
+
+    @classmethod
+    def from_history(cls, high, low, close, atr_window=10, atr_multi=3):
+        state = cls(atr_window, atr_multi)
+        for bar in zip(high.tolist(), low.tolist(), close.tolist()):
+            state.update(*bar)
+        return state
+
+    def _update_atr(self, true_range):
+        # pandas ewm(adjust=True) recursion, one observation at a time
+        is_observation = true_range == true_range
+        if self.n_bars == 0:
+            self.atr_weighted = true_range
+        elif self.atr_weighted == self.atr_weighted:
+            self.atr_old_weight *= 1. - self.alpha
+            if is_observation:
+                if self.atr_weighted != true_range:
+                    self.atr_weighted = self.atr_old_weight * self.atr_weighted + true_range
+                    self.atr_weighted /= (self.atr_old_weight + 1.)
+                self.atr_old_weight += 1.
+        elif is_observation:
+            self.atr_weighted = true_range
+        self.atr_n_obs += int(is_observation)
+        self.atr = self.atr_weighted if self.atr_n_obs >= self.atr_window else np.nan
+
+    def update(self, high, low, close):
+        # true range, the previous close is missing for the first bar
+        price_diffs = [abs(diff) for diff in [high - low, high - self.prev_close, self.prev_close - low] if diff == diff]
+        true_range = max(price_diffs) if price_diffs else np.nan
+        self._update_atr(true_range)
+
+        hl2 = (high + low) / 2
+        final_upperband = hl2 + (self.atr_multi * self.atr)
+        final_lowerband = hl2 - (self.atr_multi * self.atr)
+        if self.n_bars > 0:
+            self.direction, final_upperband, final_lowerband = _next_direction_and_bands(
+                close, final_upperband, final_lowerband, self.final_upperband, self.final_lowerband, self.direction)
+
+        self.final_upperband = final_upperband
+        self.final_lowerband = final_lowerband
+        self.prev_close = close
+        self.n_bars += 1
+        return self.direction
+
+    def super_trend_upper(self):
+        return self.final_upperband
+
+    def super_trend_lower(self):
+        return self.final_lowerband
+
+    def super_trend_direction(self):
+        return self.direction
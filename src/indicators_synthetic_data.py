@@ -2,6 +2,11 @@ import pandas as pd
 import numpy as np
 
 import math
+import os
+from . import indicators_panel
+from . import utils
+
+ccxt = utils.lazy_import("ccxt")
 
 class config:
     noise_amplitude = 0.1
@@ -95,34 +100,134 @@ def get_synthetic_data(df, indicator, params):
 
     df_synthetic = build_synthetic_data(df)
 
+    values = pd.Series(np.nan, index=df_synthetic.index)
     if type == 'SINGLE_SINUS_1_FLAT':
-        df[indicator] = df_synthetic['sinus_1'] + 10
+        values = df_synthetic['sinus_1'] + 10
     elif type == 'SINGLE_SINUS_2_FLAT':
-        df[indicator] = df_synthetic['sinus_2'] + 10
+        values = df_synthetic['sinus_2'] + 10
     elif type == 'MIXED_SINUS_FLAT':
-        df[indicator] = df_synthetic['sinus_2'] + df_synthetic['sinus_3'] + 10
+        values = df_synthetic['sinus_2'] + df_synthetic['sinus_3'] + 10
     elif type == 'SINGLE_SINUS_1_UP':
-        df[indicator] = df_synthetic['sinus_1'] + df_synthetic['linear_up'] + 10
+        values = df_synthetic['sinus_1'] + df_synthetic['linear_up'] + 10
     elif type == 'SINGLE_SINUS_2_UP':
-        df[indicator] = df_synthetic['sinus_2'] + df_synthetic['linear_up'] + 10
+        values = df_synthetic['sinus_2'] + df_synthetic['linear_up'] + 10
     elif type == 'MIXED_SINUS_UP':
-        df[indicator] = df_synthetic['sinus_2'] + df_synthetic['sinus_3'] + df_synthetic['linear_up'] + 10
+        values = df_synthetic['sinus_2'] + df_synthetic['sinus_3'] + df_synthetic['linear_up'] + 10
     elif type == 'SINGLE_SINUS_1_DOWN':
-        df[indicator] = df_synthetic['sinus_1'] + df_synthetic['linear_down'] + 10
+        values = df_synthetic['sinus_1'] + df_synthetic['linear_down'] + 10
     elif type == 'SINGLE_SINUS_2_DOWN':
-        df[indicator] = df_synthetic['sinus_2'] + df_synthetic['linear_down'] + 10
+        values = df_synthetic['sinus_2'] + df_synthetic['linear_down'] + 10
     elif type == 'MIXED_SINUS_DOWN':
-        df[indicator] = df_synthetic['sinus_2'] + df_synthetic['sinus_3'] + df_synthetic['linear_down'] + 10
+        values = df_synthetic['sinus_2'] + df_synthetic['sinus_3'] + df_synthetic['linear_down'] + 10
     elif type == 'MIXED_SINUS_UP_DOWN':
-        df[indicator] = df_synthetic['sinus_3'] + df_synthetic['sinus_4'] + 10
+        values = df_synthetic['sinus_3'] + df_synthetic['sinus_4'] + 10
     elif type == 'MIXED_SINUS_DOWN_UP':
-        df[indicator] = df_synthetic['sinus_3'] + df_synthetic['sinus_5'] + 10
+        values = df_synthetic['sinus_3'] + df_synthetic['sinus_5'] + 10
+
+    elif type == 'GBM':
+        seed = 0
+        if params:
+            seed = params.get("synthetic_seed", seed)
+        panel = generate_ohlcv_panel(1, len(df.index), seed=seed)
+        values = pd.Series(panel['close'].iloc[:, 0].to_numpy(), index=df_synthetic.index)
 
     if config.OHLV:
         df_ohlv = pd.DataFrame(columns=['time', 'close'])
         df_ohlv['time'] = df_synthetic['time']
-        df_ohlv['close'] = df[indicator]
+        df_ohlv['close'] = values.to_numpy()
         df_ohlv = fill_ohlv(df_ohlv)
         df_ohlv = add_df_ohlv_noise(df_ohlv, config.noise_amplitude)
-
-    return df
\ No newline at end of file
+        values = df_ohlv['close']
+
+    # the synthetic dataframe is indexed by position
+    return pd.Series(values.to_numpy(), index=df.index)
+
+###
+### generator of ohlcv for benchmarks
+###
+def generate_ohlcv_panel(n_symbols, n_bars, timeframe="1h", start="2022-01-01", seed=0,
+                         drift=(0.2, -0.3), volatility=(0.5, 1.2), regime_duration=500,
+                         jump_intensity=10, jump_size=0.05, volume=1000.):
+    '''
+    geometric brownian motion with two regimes (calm, volatile) and jumps, generated for all the symbols at once
+    n_symbols, n_bars: size of the panel
+    timeframe: ccxt timeframe (1m, 1h, 1d...)
+    seed: same seed, same data
+    drift, volatility: annualized drift and volatility of each regime
+    regime_duration: mean number of bars between two regime switches
+    jump_intensity: mean number of jumps per year, jump_size: standard deviation of the jumps
+    volume: mean volume, it grows with the absolute returns
+    return a panel: dictionary field (open, high, low, close, volume) -> dataframe (bars x symbols)
+    '''
+    rng = np.random.default_rng(seed)
+    seconds = ccxt.Exchange.parse_timeframe(timeframe)
+    dt = seconds / (365 * 24 * 3600)
+    shape = (n_bars, n_symbols)
+
+    # regime of each bar: the parity of the number of switches
+    switches = rng.random(shape) < 1. / regime_duration
+    regimes = np.cumsum(switches, axis=0) % 2
+    mu = np.asarray(drift)[regimes]
+    sigma = np.asarray(volatility)[regimes]
+
+    jumps = rng.poisson(jump_intensity * dt, shape) * rng.normal(0, jump_size, shape)
+    noise = rng.standard_normal(shape)
+    returns = (mu - 0.5 * sigma ** 2) * dt + sigma * np.sqrt(dt) * noise + jumps
+    del switches, regimes, mu, jumps
+
+    first_close = 100 * np.exp(rng.normal(0, 1, n_symbols))
+    close = first_close * np.exp(np.cumsum(returns, axis=0))
+    opens = np.empty(shape)
+    opens[0] = first_close
+    opens[1:] = close[:-1]
+
+    # the high and the low surround the open and the close
+    spread = sigma * np.sqrt(dt) * np.abs(rng.standard_normal((2,) + shape)) / 2
+    high = np.maximum(opens, close) * np.exp(spread[0])
+    low = np.minimum(opens, close) * np.exp(-spread[1])
+    del spread
+
+    bars_volume = volume * rng.lognormal(-0.125, 0.5, shape) * (1 + np.abs(noise))
+    bars_volume /= (1 + np.mean(np.abs(noise)))
+
+    index = pd.date_range(start=start, periods=n_bars, freq=pd.Timedelta(seconds=seconds), name='timestamp')
+    symbols = ["SYN{}/USDT".format(i) for i in range(n_symbols)]
+    return indicators_panel.make_panel_from_arrays(index, symbols, open=opens, high=high, low=low, close=close, volume=bars_volume)
+
+def generate_ohlcv(n_symbols, n_bars, timeframe="1h", start="2022-01-01", seed=0, **kwargs):
+    '''
+    same as generate_ohlcv_panel
+    return a dictionary symbol -> ohlcv dataframe, as get_symbol_ohlcv
+    '''
+    panel = generate_ohlcv_panel(n_symbols, n_bars, timeframe, start, seed, **kwargs)
+    return indicators_panel.panel_to_symbols(panel)
+
+def to_ccxt_ohlcv(df):
+    '''
+    return the list [timestamp in ms, open, high, low, close, volume] returned by exchange.fetch_ohlcv
+    '''
+    timestamps = df.index.asi8 // 10 ** 6
+    values = df[['open', 'high', 'low', 'close', 'volume']].to_numpy()
+    return [[int(timestamp)] + row for timestamp, row in zip(timestamps, values.tolist())]
+
+def write_ohlcv(dfs, directory, format="csv"):
+    '''
+    dfs: dictionary symbol -> ohlcv dataframe
+    format: csv (same columns as test/data/google_stocks_data.csv) or json (info of /history)
+    return the list of the written files
+    '''
+    filenames = []
+    for symbol, df in dfs.items():
+        filename = os.path.join(directory, symbol.replace('/', '_') + '.' + format)
+        if format == "csv":
+            df_csv = df[['high', 'low', 'open', 'close', 'volume']].copy()
+            df_csv['adj_close'] = df_csv['close']
+            df_csv.index.name = 'Date'
+            df_csv.columns = [column.replace('_', ' ').title() for column in df_csv.columns]
+            df_csv.to_csv(filename)
+        elif format == "json":
+            df.reset_index().to_json(filename)
+        else:
+            continue
+        filenames.append(filename)
+    return filenames
@@ -1,8 +1,10 @@
-from tradingview_ta import TA_Handler, Interval, Exchange
 import pandas as pd
+from . import utils
 
 from time import sleep
 
+TA_Handler = utils.lazy_import("tradingview_ta", "TA_Handler")
+
 class Interval:
     INTERVAL_1_MINUTE = "1m"
     INTERVAL_5_MINUTES = "5m"
@@ -1,41 +1,79 @@
 import pandas as pd
+import numpy as np
 
-def create_hlcv(df, i):
+def _forward_fill(values):
+    # position of the last valid value for each row
+    valid = ~np.isnan(values)
+    last_valid = np.maximum.accumulate(np.where(valid, np.arange(len(values)), 0))
+    return values[last_valid]
+
+def _shift(values, periods):
+    shifted = np.full(len(values), np.nan)
+    if periods > 0:
+        shifted[periods:] = values[:-periods]
+    elif periods < 0:
+        shifted[:periods] = values[-periods:]
+    else:
+        shifted[:] = values
+    return shifted
+
+def _pct_change(values, periods=1):
+    # same as pandas pct_change: the missing values are forward filled first
+    values = _forward_fill(values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return values / _shift(values, periods) - 1
+
+def _rolling_last(values, i):
+    # last value of each complete window of i values, as rolling(i).apply(lambda x: x[-1])
+    valid_count = np.concatenate([[0], np.cumsum(~np.isnan(values))])
+    window_count = np.zeros(len(values), dtype=np.int64)
+    window_count[i - 1:] = valid_count[i:] - valid_count[:-i]
+    return np.where(window_count == i, values, np.nan)
+
+def get_hlcv(df, i):
     '''
     #i: days
     '''
-    df[f'high_{i}D'] = df.high.rolling(i).max()
-    df[f'low_{i}D'] = df.low.rolling(i).min()
-    df[f'close_{i}D'] = df.close.rolling(i). \
-        apply(lambda x: x[-1])
-    df[f'volume_{i}D'] = df.volume.rolling(i).sum()
+    high = df.high.rolling(i).max().to_numpy(dtype=float)
+    low = df.low.rolling(i).min().to_numpy(dtype=float)
+    close = _rolling_last(df.close.to_numpy(dtype=float), i)
+    volume = df.volume.rolling(i).sum().to_numpy(dtype=float)
+    return high, low, close, volume
 
+def create_hlcv(df, i):
+    '''
+    #i: days
+    '''
+    df[f'high_{i}D'], df[f'low_{i}D'], df[f'close_{i}D'], df[f'volume_{i}D'] = get_hlcv(df, i)
     return df
 
+def get_vsa_features_names(i):
+    return ['vsa_' + f'volume_{i}D', 'vsa_' + f'price_spread_{i}D', 'vsa_' + f'close_loc_{i}D', 'vsa_' + f'close_change_{i}D']
 
-def create_vsa_features(df, i):
-    df = create_hlcv(df, i)
-    high = df[f'high_{i}D']
-    low = df[f'low_{i}D']
-    close = df[f'close_{i}D']
-    volume = df[f'volume_{i}D']
-
-    features = pd.DataFrame(index=df.index)
-    features['vsa_' + f'volume_{i}D'] = volume.pct_change()
-    features['vsa_' + f'price_spread_{i}D'] = (high - low).pct_change()
-    features['vsa_' + f'close_loc_{i}D'] = (high - close) / (high - low)
-    features['vsa_' + f'close_change_{i}D'] = close.pct_change(-i)
-
+def fill_vsa_features(features, df, i):
+    # features: array with 4 columns for the window of i days
+    high, low, close, volume = get_hlcv(df, i)
+    spread = high - low
+    features[:, 0] = _pct_change(volume)
+    features[:, 1] = _pct_change(spread)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        features[:, 2] = (high - close) / spread
+    features[:, 3] = _pct_change(close, -i)
     return features
 
+def create_vsa_features(df, i):
+    features = np.empty((len(df.index), 4))
+    fill_vsa_features(features, df, i)
+    return pd.DataFrame(features, index=df.index, columns=get_vsa_features_names(i))
+
 
 def create_bunch_of_vsa_features(df, days):
-    df_close_copy = df.close.copy()
-    bunch_of_features = pd.DataFrame(index=df.index)
-    for day in days:
-        f = create_vsa_features(df, day)
-        bunch_of_features = bunch_of_features.join(f)
-
-    frames = [df_close_copy, bunch_of_features]
-    bunch_of_features = pd.concat(frames, axis=1)
-    return bunch_of_features
+    # close followed by the features of every window, built in a single array (df is left unchanged)
+    features = np.empty((len(df.index), 1 + 4 * len(days)))
+    features[:, 0] = df.close.to_numpy(dtype=float)
+    columns = ['close']
+    for n, day in enumerate(days):
+        fill_vsa_features(features[:, 1 + 4 * n: 5 + 4 * n], df, day)
+        columns.extend(get_vsa_features_names(day))
+
+    return pd.DataFrame(features, index=df.index, columns=columns)
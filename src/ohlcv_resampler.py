@@ -0,0 +1,108 @@
+import re
+import numpy as np
+from . import cache
+from . import ohlcv_store
+
+'''
+Coarser bars built from finer ones (4h, 1d, 1w... from 1h or 1m bars) without asking the exchange.
+The buckets are aligned as on the exchanges: on multiples of the duration since the epoch (UTC)
+for minutes, hours and days, on mondays for the weeks and on the first day for the months and years.
+'''
+
+# finer timeframes the coarser ones are built from, the coarsest first
+g_source_timeframes = ["1h", "1m"]
+
+g_day = 24 * 3600 * 1000
+# 1970-01-01 was a thursday, the weeks start 4 days later
+g_monday = 4 * g_day
+
+def _split_timeframe(timeframe):
+    match = re.fullmatch(r"(\d+)([smhdwMy])", timeframe)
+    if match == None:
+        raise ValueError("invalid timeframe: {}".format(timeframe))
+    return int(match.group(1)), match.group(2)
+
+def can_resample(source_timeframe, timeframe):
+    '''
+    return True if the bars of timeframe are made of whole bars of source_timeframe
+    '''
+    try:
+        _, unit = _split_timeframe(timeframe)
+        _split_timeframe(source_timeframe)
+    except ValueError:
+        return False
+    source_duration = cache.get_timeframe_duration(source_timeframe)
+    duration = cache.get_timeframe_duration(timeframe)
+    if duration <= source_duration:
+        return False
+    if unit in ["w", "M", "y"]:
+        # calendar buckets start at midnight
+        return (24 * 3600) % source_duration == 0
+    return duration % source_duration == 0
+
+def get_bucket_starts(timestamps, timeframe):
+    '''
+    timestamps: array of timestamps in ms
+    return the opening timestamp in ms of the bar of timeframe containing each timestamp
+    '''
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    n, unit = _split_timeframe(timeframe)
+    if unit == "w":
+        duration = n * 7 * g_day
+        return (timestamps - g_monday) // duration * duration + g_monday
+    if unit in ["M", "y"]:
+        numpy_unit = "M" if unit == "M" else "Y"
+        periods = timestamps.astype("datetime64[ms]").astype("datetime64[{}]".format(numpy_unit)).astype(np.int64)
+        periods = periods // n * n
+        return periods.astype("datetime64[{}]".format(numpy_unit)).astype("datetime64[ms]").astype(np.int64)
+    duration = cache.get_timeframe_duration(timeframe) * 1000
+    return timestamps // duration * duration
+
+def get_next_bucket_start(timestamp, timeframe):
+    '''
+    return the first opening timestamp in ms of a bar of timeframe at or after timestamp
+    '''
+    start = get_bucket_starts([timestamp], timeframe)[0]
+    if start == timestamp:
+        return int(start)
+    n, unit = _split_timeframe(timeframe)
+    # longest possible bar, its end is in the next bucket
+    longest = {"M": n * 31 * g_day, "y": n * 366 * g_day}.get(unit, cache.get_timeframe_duration(timeframe) * 1000)
+    return int(get_bucket_starts([start + longest], timeframe)[0])
+
+def get_later_bucket_start(timestamp, timeframe, n_bars):
+    '''
+    timestamp: opening timestamp in ms of a bar of timeframe
+    return the opening timestamp in ms of the bar n_bars later
+    '''
+    n, unit = _split_timeframe(timeframe)
+    if unit in ["M", "y"]:
+        numpy_unit = "M" if unit == "M" else "Y"
+        period = np.array([timestamp], dtype="datetime64[ms]").astype("datetime64[{}]".format(numpy_unit)) + n * n_bars
+        return int(period.astype("datetime64[ms]").astype(np.int64)[0])
+    duration = n * 7 * g_day if unit == "w" else cache.get_timeframe_duration(timeframe) * 1000
+    return timestamp + n_bars * duration
+
+def resample_ohlcv(df, timeframe):
+    '''
+    df: bars sorted by date (same format as crypto._get_ohlcv)
+    return the bars of timeframe: first open, highest high, lowest low, last close and total volume of the bars of each bucket
+    '''
+    df = df.dropna(subset=["open", "close"])
+    df = df[~df.index.duplicated()].sort_index()
+    timestamps = df.index.asi8 // 10 ** 6
+    if len(timestamps) == 0:
+        return ohlcv_store.make_ohlcv_dataframe(np.empty(0, dtype=np.int64), np.empty((0, len(ohlcv_store.g_columns))))
+    buckets = get_bucket_starts(timestamps, timeframe)
+    firsts = np.concatenate([[0], np.flatnonzero(np.diff(buckets)) + 1])
+    lasts = np.concatenate([firsts[1:], [len(buckets)]]) - 1
+
+    values = df[ohlcv_store.g_columns].to_numpy(dtype=float)
+    resampled = np.column_stack([
+        values[firsts, 0],
+        np.maximum.reduceat(values[:, 1], firsts),
+        np.minimum.reduceat(values[:, 2], firsts),
+        values[lasts, 3],
+        np.add.reduceat(values[:, 4], firsts)
+    ])
+    return ohlcv_store.make_ohlcv_dataframe(buckets[firsts], resampled)
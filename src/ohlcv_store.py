@@ -0,0 +1,185 @@
+import contextlib
+import fcntl
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+from . import cache
+
+'''
+Local store of the closed bars: one directory per (exchange, symbol, timeframe) with a memory-mapped
+numpy file (one record per bar: timestamp in ms, values open, high, low, close, volume) and the list
+of the ranges already fetched from the exchange. Historical bars never change, only the missing ranges and the
+bar in progress are requested. The writes are serialized by a file lock per directory: the workers
+of a server may share the store.
+'''
+g_columns = ['open', 'high', 'low', 'close', 'volume']
+# the timestamps and the values in the same file, they are replaced together
+g_dtype = np.dtype([('timestamp', np.int64), ('values', np.float64, (len(g_columns),))])
+
+def merge_ranges(ranges):
+    # ranges: list of [start, end[ in ms, the overlapping or contiguous ranges are merged
+    merged = []
+    for start, end in sorted(ranges):
+        if len(merged) != 0 and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+def get_missing_ranges(ranges, since, until):
+    # parts of [since, until[ which are not covered by the ranges
+    missing = []
+    for start, end in merge_ranges(ranges):
+        if end <= since or start >= until:
+            continue
+        if start > since:
+            missing.append([since, start])
+        since = max(since, end)
+    if since < until:
+        missing.append([since, until])
+    return missing
+
+def make_ohlcv_dataframe(timestamps, values):
+    # same format as crypto._get_ohlcv
+    df = pd.DataFrame(values, columns=g_columns, index=pd.to_datetime(timestamps, unit='ms'))
+    df.index.name = 'timestamp'
+    return df
+
+@contextlib.contextmanager
+def _file_lock(path):
+    # exclusive lock shared by the processes using the same store
+    with open(os.path.join(path, "lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+class OhlcvStore():
+    '''
+    directory: root directory of the store
+    '''
+    def __init__(self, directory):
+        self.directory = directory
+        self.locks = {}
+        self.lock = threading.Lock()
+        self.fetches = 0
+        self.requests_from_store = 0
+
+    def _get_path(self, exchange_name, symbol, timeframe):
+        return os.path.join(self.directory, exchange_name, symbol.replace('/', '_'), timeframe)
+
+    def _get_lock(self, key):
+        with self.lock:
+            return self.locks.setdefault(key, threading.Lock())
+
+    def get_ranges(self, exchange_name, symbol, timeframe):
+        filename = os.path.join(self._get_path(exchange_name, symbol, timeframe), "ranges.json")
+        if not os.path.exists(filename):
+            return []
+        with open(filename) as f:
+            return json.load(f)
+
+    def is_held(self, exchange_name, symbol, timeframe, since, until):
+        '''
+        return True if all the closed bars in [since, until[ are stored (the bar in progress never is)
+        '''
+        until = min(until, cache.get_last_bar_timestamp(timeframe))
+        return len(get_missing_ranges(self.get_ranges(exchange_name, symbol, timeframe), since, until)) == 0
+
+    def _load(self, path):
+        # memory-mapped columns, None if nothing is stored yet
+        try:
+            bars = np.load(os.path.join(path, "ohlcv.npy"), mmap_mode='r')
+        except FileNotFoundError:
+            return None, None
+        return bars['timestamp'], bars['values']
+
+    def _save(self, path, timestamps, values):
+        # written aside then renamed, a reader never gets a partial file nor the columns of two versions
+        bars = np.empty(len(timestamps), dtype=g_dtype)
+        bars['timestamp'] = timestamps
+        bars['values'] = values
+        with open(os.path.join(path, "ohlcv.npy.tmp"), "wb") as f:
+            np.save(f, bars)
+        os.replace(os.path.join(path, "ohlcv.npy.tmp"), os.path.join(path, "ohlcv.npy"))
+
+    def read(self, exchange_name, symbol, timeframe, since, until):
+        '''
+        return the stored bars in [since, until[ (timestamps in ms)
+        '''
+        timestamps, values = self._load(self._get_path(exchange_name, symbol, timeframe))
+        if timestamps is None:
+            return make_ohlcv_dataframe(np.empty(0, dtype=np.int64), np.empty((0, len(g_columns))))
+        first, last = np.searchsorted(timestamps, [since, until])
+        return make_ohlcv_dataframe(np.array(timestamps[first:last]), np.array(values[first:last]))
+
+    def write(self, exchange_name, symbol, timeframe, df, since, until):
+        '''
+        df: bars fetched for [since, until[ (same format as crypto._get_ohlcv)
+        the exchange returns the bars from since: the range is marked as fetched up to the last bar returned,
+        and entirely if the exchange returned nothing for closed bars (no bar exists there)
+        '''
+        path = self._get_path(exchange_name, symbol, timeframe)
+        os.makedirs(path, exist_ok=True)
+        timestamps = df.index.asi8 // 10 ** 6
+        values = df[g_columns].to_numpy(dtype=float)
+        mask = (timestamps >= since) & (timestamps < until)
+        timestamps, values = timestamps[mask], values[mask]
+        if len(timestamps) != 0:
+            end = min(until, int(timestamps.max()) + cache.get_timeframe_duration(timeframe) * 1000)
+        elif until <= cache.get_last_bar_timestamp(timeframe):
+            end = until
+        else:
+            return
+
+        with _file_lock(path):
+            if len(timestamps) != 0:
+                stored_timestamps, stored_values = self._load(path)
+                if stored_timestamps is not None:
+                    # the new bars replace the stored ones with the same timestamp
+                    timestamps = np.concatenate([timestamps, stored_timestamps])
+                    values = np.concatenate([values, stored_values])
+                timestamps, indexes = np.unique(timestamps, return_index=True)
+                self._save(path, timestamps, values[indexes])
+
+            ranges = merge_ranges(self.get_ranges(exchange_name, symbol, timeframe) + [[since, end]])
+            with open(os.path.join(path, "ranges.json.tmp"), "w") as f:
+                json.dump(ranges, f)
+            os.replace(os.path.join(path, "ranges.json.tmp"), os.path.join(path, "ranges.json"))
+
+    def get_ohlcv(self, exchange_name, symbol, timeframe, since, until, fetch):
+        '''
+        bars in [since, until[: the closed bars come from the store, the missing ranges and the bar in progress from fetch
+        fetch: function (since, limit) -> dataframe as crypto._get_ohlcv (or an error message)
+        return the dataframe or the error message of fetch
+        '''
+        duration = cache.get_timeframe_duration(timeframe) * 1000
+        last_bar = cache.get_last_bar_timestamp(timeframe)
+        with self._get_lock((exchange_name, symbol, timeframe)):
+            closed_until = min(until, last_bar)
+            missing = get_missing_ranges(self.get_ranges(exchange_name, symbol, timeframe), since, closed_until)
+            for start, end in missing:
+                df = fetch(start, -(-(end - start) // duration))
+                if not isinstance(df, pd.DataFrame):
+                    return df
+                self.write(exchange_name, symbol, timeframe, df, start, end)
+            df = self.read(exchange_name, symbol, timeframe, since, closed_until)
+
+        with self.lock:
+            self.fetches += len(missing)
+            if len(missing) == 0:
+                self.requests_from_store += 1
+
+        if until > last_bar:
+            # the bar in progress is never stored
+            df_open = fetch(max(since, last_bar), -(-(until - max(since, last_bar)) // duration))
+            if isinstance(df_open, pd.DataFrame) and not df_open.empty:
+                df = pd.concat([df, df_open[g_columns]])
+        return df
+
+    def get_stats(self):
+        with self.lock:
+            return {"directory": self.directory, "fetches": self.fetches, "requests_from_store": self.requests_from_store}
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+'''
+Screener on the markets loaded by ccxt: the markets of several exchanges are turned into one
+columnar table (one row per symbol), the filters are boolean masks and the rankings are top-k
+selections on the columns.
+'''
+
+# metrics ranked by default with their scale (ratios as percentages)
+g_default_metrics = {"change1h": 100, "change24h": 100}
+# leveraged tokens
+g_excluded_names = ["BULL", "HALF", "EDGE", "BEAR"]
+
+def get_markets_table(markets_by_exchange, fields):
+    '''
+    markets_by_exchange: dictionary exchange name -> ccxt markets (symbol -> market)
+    fields: fields of market['info'] converted to float (NaN if missing or invalid)
+    return the dataframe with the columns exchange, symbol and the fields
+    '''
+    records = [(exchange_name, symbol, *[(market.get('info') or {}).get(field) for field in fields])
+               for exchange_name, markets in markets_by_exchange.items() for symbol, market in markets.items()]
+    df = pd.DataFrame.from_records(records, columns=['exchange', 'symbol'] + list(fields))
+    for field in fields:
+        df[field] = pd.to_numeric(df[field], errors='coerce').astype(float)
+    return df
+
+def get_top_k(values, k):
+    '''
+    return the positions of the k highest values, highest first (the NaN are never selected)
+    '''
+    values = np.where(np.isnan(values), -np.inf, values)
+    k = min(k, np.count_nonzero(values > -np.inf))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    # partial selection of the k highest values, only these are sorted
+    top = np.argpartition(-values, k - 1)[:k]
+    return top[np.argsort(-values[top], kind="stable")]
+
+def get_symbols_mask(df, quote_suffix=None, volume_field=None, min_volume=None, excluded_names=g_excluded_names):
+    mask = np.ones(len(df.index), dtype=bool)
+    if quote_suffix != None:
+        mask &= df['symbol'].str.endswith(quote_suffix).to_numpy()
+    if len(excluded_names) != 0:
+        mask &= ~df['symbol'].str.contains("|".join(excluded_names), regex=True).to_numpy()
+    if volume_field != None and min_volume != None:
+        mask &= (df[volume_field] > min_volume).to_numpy()
+    return mask
+
+def get_top_gainers(markets_by_exchange, n, metrics=g_default_metrics, quote_suffix='/USD', volume_field='quoteVolume24h', min_volume=10000):
+    '''
+    markets_by_exchange: dictionary exchange name -> ccxt markets
+    n: number of symbols selected for each metric, the symbols are ranked on all the exchanges together
+    metrics: dictionary field of market['info'] -> scale
+    quote_suffix, volume_field, min_volume: filters on the symbols (None to disable)
+    return the symbols in the top n of every metric, ordered by the first one, with the columns
+    exchange, symbol, then <metric> and rank_<metric> for each metric
+    '''
+    fields = list(metrics.keys())
+    if volume_field != None and volume_field not in fields:
+        fields.append(volume_field)
+    df = get_markets_table(markets_by_exchange, fields)
+
+    # the symbols without a value for one of the metrics are not ranked
+    mask = get_symbols_mask(df, quote_suffix, volume_field, min_volume) & df[list(metrics)].notna().all(axis=1).to_numpy()
+    df = df[mask].reset_index(drop=True)
+
+    columns = ['exchange', 'symbol']
+    selected = np.ones(len(df.index), dtype=bool)
+    for metric, scale in metrics.items():
+        values = df[metric].to_numpy() * scale
+        top = get_top_k(values, n)
+        ranks = np.full(len(df.index), -1, dtype=np.int64)
+        ranks[top] = np.arange(len(top))
+        selected &= ranks >= 0
+        df[metric] = values
+        df['rank_' + metric] = ranks
+        columns += [metric, 'rank_' + metric]
+
+    first_rank = 'rank_' + next(iter(metrics))
+    df = df.loc[selected, columns].sort_values(first_rank, kind="stable").reset_index(drop=True)
+    df['symbol'] = df['symbol'].astype("string")
+    return df
@@ -1,6 +1,9 @@
-from tradingview_ta import TA_Handler, Interval, Exchange
 import pandas as pd
-import concurrent.futures
+from . import executors
+from . import utils
+from .indicators_tradingview import Interval
+
+TA_Handler = utils.lazy_import("tradingview_ta", "TA_Handler")
 
 g_interval_for_ta = {
     "1m" : Interval.INTERVAL_1_MINUTE,
@@ -78,12 +81,15 @@ def filter_with_tradingview_recommendations(symbols, recommendations, intervals)
     df_symbol['screener'] = 'crypto'
 
     # get recommendations
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        futures = []
-        for interval in intervals:
-            futures.append(executor.submit(get_recommendations_from_dataframe, df=df_symbol, interval=interval))
-        for future in concurrent.futures.as_completed(futures):
-            df_symbol = pd.merge(df_symbol, future.result())
+    arguments = [(df_symbol, interval) for interval in intervals]
+    try:
+        futures = executors.get_io_executor().map(get_recommendations_from_dataframe, arguments, executors.get_max_concurrency("tradingview"))
+        results = [future.result() for future in futures]
+    except executors.ExecutorBusy:
+        # the intervals are requested by the caller
+        results = [get_recommendations_from_dataframe(*args) for args in arguments]
+    for result in results:
+        df_symbol = pd.merge(df_symbol, result)
             
     # filter symbols
     df_symbol = remove_rows_where_recommendation_not_in_filter(df_symbol, recommendations)
@@ -1,10 +1,53 @@
 import pandas as pd
+import numpy as np
+import importlib
+import threading
 from inspect import getframeinfo, stack
 
 def print_exception_info(exception):
     caller = getframeinfo(stack()[2][0])
     print("[{}:{}] - {}".format(caller.filename, caller.lineno, exception))
 
+class LazyModule():
+    '''
+    Module (or attribute of a module) imported at the first access to one of its attributes,
+    the heavy dependencies are not loaded at startup when they are not needed.
+    name: module name (ex: "ccxt", "yahoo_fin.stock_info")
+    attribute: optional attribute of the module (ex: "StockDataFrame" for stockstats)
+    '''
+    def __init__(self, name, attribute=None):
+        self._name = name
+        self._attribute = attribute
+        self._target = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._target is None:
+                target = importlib.import_module(self._name)
+                if self._attribute != None:
+                    target = getattr(target, self._attribute)
+                self._target = target
+        return self._target
+
+    def __getattr__(self, name):
+        target = self._target
+        if target is None:
+            target = self._load()
+        return getattr(target, name)
+
+    def __call__(self, *args, **kwargs):
+        target = self._target
+        if target is None:
+            target = self._load()
+        return target(*args, **kwargs)
+
+    def is_loaded(self):
+        return self._target is not None
+
+def lazy_import(name, attribute=None):
+    return LazyModule(name, attribute)
+
 def make_df_stock_info(list_stock, list_company_name, list_isin,list_sectors, list_industry, list_country, list_exchange):
     return (pd.DataFrame({'symbol': list_stock,
                           'name': list_company_name,
@@ -14,3 +57,39 @@ def make_df_stock_info(list_stock, list_company_name, list_isin,list_sectors, li
                           'country': list_country,
                           'exchange': list_exchange,
                           }))
+
+def get_dataframe_memory(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+def compact_dataframe(df, max_category_ratio=0.5):
+    '''
+    compact mode: float64 -> float32, datetime index -> int64 epoch in ms, repeated strings -> category
+    max_category_ratio: an object column becomes a category if its number of distinct values is below this ratio of the rows
+    return the compact dataframe and the memory used before and after
+    '''
+    bytes_before = get_dataframe_memory(df)
+
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        if values.dtype == np.float64:
+            columns[column] = values.astype(np.float32)
+        elif values.dtype == object and values.nunique(dropna=False) <= max_category_ratio * max(len(values), 1):
+            columns[column] = values.astype("category")
+    if len(columns) > 0:
+        df = df.assign(**columns) if len(columns) < len(df.columns) else pd.DataFrame(columns, index=df.index)
+    else:
+        df = df.copy()
+
+    if isinstance(df.index, pd.DatetimeIndex):
+        df.index = pd.Index(df.index.asi8 // 10 ** 6, name=df.index.name)
+
+    bytes_after = get_dataframe_memory(df)
+    return df, {"bytes_before": bytes_before, "bytes_after": bytes_after, "bytes_saved": bytes_before - bytes_after}
+
+def float32_to_float64(df):
+    # the indicators are computed in float64 from compact dataframes
+    columns = {column: df[column].astype(np.float64) for column in df.columns if df[column].dtype == np.float32}
+    if len(columns) == 0:
+        return df
+    return df.assign(**columns)
@@ -1,9 +1,10 @@
 import pandas as pd
-from bs4 import BeautifulSoup
-import requests
-from yahoo_fin import stock_info as si
 from . import utils
 
+BeautifulSoup = utils.lazy_import("bs4", "BeautifulSoup")
+requests = utils.lazy_import("requests")
+si = utils.lazy_import("yahoo_fin.stock_info")
+
 def get_from_si(si_call):
     df = None
     try:
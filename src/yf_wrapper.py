@@ -1,7 +1,8 @@
 import time
-import yfinance as yf
 from . import utils
 
+yf = utils.lazy_import("yfinance")
+
 def get_info(value):
     if value == None:
         return {"status":"ko", "reason":"no value"}
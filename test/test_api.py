@@ -1,9 +1,17 @@
 import pytest
+import asyncio
 import pandas as pd
 import json
+import subprocess
+import sys
+import threading
 #from dataclasses import dataclass
 
 from src import api
+from src import crypto
+from src import crypto_async
+from src import exchange_pool
+from src import executors
 from . import test_utils
 
 
@@ -15,6 +23,18 @@ class MockRequest:
 
 class TestApi:
 
+    def test_api_lazy_imports(self):
+        # the heavy dependencies are loaded when they are used, not when the application starts
+        heavy_modules = ["matplotlib", "stockstats", "finta", "tradingview_ta", "yahoo_fin", "bs4", "yfinance", "ccxt"]
+        code = "import sys; from main import app; print(','.join(m for m in {} if m in sys.modules))".format(heavy_modules)
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        assert(result.returncode == 0)
+        assert(result.stdout.strip() == "")
+
+        code = "import sys; from src import api; api.crypto.ccxt.exchanges; print('ccxt' in sys.modules)"
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        assert(result.stdout.strip() == "True")
+
     def test_api_list_cac(self):
         response = api.api_list("w_cac")
         assert(response["status"] == "ok")
@@ -40,6 +60,100 @@ class TestApi:
         assert("info" in response["result"][symbol])
         assert(response["result"][symbol]["info"]["symbol"] == symbol)
 
+    def test_api_history_markets_loaded_once(self):
+        calls = {}
+        symbols = ["S{}/EUR".format(i) for i in range(20)]
+        pool = exchange_pool.ExchangePool(create_exchange=lambda exchange_name: test_utils.FakeExchange(symbols, calls))
+        previous_pool, crypto.g_exchange_pool = crypto.g_exchange_pool, pool
+        try:
+            history_params = {"str_exchange": "fake", "str_symbol": ",".join(symbol.replace("/", "_") for symbol in symbols),
+                              "str_start": "2022-01-01", "str_end": "2022-02-01", "length": None}
+            response = api.api_history(history_params)
+        finally:
+            crypto.g_exchange_pool = previous_pool
+
+        assert(all(response["result"][symbol]["status"] == "ok" for symbol in response["result"]))
+        assert(len(response["result"]) == 20)
+        assert(calls["load_markets"] == 1)
+
+    def test_api_history_nested_pool_busy(self):
+        symbols = ["S{}/EUR".format(i) for i in range(4)]
+        pool = exchange_pool.ExchangePool(create_exchange=lambda exchange_name: test_utils.FakeExchange(symbols, page_limit=10))
+        previous_pool, crypto.g_exchange_pool = crypto.g_exchange_pool, pool
+        # the only thread of the nested pool is taken, the pages of the symbols cannot be fetched
+        previous_executor = executors.g_io_executor
+        executors.g_io_executor = executors.BoundedExecutor("test", 2, 0, nested_workers=1)
+        event = threading.Event()
+        executors.g_io_executor.nested.submit(event.wait)
+        try:
+            history_params = {"str_exchange": "fake_busy", "str_symbol": ",".join(symbol.replace("/", "_") for symbol in symbols),
+                              "str_start": "2022-01-01", "str_end": None, "length": 30}
+            response = api.api_history(history_params)
+        finally:
+            event.set()
+            executors.g_io_executor.shutdown()
+            executors.g_io_executor = previous_executor
+            crypto.g_exchange_pool = previous_pool
+
+        assert(response["status"] == "ok" and len(response["result"]) == 4)
+        assert(all(result == {"status": "ko", "reason": "", "info": "server busy"} for result in response["result"].values()))
+
+    def test_api_history_async(self):
+        calls = {}
+        symbols = ["S{}/EUR".format(i) for i in range(20)]
+        pool = exchange_pool.ExchangePool(create_exchange=lambda exchange_name: test_utils.FakeExchange(symbols, calls))
+        async_pool = crypto_async.AsyncExchangePool(create_exchange=lambda exchange_name: test_utils.AsyncFakeExchange(symbols, calls, delay=0.05))
+        previous_pool, crypto.g_exchange_pool = crypto.g_exchange_pool, pool
+        previous_async_pool, crypto_async.g_exchange_pool = crypto_async.g_exchange_pool, async_pool
+        try:
+            history_params = {"str_symbol": ",".join(symbol.replace("/", "_") for symbol in symbols),
+                              "str_start": "2022-01-01", "str_end": "2022-02-01", "length": None, "indicators": {"ema_5": None}}
+            # different exchange names, the second request is not served by the cache
+            response = api.api_history(dict(history_params, str_exchange="fake_threads"))
+            fetches = calls["fetch_ohlcv"]
+            response_async = api.api_history_async(dict(history_params, str_exchange="fake_async"))
+            crypto_async.run(async_pool.close())
+        finally:
+            crypto.g_exchange_pool = previous_pool
+            crypto_async.g_exchange_pool = previous_async_pool
+
+        assert(list(response_async["result"].keys()) == list(response["result"].keys()))
+        assert(all(response_async["result"][symbol] == response["result"][symbol] for symbol in response["result"]))
+        assert(all(response_async["result"][symbol]["status"] == "ok" for symbol in response["result"]))
+        # one download of the markets per exchange name, the asynchronous clients reuse them
+        assert(calls["fetch_ohlcv"] == 2 * fetches)
+        assert(calls["load_markets"] == 2 and calls["close"] == 1)
+
+    def test_async_exchange_created_once(self):
+        calls = {}
+        created = []
+        def create_exchange(exchange_name):
+            created.append(exchange_name)
+            return test_utils.AsyncFakeExchange(calls=calls)
+        pool = exchange_pool.ExchangePool(create_exchange=lambda exchange_name: test_utils.FakeExchange(calls=calls))
+        async_pool = crypto_async.AsyncExchangePool(create_exchange=create_exchange)
+        threads = []
+        get_exchange_and_markets = crypto.get_exchange_and_markets
+        def get_exchange_and_markets_from(exchange_name):
+            threads.append(threading.current_thread().name)
+            return get_exchange_and_markets(exchange_name)
+        previous_pool, crypto.g_exchange_pool = crypto.g_exchange_pool, pool
+        crypto.get_exchange_and_markets = get_exchange_and_markets_from
+        async def get_exchanges():
+            return await asyncio.gather(*[async_pool.get_exchange("fake_once") for i in range(10)])
+        try:
+            exchanges = crypto_async.run(get_exchanges()) + crypto_async.run(get_exchanges())
+            crypto_async.run(async_pool.close())
+        finally:
+            crypto.get_exchange_and_markets = get_exchange_and_markets
+            crypto.g_exchange_pool = previous_pool
+
+        # the coroutines share one client, it is closed with the pool
+        assert(created == ["fake_once"] and all(exchange is exchanges[0] for exchange in exchanges))
+        assert(calls["load_markets"] == 1 and calls["close"] == 1)
+        # the markets are never read by the event loop, even when they are known
+        assert(len(threads) == 20 and "crypto_async" not in threads)
+
     def test_api_history_parse_parameters_get_ok(self):
         req = MockRequest
         req.method = "GET"
@@ -58,6 +172,25 @@ class TestApi:
         assert(history_params.get("str_end") == "2022-03-01")
         assert(history_params.get("str_interval") == "1d")
         assert(history_params.get("indicators") == {"ema_5":None})
+        assert(history_params.get("compact") == False)
+
+    def test_api_history_parse_parameters_get_compact(self):
+        req = MockRequest
+        req.method = "GET"
+        req.args = {}
+        req.args["exchange"] = "hitbtc"
+        req.args["symbol"] = "ETH/EURS"
+        req.args["start"] = "2022-02-01"
+        req.args["compact"] = "true"
+        history_params = api.api_history_parse_parameters(req)
+
+        assert(history_params.get("status") == "ok")
+        assert(history_params.get("compact") == True)
+        assert(history_params.get("async") == False)
+
+        req.args["async"] = "true"
+        history_params = api.api_history_parse_parameters(req)
+        assert(history_params.get("async") == True)
 
     def test_api_history_parse_parameters_get_ko_exchange_not_specified(self):
         req = MockRequest
@@ -0,0 +1,66 @@
+import pytest
+import pandas as pd
+import numpy as np
+
+from src import cache
+from src import utils
+
+class TestCache:
+
+    def get_dataframe(self, n):
+        return pd.DataFrame({"close": np.arange(n, dtype=float)})
+
+    def test_get_last_bar_timestamp(self):
+        now = 1650000000.5
+        assert(cache.get_last_bar_timestamp("1m", now) == 1650000000000)
+        assert(cache.get_last_bar_timestamp("1h", now) == 1649998800000)
+        assert(cache.get_last_bar_timestamp("1d", now) == 1649980800000)
+        # friday 2022-04-15: the week started on monday, the month and the year on the first day
+        assert(cache.get_last_bar_timestamp("1w", now) == pd.Timestamp("2022-04-11").value // 10 ** 6)
+        assert(cache.get_last_bar_timestamp("1M", now) == pd.Timestamp("2022-04-01").value // 10 ** 6)
+        assert(cache.get_last_bar_timestamp("3M", now) == pd.Timestamp("2022-04-01").value // 10 ** 6)
+        assert(cache.get_last_bar_timestamp("1y", now) == pd.Timestamp("2022-01-01").value // 10 ** 6)
+        assert(cache.get_last_bar_timestamp("1w", pd.Timestamp("2022-04-11").value // 10 ** 9) == pd.Timestamp("2022-04-11").value // 10 ** 6)
+
+    def test_get_indicators_key(self):
+        assert(cache.get_indicators_key(["ema_9", "rsi_30"]) == cache.get_indicators_key({"ema_9": None, "rsi_30": None}))
+        assert(cache.get_indicators_key(["ema_9", "rsi_30"]) != cache.get_indicators_key(["rsi_30", "ema_9"]))
+        assert(cache.get_indicators_key({"labeling": {"t_final": 10}}) != cache.get_indicators_key({"labeling": {"t_final": 20}}))
+
+    def test_hit_miss_invalidation(self):
+        indicator_cache = cache.IndicatorCache()
+        key = ("hitbtc", "BTC/EURS", "1d", "2022-03-01", None, None, cache.get_indicators_key(["ema_9"]))
+        assert(indicator_cache.get(key, 1) is None)
+        indicator_cache.put(key, 1, self.get_dataframe(10))
+
+        df = indicator_cache.get(key, 1)
+        assert(df.equals(self.get_dataframe(10)))
+        # the cached dataframe is not modified by the callers
+        df.reset_index(inplace=True)
+        assert(indicator_cache.get(key, 1).equals(self.get_dataframe(10)))
+
+        # a new bar is closed
+        assert(indicator_cache.get(key, 2) is None)
+        stats = indicator_cache.get_stats()
+        assert(stats["hits"] == 2 and stats["misses"] == 2 and stats["invalidations"] == 1)
+        assert(stats["entries"] == 0 and stats["bytes"] == 0)
+
+    def test_eviction(self):
+        size = utils.get_dataframe_memory(self.get_dataframe(100))
+        indicator_cache = cache.IndicatorCache(max_entries=3, max_bytes=2 * size)
+        indicator_cache.put("a", 1, self.get_dataframe(100))
+        indicator_cache.put("b", 1, self.get_dataframe(100))
+        assert(indicator_cache.get("a", 1) is not None)
+        # "b" is the least recently used
+        indicator_cache.put("c", 1, self.get_dataframe(100))
+        assert(indicator_cache.get("b", 1) is None)
+        assert(indicator_cache.get("a", 1) is not None)
+        assert(indicator_cache.get("c", 1) is not None)
+
+        # too big to be cached
+        indicator_cache.put("d", 1, self.get_dataframe(1000))
+        assert(indicator_cache.get("d", 1) is None)
+
+        stats = indicator_cache.get_stats()
+        assert(stats["evictions"] == 1)
+        assert(stats["entries"] == 2 and stats["bytes"] == 2 * size)
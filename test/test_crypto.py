@@ -1,7 +1,11 @@
 import pytest
 import pandas as pd
 
+import ccxt
+
 from src import crypto
+from src import exchange_pool
+from . import test_utils
 
 class TestCrypto:
 
@@ -38,3 +42,47 @@ class TestCrypto:
         assert(df.columns.to_list() == ['symbol', 'change1h', 'rank_change1h', 'change24h', 'rank_change24h'])
         symbols = df['symbol'].to_list()
         assert(len(symbols) > 1)
+
+    def test_get_list_symbols_offline(self):
+        symbols = ["BTC/EUR", "ETH/USD", "BNB/EURS", "BTC/USDT", "XRP/EUR"]
+        pool = exchange_pool.ExchangePool(create_exchange=lambda exchange_name: test_utils.FakeExchange(symbols) if exchange_name == "fake" else None)
+        previous_pool, crypto.g_exchange_pool = crypto.g_exchange_pool, pool
+        try:
+            assert(crypto.get_list_symbols("fake") == ["BNB/EURS", "BTC/EUR", "ETH/USD"])
+            assert(crypto.get_list_symbols("foobar") == [])
+        finally:
+            crypto.g_exchange_pool = previous_pool
+
+    def test_plan_ohlcv_pages(self):
+        exchange = test_utils.FakeExchange(page_limit=1000)
+        pages = crypto.plan_ohlcv_pages(exchange, "4h", 0, 2500)
+        duration = 4 * 3600 * 1000
+        assert(pages == [{"since": 0, "limit": 1000}, {"since": 1000 * duration, "limit": 1000}, {"since": 2000 * duration, "limit": 500}])
+        assert(crypto.plan_ohlcv_pages(exchange, "1d", 0, 1000) == [{"since": 0, "limit": 1000}])
+        assert(crypto.plan_ohlcv_pages(exchange, "1d", 0, None) == [{"since": 0, "limit": None}])
+        assert(crypto.plan_ohlcv_pages(exchange, "3d", 0, 10) == None)
+
+        # limit read from the ccxt metadata
+        assert(crypto.get_ohlcv_page_limit(ccxt.binance()) == 1000)
+        assert(crypto.get_ohlcv_page_limit(object()) == crypto.g_default_page_limit)
+        # without features, as with the pinned ccxt
+        exchange.features = None
+        for exchange.id, page_limit in [("hitbtc", 1000), ("coinbasepro", 300), ("fake", crypto.g_default_page_limit)]:
+            assert(crypto.get_ohlcv_page_limit(exchange) == page_limit)
+        exchange.id = "hitbtc"
+        assert(len(crypto.plan_ohlcv_pages(exchange, "1h", 0, 2500)) == 3)
+
+    def test_fetch_ohlcv_pages(self):
+        calls = {}
+        exchange = test_utils.FakeExchange(calls=calls, page_limit=100)
+        since = 1640995200000
+        ohlcv = crypto._fetch_ohlcv(exchange, "BTC/EURS", since, "4h", 250)
+        assert(calls["fetch_ohlcv"] == 3 and ohlcv.attrs["pages"] == 3)
+        assert(len(ohlcv.index) == 250)
+        assert(ohlcv.index.equals(pd.date_range("2022-01-01", periods=250, freq="4H", name="timestamp")))
+        assert(list(ohlcv.columns) == ["open", "high", "low", "close", "volume"])
+
+        # same bars as in one page
+        exchange = test_utils.FakeExchange(page_limit=1000)
+        assert(ohlcv.equals(crypto._fetch_ohlcv(exchange, "BTC/EURS", since, "4h", 250)))
+        assert(crypto._fetch_ohlcv(exchange, "BTC/EURS", since, "3d", 10) == "timeframe not supported")
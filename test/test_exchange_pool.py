@@ -0,0 +1,81 @@
+import pytest
+import time
+import concurrent.futures
+
+from src import exchange_pool
+from . import test_utils
+
+class TestExchangePool:
+
+    def get_pool(self, calls, **kwargs):
+        return exchange_pool.ExchangePool(create_exchange=lambda exchange_name: test_utils.FakeExchange(calls=calls) if exchange_name == "fake" else None, **kwargs)
+
+    def test_markets_loaded_once(self):
+        calls = {}
+        pool = self.get_pool(calls)
+        with concurrent.futures.ThreadPoolExecutor(max_workers=20) as executor:
+            results = list(executor.map(lambda i: pool.get_exchange_and_markets("fake"), range(20)))
+        assert(calls == {"load_markets": 1})
+        assert(all(exchange is results[0][0] for exchange, _ in results))
+        assert(list(results[0][1].keys()) == ["BTC/EURS", "ETH/EURS"])
+        assert(pool.get_exchange_and_markets("foobar") == (None, {}))
+        stats = pool.get_stats()
+        assert(stats["loads"] == 1 and stats["hits"] == 19)
+
+    def test_ttl_and_refresh(self):
+        calls = {}
+        pool = self.get_pool(calls, ttl=0.2, refresh_ratio=0.5)
+        exchange = pool.get_exchange("fake")
+
+        # after refresh_ratio * ttl, the current markets are served and new ones are loaded in the background
+        time.sleep(0.12)
+        assert(pool.get_exchange("fake") is exchange)
+        for i in range(100):
+            if pool.get_stats()["refreshes"] == 1:
+                break
+            time.sleep(0.01)
+        assert(calls == {"load_markets": 2})
+        assert(pool.get_exchange("fake") is not exchange)
+
+        # after ttl, the markets are loaded again
+        time.sleep(0.25)
+        pool.get_exchange("fake")
+        assert(pool.get_stats()["loads"] == 2)
+
+    def test_snapshot(self, tmp_path):
+        calls = {}
+        pool = self.get_pool(calls, snapshot_directory=str(tmp_path))
+        _, markets = pool.get_exchange_and_markets("fake")
+        assert((tmp_path / "fake_markets.json").exists())
+
+        # a new process reads the snapshot instead of loading the markets
+        pool = self.get_pool(calls, snapshot_directory=str(tmp_path))
+        exchange, markets_from_snapshot = pool.get_exchange_and_markets("fake")
+        assert(markets_from_snapshot == markets)
+        assert(exchange.symbols == ["BTC/EURS", "ETH/EURS"])
+        assert(calls == {"load_markets": 1})
+        assert(pool.get_stats()["snapshot_loads"] == 1)
+
+        # too old
+        pool = self.get_pool(calls, snapshot_directory=str(tmp_path), ttl=0)
+        pool.get_exchange("fake")
+        assert(pool.get_stats()["loads"] == 1 and pool.get_stats()["snapshot_loads"] == 0)
+
+    def test_unreadable_snapshot(self, tmp_path):
+        calls = {}
+        pool = self.get_pool(calls, snapshot_directory=str(tmp_path))
+        pool.get_exchange_and_markets("fake")
+        snapshot = (tmp_path / "fake_markets.json").read_text()
+        # half written, not a dictionary, without markets, not a file
+        for content in [snapshot[:len(snapshot) // 2], "[1, 2]", '{"timestamp": 0}', None]:
+            if content == None:
+                (tmp_path / "fake_markets.json").unlink()
+                (tmp_path / "fake_markets.json").mkdir()
+            else:
+                (tmp_path / "fake_markets.json").write_text(content)
+            pool = self.get_pool(calls, snapshot_directory=str(tmp_path), ttl=1e12)
+            exchange, markets = pool.get_exchange_and_markets("fake")
+            assert(exchange.symbols == ["BTC/EURS", "ETH/EURS"])
+            assert(pool.get_stats()["loads"] == 1 and pool.get_stats()["snapshot_loads"] == 0)
+        # only the snapshot is left in the directory
+        assert([path.name for path in tmp_path.iterdir()] == ["fake_markets.json"])
@@ -0,0 +1,99 @@
+import pytest
+import threading
+import time
+
+from src import executors
+
+def square(x):
+    return x * x
+
+def nested_cpu_map(x):
+    return [future.result() for future in executors.get_cpu_executor().map(square, [(x,), (x + 1,)])]
+
+class TestExecutors:
+
+    def test_map_in_order(self):
+        executor = executors.BoundedExecutor("test", 4, 4)
+        futures = executor.map(square, [(i,) for i in range(20)])
+        assert([future.result() for future in futures] == [i * i for i in range(20)])
+
+        futures = executor.map(lambda x: 1 / x, [(1,), (0,)])
+        assert(futures[0].result() == 1)
+        assert(isinstance(futures[1].exception(), ZeroDivisionError))
+
+    def test_busy(self):
+        executor = executors.BoundedExecutor("test", 1, 1)
+        event = threading.Event()
+        executor.submit(event.wait)
+        executor.submit(event.wait)
+        # the worker and the queue are full, the next task is rejected at once
+        start = time.time()
+        with pytest.raises(executors.ExecutorBusy):
+            executor.submit(event.wait)
+        assert(time.time() - start < 0.1)
+        event.set()
+        for i in range(100):
+            if executor.get_stats()["pending"] == 0:
+                break
+            time.sleep(0.01)
+        stats = executor.get_stats()
+        assert(stats["pending"] == 0 and stats["submitted"] == 2 and stats["rejected"] == 1)
+        assert(executor.submit(square, 3).result() == 9)
+
+    def test_max_concurrency(self):
+        executor = executors.BoundedExecutor("test", 8, 0)
+        lock = threading.Lock()
+        running = {"current": 0, "max": 0}
+        def task():
+            with lock:
+                running["current"] += 1
+                running["max"] = max(running["max"], running["current"])
+            time.sleep(0.02)
+            with lock:
+                running["current"] -= 1
+        # the window never exceeds max_concurrency, even with a queue of size 0
+        executor.map(task, [()] * 12, max_concurrency=3)
+        assert(running["max"] == 3)
+
+    def test_nested_map(self):
+        # the nested calls are made in the worker thread, a pool of one thread does not deadlock
+        executor = executors.BoundedExecutor("test", 1, 0)
+        def outer(x):
+            return [future.result() for future in executor.map(square, [(x,), (x + 1,)])]
+        futures = executor.map(outer, [(1,), (2,)], max_concurrency=1)
+        assert([future.result() for future in futures] == [[1, 4], [4, 9]])
+        future = executor.submit(outer, 3)
+        assert(future.result(timeout=5) == [9, 16])
+
+    def test_nested_pool(self):
+        # the nested calls are run by the nested pool, at most max_concurrency at a time for each task
+        executor = executors.BoundedExecutor("test", 2, 0, nested_workers=8)
+        lock = threading.Lock()
+        running = {"current": 0, "max": 0}
+        def task():
+            with lock:
+                running["current"] += 1
+                running["max"] = max(running["max"], running["current"])
+            time.sleep(0.02)
+            with lock:
+                running["current"] -= 1
+            # one level deeper, in the current thread
+            return executor.map(square, [(2,), (3,)])[1].result()
+        def outer():
+            return [future.result() for future in executor.map(task, [()] * 6, max_concurrency=3)]
+        futures = executor.map(outer, [(), ()])
+        assert([future.result(timeout=5) for future in futures] == [[9] * 6, [9] * 6])
+        assert(running["max"] == 6)
+        assert(executor.nested.get_stats()["submitted"] == 12)
+        executor.shutdown()
+
+    def test_process_executor(self):
+        executor = executors.BoundedExecutor("test", 2, 2, processes=True)
+        futures = executor.map(square, [(i,) for i in range(6)])
+        assert([future.result() for future in futures] == [i * i for i in range(6)])
+        executor.shutdown()
+
+    def test_nested_process_map(self):
+        # the worker process inherits the executor, its nested map runs in the worker
+        futures = executors.get_cpu_executor().map(nested_cpu_map, [(1,), (2,), (3,)], max_concurrency=2)
+        assert([future.result(timeout=60) for future in futures] == [[1, 4], [4, 9], [9, 16]])
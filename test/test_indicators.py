@@ -3,8 +3,21 @@ import pytest
 import numpy as np
 import datetime
 import os
+import warnings
+import threading
 
 from src import indicators
+from src import indicators_flabeling as flabeling
+from src import indicators_supertrend as supertrend
+from src import indicators_vsa as vsa
+from src import indicators_streaming as streaming
+from src import indicators_planner as planner
+from src import indicators_panel
+from src import indicators_synthetic_data as synthetic
+from src import executors
+from . import test_utils
+from stockstats import StockDataFrame as Sdf
+from finta import TA
 
 g_generate_references = False
 
@@ -45,6 +58,33 @@ class TestIndicators:
         df = indicators.remove_features(df, ["fakecolumn", "low"])
         assert(len(list(df.columns)) == 3)
 
+    def test_clean_dataset(self):
+        data = {'close':[20., 21., np.inf, 19., 19., 19., np.nan, 26., 16.],
+                'volume':[1., 2., 3., -np.inf, 5., 5., 7., 8., 9.],
+                'open':[1., 2., 3., 4., 5., 6., 7., 8., 9.],
+                'name':['a', 'b', 'c', 'd', 'e', 'e', 'g', 'h', 'i'],
+                'target':[1, 0, 1, 1, 1, 1, 1, 0, 0]}
+        df = pd.DataFrame(data)
+
+        df, report = indicators.clean_dataset(df, features=["open", "fakecolumn"], shifts={"target": -1})
+        assert(list(df.columns) == ["close", "volume", "name", "target"])
+        assert(report == {"rows": 9, "infinite_values": 2, "missing_values": 2, "duplicates": 1, "remaining_rows": 4})
+        assert(df.index.tolist() == [0, 1, 4, 7])
+        assert(df["target"].tolist() == [0., 1., 1., 0.])
+
+        # same rows as remove_missing_values then remove_duplicates
+        df = pd.DataFrame(data).drop(columns=["open"])
+        df_expected = indicators.remove_duplicates(indicators.remove_missing_values(df.copy()))
+        df_cleaned, _ = indicators.clean_dataset(df)
+        assert(df_cleaned.equals(df_expected))
+
+        # the dataframe of the caller is unchanged, with or without removed features
+        for features in [None, ["open"]]:
+            df = pd.DataFrame(data)
+            df_cleaned, _ = indicators.clean_dataset(df, features=features, shifts={"target": -1})
+            assert(df.equals(pd.DataFrame(data)))
+            assert(df_cleaned["target"].tolist() == pd.DataFrame(data)["target"].shift(-1)[df_cleaned.index].tolist())
+
     def test_get_trend_close(self):
         data = {'close':[20, 21, 23, 19, 18, 24, 25, 26, 16, -10, -15, -18, -15, -8]}
         df = pd.DataFrame(data)
@@ -56,6 +96,81 @@ class TestIndicators:
         equal = np.array_equal(trend4, [0, 0, 0, 0, 0, 1, 1, 1, 0, 0, 0, 0, 0, 1])
         assert(equal)
 
+    def test_explain_indicators(self):
+        explain = indicators.explain_indicators(["close", "sma_20"], ["macd", "macds", "macdh", "ema_12", "ema_26", "bbands", "sma_20", "foo"])
+        assert([step["indicator"] for step in explain["steps"]] == ["macd", "macds", "macdh", "ema_12", "ema_26", "bbands"])
+        assert(explain["skipped"] == ["sma_20"])
+        assert(explain["unknown"] == ["foo"])
+        # each EMA is computed once, stockstats is not needed
+        assert(explain["intermediates"] == ["ema(close, 12)", "ema(close, 26)", "sub(ema(close, 12), ema(close, 26))",
+                                            "ema(sub(ema(close, 12), ema(close, 26)), 9)",
+                                            "sub(sub(ema(close, 12), ema(close, 26)), ema(sub(ema(close, 12), ema(close, 26)), 9))",
+                                            "sma(close, 20)", "mstd(close, 20)"])
+
+    def test_plan_not_modified(self):
+        df = self.get_dataframe_from_csv("./test/data/google_stocks_data.csv")
+        technical_indicators = ["wma_5", "adx", "er", "ema_12"]
+        plan = planner.plan_indicators(list(df.columns), technical_indicators)
+        # the steps of the shared plan are immutable
+        assert(hash(tuple((step["args"], step["intermediates"]) for step in plan["steps"])))
+        explain = planner.explain_plan(plan)
+        explain["unknown"].append("foo")
+        assert(plan["unknown"] == [])
+
+        df_first = indicators.compute_indicators(df.copy(), technical_indicators)
+        df_second = indicators.compute_indicators(df.copy(), technical_indicators)
+        assert(planner.plan_indicators(list(df.columns), technical_indicators) is plan)
+        assert(df_first.equals(df_second))
+        assert(df_first["adx"].equals(TA.ADX(Sdf.retype(df.copy()))))
+
+    def test_shared_intermediates(self):
+        df = self.get_dataframe_from_csv("./test/data/google_stocks_data.csv")
+        technical_indicators = ["macd", "macds", "macdh", "ema_12", "ema_26", "bbands", "sma_20", "stc", "atr", "roc", "mom"]
+        df_shared = indicators.compute_indicators(df.copy(), technical_indicators)
+
+        # same values as stockstats and finta
+        stock = Sdf.retype(df.copy())
+        for column in ["macd", "macds", "macdh"]:
+            assert(df_shared[column].equals(stock.get(column)))
+        assert(df_shared["ema_12"].equals(TA.EMA(stock, period = 12)))
+        assert(df_shared["sma_20"].equals(TA.SMA(stock, 20)))
+        bbands = TA.BBANDS(stock)
+        for column in ["BB_UPPER", "BB_MIDDLE", "BB_LOWER"]:
+            assert(np.array_equal(df_shared[column.lower()].to_numpy(), bbands[column].to_numpy(), equal_nan=True))
+        assert(df_shared["stc"].equals(TA.STC(stock)))
+        assert(df_shared["atr"].equals(TA.ATR(stock)))
+        assert(df_shared["roc"].equals(TA.ROC(stock)))
+        assert(df_shared["mom"].equals(TA.MOM(stock)))
+
+    def test_no_fragmentation(self):
+        df = self.get_dataframe_from_csv("./test/data/google_stocks_data.csv")
+        technical_indicators = ["sma_" + str(period) for period in range(2, 122)] + ["trend_1d", "bbands"]
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", pd.errors.PerformanceWarning)
+            df_result = indicators.compute_indicators(df.copy(), technical_indicators)
+        assert(list(df_result.columns) == list(df.columns) + technical_indicators[:-1] + ["bb_upper", "bb_middle", "bb_lower"])
+        assert(df_result["sma_121"].equals(df["close"].rolling(121).mean().rename("sma_121")))
+        assert(df_result["trend_1d"].dtype == np.int64)
+
+    def test_register_indicator(self):
+        def build_range(indicator, suffix, request):
+            if not suffix.isdigit():
+                return None
+            window = int(suffix)
+            return planner.make_function_step(indicator, lambda df, params: df["high"].rolling(window).max() - df["low"].rolling(window).min())
+
+        indicators.register_indicator("hl_range_", build_range, prefix=True)
+        planner.register_function_indicator("hl2", lambda df, params: (df["high"] + df["low"]) / 2)
+
+        df = self.get_dataframe_from_csv("./test/data/google_stocks_data.csv")
+        explain = indicators.explain_indicators(df, ["hl_range_5", "hl_range_x", "hl2", "sma_5"])
+        assert(explain["unknown"] == ["hl_range_x"])
+
+        df_result = indicators.compute_indicators(df.copy(), ["close", "hl_range_5", "hl2", "sma_5"], True)
+        assert(list(df_result.columns) == ["close", "hl_range_5", "hl2", "sma_5"])
+        assert(df_result["hl2"].equals((df["high"] + df["low"]) / 2))
+        assert(df_result["hl_range_5"].equals(df["high"].rolling(5).max() - df["low"].rolling(5).min()))
+
     def test_get_trend_ratio(self):
         data = {'close':[20, 21, 23, 19, 18, 24, 25, 26, 27, 28]}
         df = pd.DataFrame(data)
@@ -95,6 +210,139 @@ class TestIndicators:
         array_expected = expected_df["super_trend_direction"].to_numpy()
         assert((array==array_expected).all())
 
+    def test_super_trend_direction_incremental(self):
+        df = self.get_dataframe_from_csv("./test/data/google_stocks_data.csv")
+        df = df.head(200)
+        state = supertrend.SuperTrendState(15, 5)
+        directions = [state.update(high, low, close) for high, low, close in zip(df["high"], df["low"], df["close"])]
+        df["super_trend_direction"] = directions
+        df = indicators.remove_missing_values(df)
+
+        expected_df = self.get_dataframe_from_csv("./test/references/findicators_super_trend_direction_reference.csv")
+        array = df["super_trend_direction"].to_numpy()
+        array_expected = expected_df["super_trend_direction"].to_numpy()
+        assert((array==array_expected).all())
+
+    def test_super_trend_direction_grid(self):
+        df = self.get_dataframe_from_csv("./test/data/google_stocks_data.csv")
+        df = df.head(200)
+        indicators_names = ["super_trend_direction_15_5", "super_trend_direction_10_3", "super_trend_direction_10_1.5"]
+        df_grid = indicators.compute_indicators(df.copy(), indicators_names, True)
+        assert(list(df_grid.columns) == indicators_names)
+
+        for atr_window, atr_multi, column in [(15, 5, "super_trend_direction_15_5"), (10, 3, "super_trend_direction_10_3"), (10, 1.5, "super_trend_direction_10_1.5")]:
+            st = supertrend.SuperTrend(df['high'], df['low'], df['close'], atr_window, atr_multi)
+            assert(df_grid[column].equals(st.super_trend_direction()))
+
+    def test_streaming_indicators(self):
+        df = self.get_dataframe_from_csv("./test/data/google_stocks_data.csv")
+        technical_indicators = ["sma_12", "ema_9", "wma_5", "macd", "macds", "macdh", "rsi_30", "atr", "bbands", "mom", "roc", "trend_1d", "simple_rtn"]
+        df_batch = indicators.compute_indicators(df.copy(), technical_indicators)
+
+        # the stream is restored from a snapshot in the middle of the history
+        stream = streaming.get_indicator_stream("GOOG", "1d", technical_indicators)
+        values = stream.update_many(df.head(100))
+        snapshots = streaming.snapshot_indicator_streams()
+        streaming.remove_indicator_stream("GOOG", "1d")
+        streaming.restore_indicator_streams(snapshots)
+        for high, low, close in zip(df["high"][100:], df["low"][100:], df["close"][100:]):
+            values.append(streaming.update_indicator_stream("GOOG", "1d", high, low, close))
+        streaming.remove_indicator_stream("GOOG", "1d")
+
+        df_stream = pd.DataFrame(values, index=df.index)
+        for column in df_stream.columns:
+            assert(np.allclose(df_stream[column].to_numpy(dtype=float), df_batch[column].to_numpy(dtype=float), rtol=1e-9, atol=1e-9, equal_nan=True))
+
+    def test_streaming_names_from_registry(self):
+        # the names are read by the registry of compute_indicators
+        assert(planner.get_indicator_spec("rsi_14") == ("rsi_", (14,)))
+        assert(planner.get_indicator_spec("trend_3d") == ("trend_", (3,)))
+        assert(planner.get_indicator_spec("bbands") == ("bbands", (20, 2)))
+        assert(planner.get_indicator_spec("sma_x") == None)
+
+        df = self.get_dataframe_from_csv("./test/data/google_stocks_data.csv")
+        stream = streaming.IndicatorStream(["rsi_14", "trend_3d", "adx", "sma_x", "foo"])
+        # adx is known but can't be streamed
+        assert(stream.unknown == ["adx", "sma_x", "foo"])
+        values = pd.DataFrame(stream.update_many(df), index=df.index)
+        df_batch = indicators.compute_indicators(df.copy(), ["rsi_14", "trend_3d"])
+        for column in ["rsi_14", "trend_3d"]:
+            assert(np.allclose(values[column].to_numpy(dtype=float), df_batch[column].to_numpy(dtype=float), rtol=1e-9, atol=1e-9, equal_nan=True))
+
+    def test_panel_indicators(self):
+        df = self.get_dataframe_from_csv("./test/data/google_stocks_data.csv")
+        dfs = {"GOOG": df, "GOOG_HALF": df.iloc[len(df.index) // 2:] / 2}
+        technical_indicators = ["sma_12", "ema_9", "wma_5", "macd", "macdh", "rsi_30", "rsi_14", "atr", "bbands", "mom", "roc", "trend_1d", "simple_rtn", "foo", "adx", "trend_xd"]
+
+        panel = indicators_panel.make_panel(dfs)
+        panel_indicators, unknown = indicators_panel.compute_panel_indicators(panel, technical_indicators)
+        # the names are read by the registry of compute_indicators, adx has no panel kernel
+        assert(unknown == ["foo", "adx", "trend_xd"])
+        technical_indicators = technical_indicators[:-3]
+        assert("macds" not in panel_indicators)
+
+        for symbol in dfs:
+            df_symbol = pd.DataFrame({field: panel[field][symbol] for field in panel})
+            df_symbol = indicators.compute_indicators(df_symbol, technical_indicators)
+            for column, values in panel_indicators.items():
+                assert(np.allclose(values[symbol].to_numpy(dtype=float), df_symbol[column].to_numpy(dtype=float), rtol=1e-12, equal_nan=True))
+
+        df_long = indicators_panel.panel_to_long(panel_indicators)
+        assert(len(df_long.index) == 2 * len(df.index))
+        assert(df_long.loc[(df.index[-1], "GOOG_HALF"), "mom"] == panel_indicators["mom"]["GOOG_HALF"].iloc[-1])
+
+    def test_compact_indicators(self):
+        df = self.get_dataframe_from_csv("./test/data/google_stocks_data.csv")
+        df["symbol"] = "GOOG"
+        technical_indicators = ["close", "symbol", "sma_12", "ema_9", "rsi_30", "macd", "trend_1d"]
+
+        df_full = indicators.compute_indicators(df.copy(), technical_indicators, True)
+        df_compact = indicators.compute_indicators(df.copy(), technical_indicators, True, compact=True)
+
+        assert(df_compact.index.dtype == np.int64)
+        assert(df_compact.index[0] == df.index[0].value // 10 ** 6)
+        assert(df_compact["symbol"].dtype == "category")
+        assert(df_compact["trend_1d"].dtype == df_full["trend_1d"].dtype)
+        memory = df_compact.attrs["memory"]
+        assert(memory["bytes_saved"] == memory["bytes_before"] - memory["bytes_after"] and memory["bytes_saved"] > 0)
+        for column in ["close", "sma_12", "ema_9", "rsi_30", "macd"]:
+            assert(df_compact[column].dtype == np.float32)
+            # computed in float64 then downcast: only the float32 rounding differs
+            assert(np.allclose(df_compact[column].to_numpy(dtype=float), df_full[column].to_numpy(), rtol=1e-6, equal_nan=True))
+
+    def test_synthetic_ohlcv(self):
+        dfs = test_utils.get_synthetic_ohlcv(n_symbols=3, n_bars=500, timeframe="1m", seed=1)
+        assert(list(dfs.keys()) == ["SYN0/USDT", "SYN1/USDT", "SYN2/USDT"])
+        df = dfs["SYN1/USDT"]
+        assert(list(df.columns) == ["open", "high", "low", "close", "volume"])
+        assert(df.index[1] - df.index[0] == pd.Timedelta(minutes=1))
+        assert((df["high"] >= df[["open", "close"]].max(axis=1)).all() and (df["low"] <= df[["open", "close"]].min(axis=1)).all())
+        assert((df["low"] > 0).all() and (df["volume"] > 0).all())
+        assert(df["open"].iloc[1:].equals(df["close"].shift().iloc[1:]))
+        assert(df.equals(test_utils.get_synthetic_ohlcv(n_symbols=3, n_bars=500, timeframe="1m", seed=1)["SYN1/USDT"]))
+        assert(not df.equals(test_utils.get_synthetic_ohlcv(n_symbols=3, n_bars=500, timeframe="1m", seed=2)["SYN1/USDT"]))
+
+        ohlcv = synthetic.to_ccxt_ohlcv(df)
+        assert(ohlcv[0] == [df.index[0].value // 10 ** 6] + df.iloc[0].tolist())
+
+        # written as the csv files of test/data
+        dfs = test_utils.get_synthetic_ohlcv(n_symbols=2, n_bars=50, timeframe="1d")
+        filenames = synthetic.write_ohlcv(dfs, "./test/generated")
+        assert(filenames == ["./test/generated/SYN0_USDT.csv", "./test/generated/SYN1_USDT.csv"])
+        df_csv = self.get_dataframe_from_csv(filenames[1])
+        for filename in filenames:
+            os.remove(filename)
+        assert(list(df_csv.columns) == ["high", "low", "open", "close", "volume", "adj_close"])
+        assert(np.allclose(df_csv["close"], dfs["SYN1/USDT"]["close"], rtol=1e-12))
+
+    def test_close_synthetic(self):
+        df = test_utils.get_synthetic_ohlcv(n_symbols=1, n_bars=200, timeframe="1d")["SYN0/USDT"]
+        df_input = df.copy()
+        df = indicators.compute_indicators(df, ["close_synthetic_GBM", "close_synthetic_MIXED_SINUS_UP"], params={"synthetic_seed": 4})
+        assert(df_input.equals(df[df_input.columns]))
+        assert(df["close_synthetic_GBM"].equals(pd.Series(synthetic.generate_ohlcv_panel(1, 200, seed=4)["close"].iloc[:, 0].to_numpy(), index=df.index, name="close_synthetic_GBM")))
+        assert(df["close_synthetic_MIXED_SINUS_UP"].notna().all())
+
     def test_vsa(self):
         df = self.get_dataframe_from_csv("./test/data/google_stocks_data.csv")
         df = df.head(200)
@@ -110,6 +358,22 @@ class TestIndicators:
             array_expected = expected_df[column].to_numpy()
             assert(np.allclose(array, array_expected))
 
+    def test_vsa_and_atr(self):
+        # the true range comes from the input columns, whatever the frame kernels return
+        df = self.get_dataframe_from_csv("./test/data/google_stocks_data.csv")
+        expected = TA.ATR(Sdf.retype(df.copy()))
+        for technical_indicators in [["vsa", "atr"], ["macd", "vsa", "atr"]]:
+            df_result = indicators.compute_indicators(df.copy(), technical_indicators)
+            assert(np.array_equal(df_result["atr"].to_numpy(), expected.to_numpy(), equal_nan=True))
+
+    def test_vsa_keeps_input_unchanged(self):
+        df = self.get_dataframe_from_csv("./test/data/google_stocks_data.csv")
+        df = df.head(200)
+        df_copy = df.copy()
+        df_vsa = vsa.create_bunch_of_vsa_features(df, [1, 5, 20])
+        assert(df.equals(df_copy))
+        assert(list(df_vsa.columns) == ["close"] + ["vsa_{}_{}D".format(feature, day) for day in [1, 5, 20] for feature in ["volume", "price_spread", "close_loc", "close_change"]])
+
     def labeling_common(self, dict_params, ref_csvfile, ref_barriers_csvfile):
         df = self.get_dataframe_from_csv("./test/data/google_stocks_data.csv")
         df = df.head(150)
@@ -159,12 +423,85 @@ class TestIndicators:
         ref_barriers_csvfile = "./test/references/findicators_data_labeling_close_balanced_barriers_reference.csv"
         self.labeling_common(dict_params, ref_csvfile, ref_barriers_csvfile)
 
+    def test_labeling_close_balanced_relabel(self):
+        dict_params = {'labeling_debug':True, "use_balanced_upper_multiplier":1, "labeling_balanced_mode":"relabel", 'labeling_t_final':10, 'labeling_upper_multiplier':"2.", 'labeling_lower_multiplier':"2.",  "labeling_label_below":"0", "labeling_label_middle":"0", "labeling_label_above":"1"}
+        ref_csvfile = "./test/references/findicators_data_labeling_close_balanced_reference.csv"
+        ref_barriers_csvfile = "./test/references/findicators_data_labeling_close_balanced_barriers_reference.csv"
+        self.labeling_common(dict_params, ref_csvfile, ref_barriers_csvfile)
+
     def test_labeling_high_low_balanced(self):
         dict_params = {'labeling_debug':True, 'use_high_low':'1', "use_balanced_upper_multiplier":1, 'labeling_t_final':10, 'labeling_upper_multiplier':"2.", 'labeling_lower_multiplier':"2.",  "labeling_label_below":"0", "labeling_label_middle":"0", "labeling_label_above":"1"}
         ref_csvfile = "./test/references/findicators_data_labeling_high_low_balanced_reference.csv"
         ref_barriers_csvfile = "./test/references/findicators_data_labeling_high_low_balanced_barriers_reference.csv"
         self.labeling_common(dict_params, ref_csvfile, ref_barriers_csvfile)
 
+    def test_labeling_first_touches(self):
+        price = np.array([10., 11., 9., 12., 8., 10.])
+        top_barrier = np.array([11., 12., 12., 20., np.nan, np.nan])
+        bottom_barrier = np.array([9., 8., 9., 7., np.nan, np.nan])
+        ends = np.array([3, 4, 5, -1, -1, -1])
+        first_top, first_bottom, window = flabeling.get_first_touches(price, price, top_barrier, bottom_barrier, ends)
+        assert(window == 4)
+        assert(np.array_equal(first_top, [1, 2, 1, 4, 4, 4]))
+        assert(np.array_equal(first_bottom, [2, 3, 0, 4, 4, 4]))
+
+    def test_labeling_batch(self):
+        df = self.get_dataframe_from_csv("./test/data/google_stocks_data.csv")
+        dfs = {"GOOG_1": df.head(150), "GOOG_2": df.tail(200), "FOOBAR": df[["close"]]}
+        params = {'labeling_t_final':10, 'labeling_upper_multiplier':"2.", 'labeling_lower_multiplier':"2."}
+        results = flabeling.data_labeling_batch(dfs, params, max_workers=2)
+
+        assert(list(results.keys()) == ["GOOG_1", "GOOG_2", "FOOBAR"])
+        assert(results["FOOBAR"]["status"] == "ko")
+        for symbol in ["GOOG_1", "GOOG_2"]:
+            assert(results[symbol]["status"] == "ok")
+            assert("elapsed_time" in results[symbol])
+            expected = flabeling.data_labeling(dfs[symbol].copy(), params)["labeling"]
+            assert(results[symbol]["labeling"].equals(expected))
+
+    def test_labeling_batch_chunked(self):
+        # the chunks of a symbol labeled in a worker process are labeled in that process
+        df = self.get_dataframe_from_csv("./test/data/google_stocks_data.csv")
+        dfs = {"GOOG_1": df, "GOOG_2": df.tail(300)}
+        params = {'labeling_t_final':10, 'labeling_chunk_size':97, 'labeling_max_workers':2}
+        results = flabeling.data_labeling_batch(dfs, params, max_workers=2)
+        for symbol in dfs:
+            assert(results[symbol]["status"] == "ok")
+            expected = flabeling.data_labeling(dfs[symbol].copy(), {'labeling_t_final':10})["labeling"]
+            assert(results[symbol]["labeling"].equals(expected))
+
+    def test_labeling_busy(self):
+        df = self.get_dataframe_from_csv("./test/data/google_stocks_data.csv")
+        dfs = {"GOOG_1": df.head(150), "GOOG_2": df.tail(200)}
+        params = {'labeling_t_final':10, 'labeling_chunk_size':50, 'labeling_max_workers':2}
+        # a cpu executor without any free slot
+        previous_executor = executors.g_cpu_executor
+        executors.g_cpu_executor = executors.BoundedExecutor("test", 1, 0)
+        event = threading.Event()
+        executors.g_cpu_executor.submit(event.wait)
+        try:
+            # every symbol is reported instead of raising
+            results = flabeling.data_labeling_batch(dfs, params, max_workers=2)
+            assert(list(results.keys()) == ["GOOG_1", "GOOG_2"])
+            for symbol in dfs:
+                assert(results[symbol]["status"] == "ko" and "ExecutorBusy" in results[symbol]["reason"])
+            # the chunks are labeled by the caller
+            df_labeling = flabeling.data_labeling(dfs["GOOG_2"].copy(), params)
+        finally:
+            event.set()
+            executors.g_cpu_executor = previous_executor
+        expected = flabeling.data_labeling(dfs["GOOG_2"].copy(), {'labeling_t_final':10})
+        assert(df_labeling["labeling"].equals(expected["labeling"]))
+
+    def test_labeling_chunked(self):
+        df = self.get_dataframe_from_csv("./test/data/google_stocks_data.csv")
+        for params in [{'labeling_t_final':10},
+                       {'labeling_t_final':5, 'use_high_low':'1', "use_balanced_upper_multiplier":1, "labeling_label_middle":"0", "labeling_label_above":"1"}]:
+            expected = flabeling.data_labeling(df.copy(), params)["labeling"]
+            params_chunked = dict(params, labeling_chunk_size=97, labeling_max_workers=2)
+            labeling = flabeling.data_labeling(df.copy(), params_chunked)["labeling"]
+            assert(labeling.equals(expected))
+
     def test_shift(self):
         data = {'close':[20., 21., 23., 19., 18., 24., 25., 26., 16.]}
         df = pd.DataFrame(data)
@@ -181,4 +518,28 @@ class TestIndicators:
         df = indicators.normalize_column_headings(df)
 
         expected_df = self.get_dataframe_from_csv("./test/references/findicators_temporal_indicators_reference.csv")
-        assert(df.equals(expected_df))
\ No newline at end of file
+        assert(df.equals(expected_df))
+
+    def test_temporal_indicators_intraday(self):
+        # the calendar table gives the same features as the dt accessor, for every minute and with missing dates
+        dates = pd.Series(pd.date_range("2021-12-30 22:00", periods=3000, freq="min", tz="Europe/Paris"))
+        dates[10] = pd.NaT
+        df = pd.DataFrame({"date": dates, "close": 1.})
+        df = indicators.add_temporal_indicators(df, "date", time=True)
+
+        field = dates.dt
+        for column in ["Year", "Month", "Day", "Dayofweek", "Dayofyear", "Hour", "Minute", "Second", "Is_year_end", "Is_quarter_start"]:
+            assert(df[column].equals(getattr(field, column.lower())))
+        assert(np.array_equal(df["Week"], field.isocalendar().week.astype(float), equal_nan=True))
+
+        cache_info = indicators.get_calendar_table.cache_info()
+        indicators.add_temporal_indicators(df[["date", "close"]].copy(), "date")
+        assert(indicators.get_calendar_table.cache_info().hits == cache_info.hits + 1)
+
+        # the cached table is shared: it can't be modified by a caller
+        calendar = indicators.get_calendar_table(0, 10)
+        with pytest.raises(TypeError):
+            calendar["Year"] = None
+        with pytest.raises(ValueError):
+            calendar["Day"][0] = 0
+        assert(indicators.get_calendar_table(0, 10)["Day"][0] == 1)
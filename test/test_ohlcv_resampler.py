@@ -0,0 +1,74 @@
+import pytest
+import numpy as np
+import pandas as pd
+
+from src import crypto
+from src import exchange_pool
+from src import ohlcv_store
+from src import ohlcv_resampler
+from . import test_utils
+
+class TestOhlcvResampler:
+
+    def test_resample_ohlcv(self):
+        df = test_utils.get_synthetic_ohlcv(1, 24 * 70, "1h", seed=0)["SYN0/USDT"]
+        aggregations = {"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"}
+        for timeframe, freq in [("4h", "4H"), ("1d", "D"), ("1w", "W-MON"), ("1M", "MS")]:
+            resampled = ohlcv_resampler.resample_ohlcv(df, timeframe)
+            expected = df.resample(freq, label="left", closed="left").agg(aggregations).dropna()
+            assert(resampled.index.equals(expected.index.rename("timestamp")))
+            assert(np.allclose(resampled.to_numpy(), expected[ohlcv_store.g_columns].to_numpy()))
+
+    def test_bucket_starts(self):
+        timestamps = pd.DatetimeIndex(["2022-01-01 05:00", "2022-01-05 13:00", "2022-03-31 23:59"]).asi8 // 10 ** 6
+        to_dates = lambda timestamps: [str(date) for date in pd.to_datetime(timestamps, unit='ms')]
+        # 2022-01-01 is a multiple of 3 days since the epoch
+        assert(to_dates(ohlcv_resampler.get_bucket_starts(timestamps, "3d")) == ["2022-01-01 00:00:00", "2022-01-04 00:00:00", "2022-03-29 00:00:00"])
+        assert(to_dates(ohlcv_resampler.get_bucket_starts(timestamps, "1w")) == ["2021-12-27 00:00:00", "2022-01-03 00:00:00", "2022-03-28 00:00:00"])
+        assert(to_dates(ohlcv_resampler.get_bucket_starts(timestamps, "2M")) == ["2022-01-01 00:00:00", "2022-01-01 00:00:00", "2022-03-01 00:00:00"])
+        assert(to_dates([ohlcv_resampler.get_next_bucket_start(timestamp, "1M") for timestamp in timestamps]) == ["2022-02-01 00:00:00", "2022-02-01 00:00:00", "2022-04-01 00:00:00"])
+        assert(to_dates([ohlcv_resampler.get_later_bucket_start(ohlcv_resampler.get_bucket_starts(timestamps, "1M")[0], "1M", 13)]) == ["2023-02-01 00:00:00"])
+
+        assert(ohlcv_resampler.can_resample("1h", "4h"))
+        assert(ohlcv_resampler.can_resample("1m", "1w"))
+        assert(not ohlcv_resampler.can_resample("1h", "90m"))
+        assert(not ohlcv_resampler.can_resample("1h", "1h"))
+
+    def get_symbol_ohlcv(self, calls, store, start, end, timeframe):
+        previous_pool, previous_store = crypto.g_exchange_pool, crypto.g_ohlcv_store
+        crypto.g_exchange_pool = exchange_pool.ExchangePool(create_exchange=lambda exchange_name: test_utils.FakeExchange(calls=calls))
+        crypto.g_ohlcv_store = store
+        try:
+            return crypto.get_symbol_ohlcv("fake", "BTC/EURS", start, end, timeframe, use_cache=False)
+        finally:
+            crypto.g_exchange_pool, crypto.g_ohlcv_store = previous_pool, previous_store
+
+    def test_timeframe_not_provided(self):
+        # the fake exchange has no 2h nor 1M bars, they are built from the 1h bars
+        # wider than the requests, the buckets are complete whatever the local time
+        hourly = self.get_symbol_ohlcv({}, None, "2021-12-31", "2022-03-02", "1h")
+        for timeframe in ["2h", "1M"]:
+            calls = {}
+            ohlcv = self.get_symbol_ohlcv(calls, None, "2022-01-01", "2022-03-01", timeframe).dropna()
+            assert(calls["fetch_ohlcv"] == 2)
+            expected = ohlcv_resampler.resample_ohlcv(hourly, timeframe)
+            assert(len(ohlcv.index) > 0)
+            assert(np.allclose(ohlcv.to_numpy(), expected.loc[ohlcv.index].to_numpy()))
+
+    def test_from_store(self, tmp_path):
+        store = ohlcv_store.OhlcvStore(str(tmp_path))
+        hourly = self.get_symbol_ohlcv({}, store, "2022-01-01", "2022-02-01", "1h")
+
+        # the 4h bars are provided by the exchange but the 1h bars are already held
+        calls = {}
+        ohlcv = self.get_symbol_ohlcv(calls, store, "2022-01-02", "2022-01-20", "4h").dropna()
+        assert("fetch_ohlcv" not in calls)
+        expected = ohlcv_resampler.resample_ohlcv(hourly, "4h")
+        assert(len(ohlcv.index) > 100)
+        assert(np.allclose(ohlcv.to_numpy(), expected.loc[ohlcv.index].to_numpy()))
+
+        # not held, requested as it is
+        calls = {}
+        self.get_symbol_ohlcv(calls, store, "2022-03-01", "2022-03-20", "4h")
+        assert(calls["fetch_ohlcv"] == 1)
+        assert(store.get_ranges("fake", "BTC/EURS", "4h") != [])
@@ -0,0 +1,130 @@
+import os
+import threading
+import pytest
+import pandas as pd
+
+from src import crypto
+from src import exchange_pool
+from src import ohlcv_store
+from . import test_utils
+
+class TestOhlcvStore:
+
+    def test_ranges(self):
+        assert(ohlcv_store.merge_ranges([[5, 8], [0, 2], [2, 3], [7, 10]]) == [[0, 3], [5, 10]])
+        assert(ohlcv_store.get_missing_ranges([[0, 3], [5, 10]], 1, 12) == [[3, 5], [10, 12]])
+        assert(ohlcv_store.get_missing_ranges([[0, 3], [5, 10]], 5, 8) == [])
+        assert(ohlcv_store.get_missing_ranges([], 5, 8) == [[5, 8]])
+
+    def get_symbol_ohlcv(self, calls, store, start, end):
+        previous_pool, previous_store = crypto.g_exchange_pool, crypto.g_ohlcv_store
+        # one page whatever the range, the calls counted are the fetches of the store
+        crypto.g_exchange_pool = exchange_pool.ExchangePool(create_exchange=lambda exchange_name: test_utils.FakeExchange(calls=calls, page_limit=100000))
+        crypto.g_ohlcv_store = store
+        try:
+            return crypto.get_symbol_ohlcv("fake", "BTC/EURS", start, end, use_cache=False)
+        finally:
+            crypto.g_exchange_pool, crypto.g_ohlcv_store = previous_pool, previous_store
+
+    def test_incremental_fetch(self, tmp_path):
+        calls = {}
+        expected = self.get_symbol_ohlcv(calls, None, "2022-01-01", "2022-03-01")
+        assert(calls["fetch_ohlcv"] == 1)
+
+        calls = {}
+        store = ohlcv_store.OhlcvStore(str(tmp_path))
+        ohlcv = self.get_symbol_ohlcv(calls, store, "2022-01-01", "2022-03-01")
+        assert(calls["fetch_ohlcv"] == 1)
+        assert(ohlcv.equals(expected))
+
+        # served from the store
+        calls = {}
+        ohlcv = self.get_symbol_ohlcv(calls, store, "2022-01-15", "2022-02-01")
+        assert("fetch_ohlcv" not in calls)
+        assert(ohlcv.equals(self.get_symbol_ohlcv({}, None, "2022-01-15", "2022-02-01")))
+
+        # only the missing ranges are fetched
+        calls = {}
+        ohlcv = self.get_symbol_ohlcv(calls, store, "2021-12-01", "2022-04-01")
+        assert(calls["fetch_ohlcv"] == 2)
+        assert(len(store.get_ranges("fake", "BTC/EURS", "1d")) == 1)
+        assert(len(ohlcv.index) == 121)
+        assert(ohlcv.equals(self.get_symbol_ohlcv({}, None, "2021-12-01", "2022-04-01")))
+        assert(store.get_stats()["requests_from_store"] == 1)
+
+    def test_bar_in_progress(self, tmp_path):
+        calls = {}
+        store = ohlcv_store.OhlcvStore(str(tmp_path))
+        end = (pd.Timestamp.utcnow() + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+        ohlcv = self.get_symbol_ohlcv(calls, store, "2022-01-01", end)
+        assert(calls["fetch_ohlcv"] == 2)
+
+        # the closed bars come from the store, the bar in progress is fetched again
+        calls = {}
+        ohlcv_again = self.get_symbol_ohlcv(calls, store, "2022-01-01", end)
+        assert(calls["fetch_ohlcv"] == 1)
+        assert(ohlcv_again.equals(ohlcv))
+        last_bar = pd.Timestamp.utcnow().tz_localize(None).floor("D")
+        assert(store.get_ranges("fake", "BTC/EURS", "1d")[0][1] == last_bar.value // 10 ** 6)
+
+    def test_fewer_bars(self, tmp_path):
+        store = ohlcv_store.OhlcvStore(str(tmp_path))
+        exchange = test_utils.FakeExchange()
+        duration = 24 * 3600 * 1000
+        since = 1640995200000
+        calls = []
+        def fetch(fetch_since, limit):
+            # the exchange returns at most 10 bars
+            calls.append((fetch_since, limit))
+            return crypto._fetch_ohlcv(exchange, "BTC/EURS", fetch_since, "1d", min(limit, 10))
+
+        df = store.get_ohlcv("fake", "BTC/EURS", "1d", since, since + 30 * duration, fetch)
+        assert(len(df.index) == 10)
+        # only the bars returned are held, the rest is requested again
+        assert(store.get_ranges("fake", "BTC/EURS", "1d") == [[since, since + 10 * duration]])
+        df = store.get_ohlcv("fake", "BTC/EURS", "1d", since, since + 30 * duration, fetch)
+        assert(calls[1] == (since + 10 * duration, 20))
+        assert(len(df.index) == 20)
+
+        # one file for the timestamps and the values
+        path = store._get_path("fake", "BTC/EURS", "1d")
+        assert(sorted(os.listdir(path)) == ["lock", "ohlcv.npy", "ranges.json"])
+
+    def test_no_bars(self, tmp_path):
+        # before the listing of the symbol the exchange returns nothing: the range is held, it is not requested again
+        store = ohlcv_store.OhlcvStore(str(tmp_path))
+        exchange = test_utils.FakeExchange()
+        duration = 24 * 3600 * 1000
+        since = 1640995200000
+        listing = since + 20 * duration
+        calls = []
+        def fetch(fetch_since, limit):
+            calls.append((fetch_since, limit))
+            df = crypto._fetch_ohlcv(exchange, "BTC/EURS", fetch_since, "1d", limit)
+            return df[df.index >= pd.Timestamp(listing, unit="ms")]
+
+        df = store.get_ohlcv("fake", "BTC/EURS", "1d", since, since + 30 * duration, fetch)
+        assert(len(df.index) == 10)
+        assert(store.get_ranges("fake", "BTC/EURS", "1d") == [[since, since + 30 * duration]])
+        df = store.get_ohlcv("fake", "BTC/EURS", "1d", since - 10 * duration, since + 30 * duration, fetch)
+        assert(calls[1] == (since - 10 * duration, 10))
+        df = store.get_ohlcv("fake", "BTC/EURS", "1d", since - 10 * duration, since + 30 * duration, fetch)
+        assert(len(calls) == 2 and len(df.index) == 10)
+
+    def test_shared_directory(self, tmp_path):
+        # two stores on the same directory, as two workers of the server: no write is lost
+        stores = [ohlcv_store.OhlcvStore(str(tmp_path)) for i in range(2)]
+        exchange = test_utils.FakeExchange()
+        duration = 24 * 3600 * 1000
+        since = 1640995200000
+        def write(store, first):
+            for i in range(first, 40, 2):
+                df = crypto._fetch_ohlcv(exchange, "BTC/EURS", since + i * duration, "1d", 1)
+                store.write("fake", "BTC/EURS", "1d", df, since + i * duration, since + (i + 1) * duration)
+        threads = [threading.Thread(target=write, args=(store, first)) for first, store in enumerate(stores)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert(stores[0].get_ranges("fake", "BTC/EURS", "1d") == [[since, since + 40 * duration]])
+        assert(len(stores[1].read("fake", "BTC/EURS", "1d", since, since + 40 * duration).index) == 40)
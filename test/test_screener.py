@@ -0,0 +1,76 @@
+import pytest
+import numpy as np
+import pandas as pd
+
+from src import crypto
+from src import exchange_pool
+from src import screener
+from . import test_utils
+
+def get_markets(changes):
+    # changes: dictionary symbol -> (change1h, change24h, quoteVolume24h)
+    return {symbol: {"symbol": symbol, "info": {"change1h": str(change1h), "change24h": str(change24h), "quoteVolume24h": str(volume)}}
+            for symbol, (change1h, change24h, volume) in changes.items()}
+
+class MarketsExchange(test_utils.FakeExchange):
+    def __init__(self, markets):
+        super().__init__(list(markets.keys()))
+        self.fake_markets = markets
+
+    def load_markets(self, reload=False):
+        self.set_markets(self.fake_markets, {})
+        return self.markets
+
+class TestScreener:
+
+    def test_get_top_k(self):
+        values = np.array([3., np.nan, 7., 1., 7.5, -2.])
+        assert(screener.get_top_k(values, 3).tolist() == [4, 2, 0])
+        assert(screener.get_top_k(values, 10).tolist() == [4, 2, 0, 3, 5])
+        assert(screener.get_top_k(values, 0).tolist() == [])
+
+    def test_get_top_gainers(self):
+        markets = get_markets({
+            "A/USD": (0.05, 0.10, 20000),
+            "B/USD": (0.02, 0.30, 20000),
+            "C/USD": (0.09, 0.01, 20000),
+            "D/USD": (0.50, 0.50, 100), # volume too low
+            "BULL/USD": (0.90, 0.90, 20000), # leveraged token
+            "E/EUR": (0.80, 0.80, 20000), # other quote
+            "F/USD": (None, 0.20, 20000) # no change
+        })
+        df = screener.get_top_gainers({"ftx": markets}, 2)
+        assert(df.columns.to_list() == ['exchange', 'symbol', 'change1h', 'rank_change1h', 'change24h', 'rank_change24h'])
+        assert(df['symbol'].to_list() == ["A/USD"])
+        assert(np.allclose(df[['change1h', 'change24h']].to_numpy(), [[5., 10.]]))
+        assert(df[['rank_change1h', 'rank_change24h']].to_numpy().tolist() == [[1, 1]])
+
+        df = screener.get_top_gainers({"ftx": markets}, 3)
+        assert(df['symbol'].to_list() == ["C/USD", "A/USD", "B/USD"])
+        assert(df['rank_change24h'].to_list() == [2, 1, 0])
+
+        # the exchanges are ranked together
+        other_markets = get_markets({"A/USD": (0.07, 0.40, 50000), "G/USD": (0.01, 0.05, 50000)})
+        df = screener.get_top_gainers({"ftx": markets, "other": other_markets}, 2)
+        assert(df[['exchange', 'symbol']].values.tolist() == [["other", "A/USD"]])
+
+        df = screener.get_top_gainers({"ftx": markets}, 10, metrics={"quoteVolume24h": 1}, quote_suffix=None, min_volume=None)
+        # the leveraged tokens are still excluded
+        assert(len(df.index) == 6 and df["symbol"].iloc[-1] == "D/USD")
+
+    def test_crypto_get_top_gainers(self):
+        markets = {"ftx": get_markets({"A/USD": (0.05, 0.10, 20000), "B/USD": (0.02, 0.30, 20000)}),
+                   "binance": get_markets({"C/USD": (0.09, 0.20, 20000)})}
+        pool = exchange_pool.ExchangePool(create_exchange=lambda exchange_name: MarketsExchange(markets[exchange_name]) if exchange_name in markets else None)
+        previous_pool, crypto.g_exchange_pool = crypto.g_exchange_pool, pool
+        try:
+            df = crypto.get_top_gainers("ftx", 50)
+            df_exchanges = crypto.get_top_gainers(["ftx", "binance"], 50)
+            df_unknown = crypto.get_top_gainers("foobar", 50)
+        finally:
+            crypto.g_exchange_pool = previous_pool
+
+        assert(df.columns.to_list() == ['symbol', 'change1h', 'rank_change1h', 'change24h', 'rank_change24h'])
+        assert(df['symbol'].to_list() == ["A/USD", "B/USD"])
+        assert(df_exchanges[['exchange', 'symbol']].values.tolist() == [["binance", "C/USD"], ["ftx", "A/USD"], ["ftx", "B/USD"]])
+        assert(df_unknown.empty)
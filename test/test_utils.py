@@ -1,6 +1,9 @@
+import asyncio
 import os
+import time
 import pandas as pd
 from pandas.testing import assert_frame_equal
+from src import cache
 
 def check_expectations(df, csvfile):
     assert(isinstance(df, pd.DataFrame))
@@ -10,3 +13,68 @@ def check_expectations(df, csvfile):
     os.remove(generated_file)
     df_ref = pd.read_csv("./test/references/"+csvfile)
     assert_frame_equal(df_generated, df_ref)
+
+def get_synthetic_ohlcv(n_symbols=10, n_bars=1000, timeframe="1h", seed=0):
+    # seeded ohlcv of synthetic symbols (dictionary symbol -> dataframe), a fresh copy for each call
+    from src import indicators_synthetic_data
+    return indicators_synthetic_data.generate_ohlcv(n_symbols, n_bars, timeframe, seed=seed)
+
+class FakeExchange:
+    '''
+    offline stand-in for a ccxt client: deterministic ohlcv for a few symbols
+    calls: dictionary shared by the instances to count the calls of load_markets and fetch_ohlcv
+    delay: time in seconds spent waiting for the "network" by each call of fetch_ohlcv
+    '''
+    def __init__(self, symbols=["BTC/EURS", "ETH/EURS"], calls=None, page_limit=1000, delay=0):
+        self.id = "fake"
+        self.has = {'fetchOHLCV': True}
+        self.timeframes = {timeframe: timeframe for timeframe in ["1m", "5m", "15m", "1h", "4h", "1d", "1w"]}
+        self.features = {"spot": {"fetchOHLCV": {"limit": page_limit}}}
+        self.list_symbols = symbols
+        self.calls = calls if calls != None else {}
+        self.delay = delay
+        self.markets = {}
+        self.currencies = {}
+        self.symbols = []
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def load_markets(self, reload=False):
+        if self.markets and not reload:
+            return self.markets
+        self._count("load_markets")
+        self.set_markets({symbol: {"symbol": symbol, "info": {}} for symbol in self.list_symbols}, {})
+        return self.markets
+
+    def set_markets(self, markets, currencies=None):
+        self.markets = markets
+        self.currencies = currencies
+        self.symbols = sorted(markets.keys())
+
+    def _make_ohlcv(self, timeframe, since, limit):
+        duration = cache.get_timeframe_duration(timeframe) * 1000
+        # as the exchanges, the bars start on a multiple of the duration
+        first = -(-since // duration) * duration
+        timestamps = [first + i * duration for i in range(min(limit or 100, self.features["spot"]["fetchOHLCV"]["limit"]))]
+        # same values for the same timestamp, whatever the request
+        return [[timestamp, 100. + i, 102. + i, 99. + i, 101. + i, 1000.] for timestamp, i in zip(timestamps, [timestamp // duration % 50 for timestamp in timestamps])]
+
+    def fetch_ohlcv(self, symbol, timeframe="1d", since=None, limit=None):
+        self._count("fetch_ohlcv")
+        if self.delay:
+            time.sleep(self.delay)
+        return self._make_ohlcv(timeframe, since, limit)
+
+class AsyncFakeExchange(FakeExchange):
+    '''
+    asynchronous counterpart of FakeExchange (as ccxt.async_support)
+    '''
+    async def fetch_ohlcv(self, symbol, timeframe="1d", since=None, limit=None):
+        self._count("fetch_ohlcv")
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self._make_ohlcv(timeframe, since, limit)
+
+    async def close(self):
+        self._count("close")